@@ -0,0 +1,8 @@
+-- Users signed in anywhere in the cluster, and the server node holding their connection
+CREATE TABLE IF NOT EXISTS "online_session" (
+    "user_id" INTEGER PRIMARY KEY REFERENCES "user" ("user_id") ON DELETE CASCADE,
+    "node_id" TEXT NOT NULL,
+    "since" TIMESTAMP NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS "online_session_node_id_idx" ON "online_session" ("node_id");
@@ -0,0 +1,6 @@
+-- Keyset seeks for the sort keys of "search games". The expressions must stay identical
+-- to GAME_SORT_KEYS in src/queries.py, or the planner will not use these indexes.
+CREATE INDEX IF NOT EXISTS "game_name_seek_idx" ON "game" ("game_name", "game_id");
+CREATE INDEX IF NOT EXISTS "game_release_date_seek_idx" ON "game" ((COALESCE("release_date", DATE '0001-01-01')), "game_id");
+CREATE INDEX IF NOT EXISTS "game_positive_ratings_seek_idx" ON "game" ((COALESCE("positive_ratings", 0)), "game_id");
+CREATE INDEX IF NOT EXISTS "game_price_seek_idx" ON "game" ((COALESCE("price", 0)), "game_id");
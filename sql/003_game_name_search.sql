@@ -0,0 +1,6 @@
+-- Index-backed name search for "search games": trigrams serve substring (LIKE '%...%')
+-- matches and similarity ranking, the tsvector index serves full-text matches
+CREATE EXTENSION IF NOT EXISTS "pg_trgm";
+
+CREATE INDEX IF NOT EXISTS "game_name_trgm_idx" ON "game" USING GIN (LOWER("game_name") gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS "game_name_tsv_idx" ON "game" USING GIN (to_tsvector('simple', "game_name"));
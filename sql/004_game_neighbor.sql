@@ -0,0 +1,8 @@
+-- Most similar games of every game by the users who rated or favorited both, written
+-- by src/precompute_neighbors.py
+CREATE TABLE IF NOT EXISTS "game_neighbor" (
+    "game_id" INTEGER NOT NULL REFERENCES "game" ("game_id") ON DELETE CASCADE,
+    "neighbor_id" INTEGER NOT NULL REFERENCES "game" ("game_id") ON DELETE CASCADE,
+    "similarity" REAL NOT NULL,
+    PRIMARY KEY ("game_id", "neighbor_id")
+);
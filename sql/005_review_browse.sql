@@ -0,0 +1,4 @@
+-- Keyset seeks for the sort keys of "check reviews". The expressions must stay identical
+-- to REVIEW_SORT_KEYS in src/queries.py, or the planner will not use these indexes.
+CREATE INDEX IF NOT EXISTS "review_times_seek_idx" ON "review" ("game_id", (COALESCE("times", TIMESTAMP '0001-01-01')), "user_id");
+CREATE INDEX IF NOT EXISTS "review_rating_seek_idx" ON "review" ("game_id", (COALESCE("rating", 0)), "user_id");
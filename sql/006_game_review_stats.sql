@@ -0,0 +1,87 @@
+-- Review count, rating sum and per-star counts of every game, kept in step with "review"
+-- by a trigger so that rating summaries and sorts never aggregate the reviews. Every
+-- change of a row draws a new "version" from one sequence, so the server caches can tell
+-- which of two copies of a row is newer.
+CREATE SEQUENCE IF NOT EXISTS "game_review_stats_version_seq";
+
+CREATE TABLE IF NOT EXISTS "game_review_stats" (
+    "game_id" INTEGER PRIMARY KEY REFERENCES "game" ("game_id") ON DELETE CASCADE,
+    "review_count" INTEGER NOT NULL DEFAULT 0,
+    "rating_sum" INTEGER NOT NULL DEFAULT 0,
+    "rating_1" INTEGER NOT NULL DEFAULT 0,
+    "rating_2" INTEGER NOT NULL DEFAULT 0,
+    "rating_3" INTEGER NOT NULL DEFAULT 0,
+    "rating_4" INTEGER NOT NULL DEFAULT 0,
+    "rating_5" INTEGER NOT NULL DEFAULT 0,
+    "version" BIGINT NOT NULL DEFAULT nextval('"game_review_stats_version_seq"')
+);
+
+-- Tables created before the column existed; the existing rows draw versions once
+ALTER TABLE "game_review_stats" ADD COLUMN IF NOT EXISTS "version" BIGINT NOT NULL DEFAULT nextval('"game_review_stats_version_seq"');
+
+CREATE OR REPLACE FUNCTION "game_review_stats_apply"() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        IF OLD."rating" BETWEEN 1 AND 5 THEN
+            UPDATE "game_review_stats"
+            SET "review_count" = "review_count" - 1,
+                "rating_sum" = "rating_sum" - OLD."rating",
+                "rating_1" = "rating_1" - (OLD."rating" = 1)::int,
+                "rating_2" = "rating_2" - (OLD."rating" = 2)::int,
+                "rating_3" = "rating_3" - (OLD."rating" = 3)::int,
+                "rating_4" = "rating_4" - (OLD."rating" = 4)::int,
+                "rating_5" = "rating_5" - (OLD."rating" = 5)::int,
+                "version" = nextval('"game_review_stats_version_seq"')
+            WHERE "game_id" = OLD."game_id";
+        END IF;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF NEW."rating" BETWEEN 1 AND 5 THEN
+            INSERT INTO "game_review_stats" AS "s"
+                ("game_id", "review_count", "rating_sum", "rating_1", "rating_2", "rating_3", "rating_4", "rating_5")
+            VALUES (NEW."game_id", 1, NEW."rating", (NEW."rating" = 1)::int, (NEW."rating" = 2)::int,
+                    (NEW."rating" = 3)::int, (NEW."rating" = 4)::int, (NEW."rating" = 5)::int)
+            ON CONFLICT ("game_id") DO UPDATE
+            SET "review_count" = "s"."review_count" + 1,
+                "rating_sum" = "s"."rating_sum" + EXCLUDED."rating_sum",
+                "rating_1" = "s"."rating_1" + EXCLUDED."rating_1",
+                "rating_2" = "s"."rating_2" + EXCLUDED."rating_2",
+                "rating_3" = "s"."rating_3" + EXCLUDED."rating_3",
+                "rating_4" = "s"."rating_4" + EXCLUDED."rating_4",
+                "rating_5" = "s"."rating_5" + EXCLUDED."rating_5",
+                "version" = EXCLUDED."version";
+        END IF;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- The first time, the trigger is created and the existing reviews are counted in one
+-- transaction. Creating the trigger locks out review writes until it commits, so no
+-- review is counted twice or missed.
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'review_stats_trigger' AND tgrelid = '"review"'::regclass) THEN
+        CREATE TRIGGER "review_stats_trigger"
+            AFTER INSERT OR DELETE OR UPDATE OF "game_id", "rating" ON "review"
+            FOR EACH ROW EXECUTE FUNCTION "game_review_stats_apply"();
+
+        DELETE FROM "game_review_stats";
+        INSERT INTO "game_review_stats"
+            ("game_id", "review_count", "rating_sum", "rating_1", "rating_2", "rating_3", "rating_4", "rating_5")
+        SELECT
+            "game_id",
+            COUNT(*),
+            SUM("rating"),
+            COUNT(*) FILTER (WHERE "rating" = 1),
+            COUNT(*) FILTER (WHERE "rating" = 2),
+            COUNT(*) FILTER (WHERE "rating" = 3),
+            COUNT(*) FILTER (WHERE "rating" = 4),
+            COUNT(*) FILTER (WHERE "rating" = 5)
+        FROM "review"
+        WHERE "rating" BETWEEN 1 AND 5
+        GROUP BY "game_id";
+    END IF;
+END $$;
@@ -0,0 +1,10 @@
+-- Full-text search over review texts for "search reviews". The parsed text is stored
+-- with every review, so matching and ranking read it instead of parsing the texts of
+-- every match again on every page. Adding the column rewrites "review" once.
+ALTER TABLE "review" ADD COLUMN IF NOT EXISTS "texts_tsv" tsvector
+    GENERATED ALWAYS AS (to_tsvector('english', COALESCE("texts", ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS "review_texts_tsv_col_idx" ON "review" USING GIN ("texts_tsv");
+
+-- Superseded by the index on the stored column
+DROP INDEX IF EXISTS "review_texts_tsv_idx";
@@ -0,0 +1,6 @@
+-- Server nodes of the cluster and when each of them last showed it is alive. Sessions
+-- held by a node that stopped sending heartbeats can be claimed by the other nodes.
+CREATE TABLE IF NOT EXISTS "server_node" (
+    "node_id" TEXT PRIMARY KEY,
+    "heartbeat" TIMESTAMP NOT NULL DEFAULT now()
+);
@@ -0,0 +1,137 @@
+import json
+import time
+import threading
+import psycopg
+from psycopg import Cursor
+import queries
+
+BUS_LOCAL = "local"
+BUS_PG_NOTIFY = "pg"
+
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more
+NOTIFY_PAYLOAD_MAXLEN = 7999
+
+# Carries room events between server nodes. Every node keeps its own room registry and
+# its own client sockets; an event published on one node is applied by all the others,
+# each of which delivers the pushes to the recipients connected to it.
+class BroadcastBus:
+    def __init__(self, node_id: str):
+        self.node_id = node_id
+        self._lock = threading.Lock()
+        self._n_published = 0
+        self._n_received = 0
+        self._n_reconnects = 0
+
+    def open(self):
+        # Starts buffering events, so none are lost while the caller loads its state
+        pass
+
+    def start(self, on_event, on_resync):
+        # on_event(event) runs for every event published by another node; on_resync() runs
+        # after events may have been missed and the caller should reload its state
+        pass
+
+    def publish(self, event: dict, cursor: Cursor | None = None):
+        # With a cursor the event is only delivered if that transaction commits
+        pass
+
+    def close(self):
+        pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "nodeID": self.node_id,
+                "published": self._n_published,
+                "received": self._n_received,
+                "reconnects": self._n_reconnects
+            }
+
+class LocalBus(BroadcastBus):
+    # Single-node deployments: there is nobody else to tell
+    pass
+
+class PgNotifyBus(BroadcastBus):
+    def __init__(self, conninfo: str, node_id: str, channel: str = "steam_together"):
+        super().__init__(node_id)
+        self.conninfo = conninfo
+        self.channel = channel
+        self._listen_conn = None
+        self._publish_conn = None
+        self._publish_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _listen(self):
+        self._listen_conn = psycopg.connect(self.conninfo, autocommit = True)
+        self._listen_conn.execute("LISTEN {};".format(self.channel))
+
+    def open(self):
+        self._listen()
+
+    def start(self, on_event, on_resync):
+        self._thread = threading.Thread(target = self._listen_loop, args = (on_event, on_resync), daemon = True)
+        self._thread.start()
+
+    def _listen_loop(self, on_event, on_resync):
+        while not self._stopped.is_set():
+            try:
+                for notify in self._listen_conn.notifies(timeout = 1.0):
+                    event = json.loads(notify.payload)
+                    if event.get("origin") == self.node_id:
+                        continue
+                    with self._lock:
+                        self._n_received += 1
+                    try:
+                        on_event(event)
+                    except Exception as e:
+                        print("[Error] {}".format(e))
+
+            except psycopg.OperationalError as e:
+                if self._stopped.is_set():
+                    break
+                print("[Error] Lost the bus connection: {}".format(e))
+                self._reconnect()
+                # Notifications sent while we were away are gone
+                try:
+                    on_resync()
+                except Exception as e:
+                    print("[Error] {}".format(e))
+
+    def _reconnect(self):
+        while not self._stopped.is_set():
+            try:
+                self._listen_conn.close()
+                self._listen()
+                with self._lock:
+                    self._n_reconnects += 1
+                return
+            except psycopg.OperationalError:
+                time.sleep(1.0)
+
+    def publish(self, event: dict, cursor: Cursor | None = None):
+        event["origin"] = self.node_id
+        payload = json.dumps(event)
+        if len(payload.encode("utf-8")) > NOTIFY_PAYLOAD_MAXLEN:
+            raise ValueError("Event of {} bytes is too large for the bus".format(len(payload.encode("utf-8"))))
+
+        params = {"channel": self.channel, "payload": payload}
+        if cursor is not None:
+            queries.execute(cursor, "bus.notify", params)
+        else:
+            with self._publish_lock:
+                if self._publish_conn is None or self._publish_conn.closed:
+                    self._publish_conn = psycopg.connect(self.conninfo, autocommit = True)
+                with self._publish_conn.cursor() as publish_cursor:
+                    queries.execute(publish_cursor, "bus.notify", params)
+
+        with self._lock:
+            self._n_published += 1
+
+    def close(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout = 2.0)
+        for conn in (self._listen_conn, self._publish_conn):
+            if conn is not None:
+                conn.close()
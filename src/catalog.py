@@ -0,0 +1,176 @@
+import sys
+import threading
+import datetime
+from psycopg import Cursor
+import queries
+
+class Game:
+    __slots__ = ("game_id", "game_name", "release_date", "price", "total_achievements",
+                 "positive_ratings", "negative_ratings", "genres", "review_count", "rating_sum",
+                 "review_version")
+
+    def __init__(self, game_id: int, game_name: str, release_date: datetime.date | None, price: float | None,
+                 total_achievements: int | None, positive_ratings: int | None, negative_ratings: int | None,
+                 genres: tuple[str, ...], review_count: int = 0, rating_sum: int = 0, review_version: int = 0):
+        self.game_id = game_id
+        self.game_name = game_name
+        self.release_date = release_date
+        self.price = price
+        self.total_achievements = total_achievements
+        self.positive_ratings = positive_ratings
+        self.negative_ratings = negative_ratings
+        self.genres = genres
+        # Reviews on this system, from "game_review_stats"
+        self.review_count = review_count
+        self.rating_sum = rating_sum
+        self.review_version = review_version
+
+    def average_rating(self) -> float | None:
+        return self.rating_sum / self.review_count if self.review_count else None
+
+    def with_review_stats(self, review_count: int, rating_sum: int, review_version: int) -> "Game":
+        return Game(self.game_id, self.game_name, self.release_date, self.price, self.total_achievements,
+                    self.positive_ratings, self.negative_ratings, self.genres,
+                    review_count, rating_sum, review_version)
+
+# Indexes built on top of the catalog subclass this and are kept in step with it. The
+# callbacks run while the catalog lock is held, so they see changes in commit order.
+class CatalogListener:
+    def catalog_loaded(self, games: list[Game]):
+        pass
+
+    def game_upserted(self, game: Game, old: Game | None):
+        pass
+
+    def game_removed(self, game: Game):
+        pass
+
+# In-process copy of the game catalog. Games only change through the admin handlers,
+# which have the cache re-read the rows they changed once their transaction commits.
+class Catalog:
+    def __init__(self):
+        self._lock = threading.RLock()
+        # Held from reading rows to applying them, so reads apply in the order they were made
+        self._refresh_lock = threading.Lock()
+        self._games = {}
+        self._listeners = []
+        self._n_hits = 0
+        self._n_misses = 0
+
+    def add_listener(self, listener: CatalogListener):
+        with self._lock:
+            self._listeners.append(listener)
+            listener.catalog_loaded(list(self._games.values()))
+
+    def fetch(self, cursor: Cursor, game_ids: list[int] | None = None) -> dict[int, Game]:
+        # Reads games from the database without touching the cache. Called inside a
+        # transaction, it sees that transaction's own uncommitted changes.
+        queries.execute(cursor, "catalog.games", {"game_ids": game_ids})
+        rows = cursor.fetchall()
+        queries.execute(cursor, "catalog.genres", {"game_ids": game_ids})
+        genres = {}
+        for row in cursor.fetchall():
+            # Only a few dozen distinct genres exist, so every game shares the same strings
+            genres.setdefault(row["game_id"], []).append(sys.intern(row["genre"]))
+
+        games = {}
+        for row in rows:
+            games[row["game_id"]] = Game(
+                row["game_id"],
+                row["game_name"],
+                row["release_date"],
+                float(row["price"]) if row["price"] is not None else None,
+                row["total_achievements"],
+                row["positive_ratings"],
+                row["negative_ratings"],
+                tuple(sorted(genres.get(row["game_id"], ()))),
+                row["review_count"] or 0,
+                row["rating_sum"] or 0,
+                row["review_version"] or 0
+            )
+        return games
+
+    def load(self, cursor: Cursor):
+        with self._refresh_lock:
+            games = self.fetch(cursor)
+            with self._lock:
+                self._games = games
+                for listener in self._listeners:
+                    listener.catalog_loaded(list(games.values()))
+
+    def apply(self, game_ids: list[int], games: dict[int, Game]):
+        # Makes the cache match the database for game_ids: ids present in games are
+        # inserted or replaced, the others were deleted
+        with self._lock:
+            for game_id in game_ids:
+                game = games.get(game_id)
+                if game is not None:
+                    old = self._games.get(game_id)
+                    # Review statistics applied since the row was read are newer
+                    if old is not None and old.review_version > game.review_version:
+                        game = game.with_review_stats(old.review_count, old.rating_sum, old.review_version)
+                    self._games[game_id] = game
+                    for listener in self._listeners:
+                        listener.game_upserted(game, old)
+                else:
+                    old = self._games.pop(game_id, None)
+                    if old is not None:
+                        for listener in self._listeners:
+                            listener.game_removed(old)
+
+    def apply_review_stats(self, game_id: int, review_count: int, rating_sum: int, review_version: int):
+        # Sets a game's row of "game_review_stats" as of a committed transaction. Copies
+        # older than the one cached are ignored, so these can arrive in any order and
+        # more than once, and may overlap with loads and whole-row updates.
+        with self._lock:
+            old = self._games.get(game_id)
+            if old is None or old.review_version >= review_version:
+                return
+            game = old.with_review_stats(review_count, rating_sum, review_version)
+            self._games[game_id] = game
+            for listener in self._listeners:
+                listener.game_upserted(game, old)
+
+    def refresh(self, cursor: Cursor, game_ids: list[int]):
+        # Called after the changes to game_ids committed. A refresh that read older rows
+        # can never be applied after one that read newer rows.
+        with self._refresh_lock:
+            self.apply(game_ids, self.fetch(cursor, game_ids))
+
+    def get(self, game_id: int) -> Game | None:
+        with self._lock:
+            game = self._games.get(game_id)
+            if game is None:
+                self._n_misses += 1
+            else:
+                self._n_hits += 1
+            return game
+
+    def games(self) -> list[Game]:
+        with self._lock:
+            return list(self._games.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            games = list(self._games.values())
+            n_lookups = self._n_hits + self._n_misses
+            stats = {
+                "games": len(games),
+                "hits": self._n_hits,
+                "misses": self._n_misses,
+                "hitRate": round(self._n_hits / n_lookups, 4) if n_lookups else 0
+            }
+
+        # Approximate footprint: the id map plus every game and the values it owns.
+        # Interned genre strings are shared and counted once.
+        size = sys.getsizeof(self._games)
+        genres = set()
+        for game in games:
+            size += sys.getsizeof(game) + sys.getsizeof(game.game_name) + sys.getsizeof(game.genres)
+            size += sum(sys.getsizeof(value) for value in (game.release_date, game.price, game.total_achievements,
+                                                           game.positive_ratings, game.negative_ratings) if value is not None)
+            genres.update(game.genres)
+        size += sum(sys.getsizeof(genre) for genre in genres)
+        stats["genres"] = len(genres)
+        stats["memoryBytes"] = size
+        return stats
@@ -12,7 +12,6 @@ from network_utils import *
 RETCODE_NORMAL = 1
 RETCODE_QUIT = 0
 RETCODE_ERROR = -1
-BUFFER_MAXLEN = 8192
 
 PAGE_STACK_MAXLEN = 10
 
@@ -63,6 +62,10 @@ Please choose from the below options:
 
 [9] Check game reviews
 
+[10] Recommend games for me
+
+[11] Search reviews
+
 [c] Clear the screen
 
 [q] Quit
@@ -85,6 +88,10 @@ Please choose from the below options:
 
 [5] Update user
 
+[6] Server statistics
+
+[7] Bulk add/update games from a JSON file
+
 [c] Clear the screen
 
 [q] Quit
@@ -110,7 +117,203 @@ user_state = {
     }
 }
 
-def _init_page(server_sock: socket.socket, pages: list[tuple]) -> int:
+def _search_games(channel: RequestChannel, request: dict) -> int:
+    # Results come one page at a time; the next page is only requested when the user asks for it
+    game_name = request.get("gameName")
+    n_games = 0
+    print("Results:\n")
+    while True:
+        response = channel.call(request)
+
+        if response["status"] == "FAIL":
+            print("Get the following error from server: {}".format(response))
+            return RETCODE_NORMAL
+        elif response["status"] != "OK":
+            return RETCODE_ERROR
+
+        # Facets describe the whole result, so they are only asked for with the first page
+        if response.get("facets"):
+            facet_titles = [("genres", "Genres"), ("priceBands", "Price bands"), ("releaseYears", "Release years")]
+            for key, title in facet_titles:
+                counts = sorted(response["facets"][key].items(), key = lambda item: item[1], reverse = True)
+                print("{}:\t{}".format(title, ", ".join("{} ({})".format(value, count) for value, count in counts)))
+            print()
+        request.pop("facets", None)
+
+        if game_name:
+            game_name_lc = game_name.lower()
+        for data in response["data"]:
+            # Full-text matches may not contain the query as a substring
+            match_pos = data["gameName"].lower().find(game_name_lc) if game_name else -1
+            if match_pos >= 0:
+                game_name_formatted = "{}{}{}{}{}".format(
+                    data["gameName"][:match_pos],
+                    FG_COLOR_GREEN,
+                    data["gameName"][match_pos:match_pos + len(game_name)],
+                    STYLE_DEFAULT,
+                    data["gameName"][match_pos + len(game_name):]
+                )
+                print("Game:\t\t\t{}".format(game_name_formatted))
+            else:
+                print("Game:\t\t\t{}".format(data["gameName"]))
+            print("Game ID:\t\t{}".format(data["gameID"]))
+            print("Genres:\t\t\t{}".format("/".join(data["genres"])))
+            print("Release Date:\t\t{}".format(data["releaseDate"]))
+            print("Price:\t\t\t{}".format(data["price"]))
+            print("Total Achievements:\t{}".format(data["totalAchievements"]))
+            print("Positive Ratings:\t{}".format(data["positiveRatings"]))
+            print("Negative Ratings:\t{}".format(data["negativeRatings"]))
+            if data["reviewCount"]:
+                print("Reviews:\t\t{} (average rating {})".format(data["reviewCount"], data["averageRating"]))
+            print()
+        n_games += len(response["data"])
+
+        if not response.get("nextCursor"):
+            break
+        if input("{} games shown. Press N for the next page, or ENTER to stop: ".format(n_games)).strip().upper() != "N":
+            return RETCODE_NORMAL
+        request["cursor"] = response["nextCursor"]
+
+    print("{} games were found.".format(n_games))
+    press_enter_to_continue()
+
+    return RETCODE_NORMAL
+
+def _check_reviews(channel: RequestChannel, request: dict) -> int:
+    # The summary comes with the first page; later pages are only requested on demand
+    n_reviews = 0
+    while True:
+        response = channel.call(request)
+
+        if response["status"] == "FAIL":
+            print("Failed to get review. Get the following error from the server: {}".format(response["errorMessage"]))
+            press_enter_to_continue()
+            return RETCODE_NORMAL
+        elif response["status"] != "OK":
+            return RETCODE_ERROR
+
+        if response.get("summary"):
+            summary = response["summary"]
+            print("{} reviews, average rating {}\n".format(summary["count"], summary["average"] if summary["average"] is not None else "-"))
+            for rating in range(5, 0, -1):
+                count = summary["histogram"][str(rating)]
+                bar = "#" * round(40 * count / summary["count"]) if summary["count"] else ""
+                print("{} stars: {:<40} {}".format(rating, bar, count))
+            print("\nResults:\n")
+
+        for review in response["reviews"]:
+            print("User ID: {}".format(review["userID"]))
+            if review["reviewTime"]:
+                print("Time: {}".format(review["reviewTime"]))
+            print("Review: {}".format(review["reviewText"]))
+            print("Rating: {}".format(review["reviewRating"]))
+            print()
+        n_reviews += len(response["reviews"])
+
+        if not response.get("nextCursor"):
+            break
+        if input("{} reviews shown. Press N for the next page, or ENTER to stop: ".format(n_reviews)).strip().upper() != "N":
+            return RETCODE_NORMAL
+        request["cursor"] = response["nextCursor"]
+
+    print("{} reviews were found.".format(n_reviews))
+    press_enter_to_continue()
+
+    return RETCODE_NORMAL
+
+def _bulk_games(channel: RequestChannel, games: list) -> int:
+    # Games with a game ID update existing games, the others are added
+    for request_type, batch in (("bulk update games", [game for game in games if "gameID" in game]),
+                                ("bulk add games", [game for game in games if "gameID" not in game])):
+        if not batch:
+            continue
+        request = {
+            "requestType": request_type,
+            "games": batch
+        }
+
+        response = channel.call(request)
+
+        if response["status"] == "FAIL":
+            print("{} failed. Get the following error from the server: {}".format(request_type.capitalize(), response["errorMessage"]))
+            continue
+        elif response["status"] != "OK":
+            return RETCODE_ERROR
+
+        print("{}: {} of {} games succeeded".format(request_type.capitalize(), response["succeeded"], len(batch)))
+        for game, result in zip(batch, response["results"]):
+            if result["status"] != "OK":
+                print(FG_COLOR_YELLOW + "  {}: {}".format(game.get("gameID", game.get("gameName")), result["errorMessage"]) + STYLE_DEFAULT)
+    press_enter_to_continue()
+    return RETCODE_NORMAL
+
+def _search_reviews(channel: RequestChannel, request: dict) -> int:
+    n_reviews = 0
+    print("Results:\n")
+    while True:
+        response = channel.call(request)
+
+        if response["status"] == "FAIL":
+            print("Failed to search reviews. Get the following error from the server: {}".format(response["errorMessage"]))
+            press_enter_to_continue()
+            return RETCODE_NORMAL
+        elif response["status"] != "OK":
+            return RETCODE_ERROR
+
+        for review in response["reviews"]:
+            # Matched words come wrapped in <mark> tags
+            snippet = review["snippet"].replace("<mark>", FG_COLOR_GREEN).replace("</mark>", STYLE_DEFAULT)
+            print("Game: {} (Game ID: {})".format(review["gameName"], review["gameID"]))
+            print("User ID: {}".format(review["userID"]))
+            print("Rating: {}".format(review["reviewRating"]))
+            print("Review: ...{}...".format(snippet))
+            print()
+        n_reviews += len(response["reviews"])
+
+        if not response.get("nextCursor"):
+            break
+        if input("{} reviews shown. Press N for the next page, or ENTER to stop: ".format(n_reviews)).strip().upper() != "N":
+            return RETCODE_NORMAL
+        request["cursor"] = response["nextCursor"]
+
+    print("{} reviews were found.".format(n_reviews))
+    press_enter_to_continue()
+
+    return RETCODE_NORMAL
+
+def _prompt_game_id(channel: RequestChannel, prompt: str, optional: bool = False) -> int | None:
+    # Accepts a game id, or the start of a name word, which is completed by the server.
+    # An optional game id may be skipped with ENTER.
+    while True:
+        text = input(prompt).strip()
+        if text.isdigit():
+            return int(text)
+        if not text and optional:
+            return None
+        if not text:
+            print("Invalid input. Please try again.")
+            continue
+
+        request = {
+            "requestType": "suggest games",
+            "prefix": text
+        }
+        response = channel.call(request)
+        if response["status"] != "OK":
+            print("Get the following error from server: {}".format(response["errorMessage"]))
+            continue
+        if not response["suggestions"]:
+            print("No game name starts with \"{}\". Please try again.".format(text))
+            continue
+
+        for i, suggestion in enumerate(response["suggestions"], 1):
+            print("[{}] {} (Game ID: {}, Positive Ratings: {})".format(
+                i, suggestion["gameName"], suggestion["gameID"], suggestion["positiveRatings"]))
+        choice = input("Pick a game by its number (Press ENTER to search again): ").strip()
+        if choice.isdigit() and 1 <= int(choice) <= len(response["suggestions"]):
+            return response["suggestions"][int(choice) - 1]["gameID"]
+
+def _init_page(channel: RequestChannel, pages: list[tuple]) -> int:
     while True:
         command_prompt()
         opt = input()
@@ -125,12 +328,12 @@ def _init_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                 "requestType": "exit",
                 "userID": user_state["userID"]
             }
-            sendall(server_sock, request)
+            channel.submit(request)
             return RETCODE_QUIT
         else:
             print("Invalid option id. Please enter again.")
 
-def _sign_in_page(server_sock: socket.socket, pages: list[tuple]) -> int:
+def _sign_in_page(channel: RequestChannel, pages: list[tuple]) -> int:
     while True:
         user_id = input("User ID: ")
         try:
@@ -144,8 +347,7 @@ def _sign_in_page(server_sock: socket.socket, pages: list[tuple]) -> int:
         "userID": user_id,
         "password": password
     }
-    sendall(server_sock, request)
-    response = json.loads(recvall(server_sock, BUFFER_MAXLEN))
+    response = channel.call(request)
     if response["status"] == "OK":
         user_state["userID"] = user_id
         user_state["userName"] = response["userName"]
@@ -167,7 +369,7 @@ def _sign_in_page(server_sock: socket.socket, pages: list[tuple]) -> int:
     else:
         return RETCODE_ERROR
         
-def _sign_up_page(server_sock: socket.socket, pages: list[tuple]) -> int:
+def _sign_up_page(channel: RequestChannel, pages: list[tuple]) -> int:
     user_name = input("User name: ")
     email = input("Email: ")
     while True:
@@ -191,8 +393,7 @@ def _sign_up_page(server_sock: socket.socket, pages: list[tuple]) -> int:
         "password": password,
         "role": role
     }
-    sendall(server_sock, request)
-    response = json.loads(recvall(server_sock, BUFFER_MAXLEN))
+    response = channel.call(request)
 
     if response["status"] == "OK":
         print("Sign up OK.")
@@ -210,7 +411,7 @@ def _sign_up_page(server_sock: socket.socket, pages: list[tuple]) -> int:
     else:
         return RETCODE_ERROR
 
-def _user_dashboard_page(server_sock: socket.socket, pages: list[tuple]) -> int:
+def _user_dashboard_page(channel: RequestChannel, pages: list[tuple]) -> int:
     while True:
         command_prompt(user_state["userName"])
         opt = input()
@@ -221,6 +422,14 @@ def _user_dashboard_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                     game_name = None
                 genres = input("Game genres (Press ENTER if you want to skip this. Split by commas if multiple inputs): ")
                 genres = [genre.strip() for genre in genres.split(",")] if genres else None
+                genre_match = None
+                if genres and len(genres) > 1:
+                    while True:
+                        genre_match = input("Find games with [Y]any [L]all of these genres (Press ENTER for any): ").upper()
+                        if genre_match in ("", "Y", "L"):
+                            genre_match = "all" if genre_match == "L" else "any"
+                            break
+                        print("Invalid input. Please try again.")
                 while True:
                     price_low = input("Price lower bound (Press ENTER if you want to skip this): ")
                     if not price_low:
@@ -245,52 +454,38 @@ def _user_dashboard_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                         except:
                             print("Invalid input. Please try again.")
 
+                name_match = None
+                if game_name:
+                    while True:
+                        name_match = input("Match the game name by [S]substring [F]full text [T]typo-tolerant (Press ENTER for substring): ").upper()
+                        if name_match in ("", "S", "F", "T"):
+                            name_match = {"F": "fulltext", "T": "fuzzy"}.get(name_match, "substring")
+                            break
+                        print("Invalid input. Please try again.")
+
+                sort_options = {"1": "name", "2": "releaseDate", "3": "positiveRatings", "4": "price", "5": "averageRating", "6": "reviewCount"}
+                if game_name:
+                    sort_options["7"] = "relevance"
+                while True:
+                    sort_opt = input("Sort by [1] name [2] release date [3] positive ratings [4] price [5] average rating [6] review count{} (Press ENTER for the default order): ".format(" [7] relevance" if game_name else ""))
+                    if not sort_opt or sort_opt in sort_options:
+                        break
+                    print("Invalid input. Please try again.")
+
+                show_facets = input("Show result counts by genre, price band and release year? [y/N]: ").strip().upper() == "Y"
+
                 request = {
                     "requestType": "search games",
                     "gameName": game_name,
+                    "nameMatch": name_match,
                     "genres": genres,
+                    "genreMatch": genre_match,
                     "priceLow": price_low,
-                    "priceUpp": price_upp
+                    "priceUpp": price_upp,
+                    "sortBy": sort_options.get(sort_opt),
+                    "facets": show_facets
                 }
-                sendall(server_sock, request)
-                response = json.loads(recvall(server_sock, BUFFER_MAXLEN))
-
-                if response["status"] == "OK":
-                    print("Results:\n")
-                    if game_name:
-                        game_name_lc = game_name.lower()
-                    for data in response["data"]:
-                        if game_name:
-                            match_pos = data["gameName"].lower().find(game_name_lc)
-                            game_name_formatted = "{}{}{}{}{}".format(
-                                data["gameName"][:match_pos],
-                                FG_COLOR_GREEN,
-                                data["gameName"][match_pos:match_pos + len(game_name)],
-                                STYLE_DEFAULT,
-                                data["gameName"][match_pos + len(game_name):]
-                            )
-                            print("Game:\t\t\t{}".format(game_name_formatted))
-                        else:
-                            print("Game:\t\t\t{}".format(data["gameName"]))
-                        print("Game ID:\t\t{}".format(data["gameID"]))
-                        print("Genres:\t\t\t{}".format("/".join(data["genres"])))
-                        print("Release Date:\t\t{}".format(data["releaseDate"]))
-                        print("Total Achievements:\t{}".format(data["totalAchievements"]))
-                        print("Positive Ratings:\t{}".format(data["positiveRatings"]))
-                        print("Negative Ratings:\t{}".format(data["negativeRatings"]))
-                        print()
-
-                    print("{} games were found.".format(len(response["data"])))
-                    press_enter_to_continue()
-
-                    return RETCODE_NORMAL
-
-                elif response["status"] == "FAIL":
-                    print("Get the following error from server: {}".format(response))              
-                    return RETCODE_NORMAL
-                
-                else:
-                    return RETCODE_ERROR
+                return _search_games(channel, request)
 
             case "2": # Add/Delete Reviews
                 options_prompt = "What do you want to do with your review? [A]add [D]delete"
@@ -304,12 +499,7 @@ def _user_dashboard_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                         print("Invalid input. Please try again.")
 
                 if opt == "A":
-                    while True:
-                        try:
-                            game_id = int(input("game id: "))
-                            break
-                        except:
-                            print("Invalid input. Please try again.")
+                    game_id = _prompt_game_id(channel, "Game id or name: ")
                     review_text = input("Please write your review (Or press ENTER to skip): ")
                     while True:
                         try:
@@ -326,12 +516,7 @@ def _user_dashboard_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                         "reviewRating": review_rating
                     }
                 else:
-                    while True:
-                        try:
-                            game_id = int(input("game id: "))
-                            break
-                        except:
-                            print("Invalid input. Please try again.")
+                    game_id = _prompt_game_id(channel, "Game id or name: ")
 
                     request = {
                         "requestType": "delete review",
@@ -339,8 +524,7 @@ def _user_dashboard_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                         "gameID": game_id
                     }
 
-                sendall(server_sock, request)
-                response = json.loads(recvall(server_sock, BUFFER_MAXLEN))
+                response = channel.call(request)
 
                 if response["status"] == "OK":
                     if opt == "A":
@@ -367,20 +551,14 @@ def _user_dashboard_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                 return RETCODE_NORMAL
             
             case "3": # Add to favorites
-                while True:
-                    try:
-                        game_id = int(input("Please input the game id: "))
-                        break                    
-                    except:
-                        print("Invalid input, Please try again.")
+                game_id = _prompt_game_id(channel, "Please input the game id or name: ")
                 request = {
                     "requestType": "add to favorite",
                     "userID": user_state["userID"],
                     "gameID": game_id
                 }
 
-                sendall(server_sock, request)
-                response = json.loads(recvall(server_sock, BUFFER_MAXLEN))
+                response = channel.call(request)
 
                 if response["status"] == "OK":
                     print("The game has been add to your favorites.")
@@ -395,12 +573,7 @@ def _user_dashboard_page(server_sock: socket.socket, pages: list[tuple]) -> int:
 
             case "4": # Create a room
                 room_name = input("The name of your room: ")
-                while True:
-                    try:
-                        game_id = int(input("Determine the game you want to play and input the game id: "))
-                        break
-                    except:
-                        print("Invalid input. Please try again.")
+                game_id = _prompt_game_id(channel, "Determine the game you want to play and input the game id or name: ")
                 while True:
                     max_members = input("Determine the maximum members for the room (Press ENTER if you want to skip this. Default is 10): ")
                     if max_members:
@@ -420,8 +593,7 @@ def _user_dashboard_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                     "gameID": game_id
                 }
 
-                sendall(server_sock, request)
-                response = json.loads(recvall(server_sock, BUFFER_MAXLEN))
+                response = channel.call(request)
 
                 if response["status"] == "OK":
                     room_id = response["roomID"]
@@ -465,8 +637,7 @@ def _user_dashboard_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                     "roomID": room_id
                 }
 
-                sendall(server_sock, request)
-                response = json.loads(recvall(server_sock, BUFFER_MAXLEN))
+                response = channel.call(request)
 
                 if response["status"] == "OK":
                     user_state["room"]["roomID"] = room_id
@@ -508,8 +679,7 @@ def _user_dashboard_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                     "userID": user_id
                 }
 
-                sendall(server_sock, request)
-                response = json.loads(recvall(server_sock, BUFFER_MAXLEN))
+                response = channel.call(request)
 
                 if response["status"] == "OK":
                     print("Found user:\n")
@@ -557,8 +727,7 @@ def _user_dashboard_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                 if new_password:
                     request["updated"]["password"] = new_password
 
-                sendall(server_sock, request)
-                response = json.loads(recvall(server_sock, BUFFER_MAXLEN))
+                response = channel.call(request)
 
                 if response["status"] == "OK":
                     print("Update OK. The updated profile is listed below:")
@@ -584,13 +753,19 @@ def _user_dashboard_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                             print("Invalid input. Please try again.")
                     else:
                         break
+                genres = input("Game genres (Press ENTER if you want to skip this. Split by commas if multiple inputs): ")
+                genres = [genre.strip() for genre in genres.split(",")] if genres else None
+                hide_full = input("Hide full rooms? [y/N]: ").strip().upper() == "Y"
+                sort_by = "fillLevel" if input("List the fullest rooms first? [y/N]: ").strip().upper() == "Y" else None
 
                 request = {
                     "requestType": "list rooms",
-                    "gameID": game_id
+                    "gameID": game_id,
+                    "genres": genres,
+                    "hideFull": hide_full,
+                    "sortBy": sort_by
                 }
-                sendall(server_sock, request)
-                response = json.loads(recvall(server_sock, BUFFER_MAXLEN))
+                response = channel.call(request)
 
                 if response["status"] == "OK":
                     print("Results:\n")
@@ -613,12 +788,7 @@ def _user_dashboard_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                     return RETCODE_ERROR
 
             case "9": # Check user reviews
-                while True:
-                    try:
-                        game_id = int(input("Please enter the game id: "))
-                        break
-                    except:
-                        print("Invalid input. Please try again.")
+                game_id = _prompt_game_id(channel, "Please enter the game id or name: ")
                 while True:
                     user_id = input("Please input the id of the target user (Press ENTER if you want to skip this): ")
                     if user_id:
@@ -639,36 +809,74 @@ def _user_dashboard_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                             print("Invalid input. Please try again.")
                     else:
                         break
+                sort_options = {"1": "newest", "2": "oldest", "3": "ratingHigh", "4": "ratingLow"}
+                while True:
+                    sort_opt = input("Sort by [1] newest [2] oldest [3] highest rating [4] lowest rating (Press ENTER for newest): ")
+                    if not sort_opt or sort_opt in sort_options:
+                        break
+                    print("Invalid input. Please try again.")
                 
                 request = {
                     "requestType": "check reviews",
-                    "gameID": game_id
+                    "gameID": game_id,
+                    "sortBy": sort_options.get(sort_opt)
                 }
                 if user_id:
                     request["userID"] = user_id
                 if rating:
                     request["rating"] = rating
 
-                sendall(server_sock, request)
-                response = json.loads(recvall(server_sock, BUFFER_MAXLEN))
+                return _check_reviews(channel, request)
+
+            case "10": # Recommend games
+                request = {
+                    "requestType": "recommend games",
+                    "userID": user_state["userID"]
+                }
+                response = channel.call(request)
 
                 if response["status"] == "OK":
-                    print("Results:\n")
-                    for review in response["reviews"]:
-                        print("User ID: {}".format(review["userID"]))
-                        print("Review: {}".format(review["reviewText"]))
-                        print("Rating: {}".format(review["reviewRating"]))
+                    if response["source"] == "popular":
+                        print("Rate or favorite a few games to get personal recommendations. Popular games for now:\n")
+                    else:
+                        print("Games liked by players who like your games:\n")
+                    for rec in response["recommendations"]:
+                        print("Game Name: {}".format(rec["gameName"]))
+                        print("Game ID: {}".format(rec["gameID"]))
+                        print("Positive Ratings: {}".format(rec["positiveRatings"]))
                         print()
-                    print("{} reviews were found.".format(len(response["reviews"])))
                     press_enter_to_continue()
                     return RETCODE_NORMAL
                 elif response["status"] == "FAIL":
-                    print("Failed to get review. Get the following error from the server: {}".format(response["errorMessage"]))
+                    print("Failed to get recommendations. Get the following error from the server: {}".format(response["errorMessage"]))
                     press_enter_to_continue()
                     return RETCODE_NORMAL
                 else:
                     return RETCODE_ERROR
 
+            case "11": # Search reviews
+                query = input("Words to search for in the reviews: ").strip()
+                game_id = _prompt_game_id(channel, "Only the reviews of the game id or name (Press ENTER if you want to skip this): ", optional = True)
+                while True:
+                    rating = input("Please input the target rating number (Press ENTER if you want to skip this): ")
+                    if rating:
+                        try:
+                            rating = int(rating)
+                            break
+                        except:
+                            print("Invalid input. Please try again.")
+                    else:
+                        rating = None
+                        break
+
+                request = {
+                    "requestType": "search reviews",
+                    "query": query,
+                    "gameID": game_id,
+                    "rating": rating
+                }
+                return _search_reviews(channel, request)
+
             case "c":
                 return RETCODE_NORMAL
 
@@ -677,7 +885,7 @@ def _user_dashboard_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                     "requestType": "exit",
                     "userID": user_state["userID"]
                 }
-                server_sock.send(json.dumps(request).encode('utf-8'))
+                channel.submit(request)
                 return RETCODE_QUIT
             
             case _:
@@ -703,14 +911,33 @@ def json_split(json_stream: str):
 
     return jsons
     
-def _room_page(server_sock: socket.socket, pages: list[tuple]) -> int:
+def _room_page(channel: RequestChannel, pages: list[tuple]) -> int:
     messages = []
-    rlist = [sys.stdin, server_sock]
+    rlist = [sys.stdin, channel]
     leave = False
     close = False
     n_members = user_state["room"]["roomNumMembers"]
     n_members_max = user_state["room"]["roomNumMembersLimit"]
     while not leave and not close:
+        # Pushed messages that arrived while waiting for a reply are queued by the channel
+        while channel.pushes and not close:
+            server_message = channel.pushes.popleft()
+            if server_message["messageType"] == "room communication":    
+                messages.append((server_message["fromUserID"], server_message["fromUserName"], server_message["content"]))
+            elif server_message["messageType"] == "room control":
+                if server_message["event"] == "join":
+                    n_members += 1
+                    messages.append((-1, "", "{} joined the room.".format(server_message["userName"])))
+                elif server_message["event"] == "leave":
+                    n_members -= 1
+                    messages.append((-1, "", "{} left the room.".format(server_message["userName"])))
+                elif server_message["event"] == "close":
+                    close = True
+                else:
+                    return RETCODE_ERROR
+        if close:
+            break
+
         clear_screen()
         print(pages[-1][1], end = "")
         print("{: ^{width}}\n{:=^{width}}".format("Members: {:2d}/{:2d}".format(n_members, n_members_max), "", width = shutil.get_terminal_size()[0]))
@@ -739,26 +966,11 @@ def _room_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                             "timestamp": str(datetime.datetime.now().replace(microsecond=0)),
                             "content": line
                         }
-                        sendall(server_sock, request)
-                        response = json.loads(recvall(server_sock, BUFFER_MAXLEN))
+                        response = channel.call(request)
                         if response["status"] == "OK":
                             messages.append((user_state["userID"], user_state["userName"], line))
-            elif readable == server_sock:
-                server_message = json.loads(recvall(server_sock, BUFFER_MAXLEN))
-                if server_message:
-                    if server_message["messageType"] == "room communication":    
-                        messages.append((server_message["fromUserID"], server_message["fromUserName"], server_message["content"]))
-                    elif server_message["messageType"] == "room control":
-                        if server_message["event"] == "join":
-                            n_members += 1
-                            messages.append((-1, "", "{} joined the room.".format(server_message["userName"])))
-                        elif server_message["event"] == "leave":
-                            n_members -= 1
-                            messages.append((-1, "", "{} left the room.".format(server_message["userName"])))
-                        elif server_message["event"] == "close":
-                            close = True
-                        else:
-                            return RETCODE_ERROR
+            elif readable == channel:
+                channel.poll()
     
     # leave room
     if leave:
@@ -767,16 +979,17 @@ def _room_page(server_sock: socket.socket, pages: list[tuple]) -> int:
             "userID": user_state["userID"],
             "roomID": user_state["room"]["roomID"]
         }
-        sendall(server_sock, request)
-        response = json.loads(recvall(server_sock, BUFFER_MAXLEN))
+        response = channel.call(request)
         if response["status"] == "OK":
             print("\033[{};1HYou will now leave the room.\033[0m".format(shutil.get_terminal_size()[1]))
+    # Whatever the room pushed after we left is no longer relevant
+    channel.pushes.clear()
     print("\033[{};1HThe room will be closed as the host has exited.\033[0m".format(shutil.get_terminal_size()[1]))
     press_enter_to_continue()
     pages.append((PAGETYPE_USER_DASHBOARD, PAGE_USER_DASHBOARD))
     return RETCODE_NORMAL
 
-def _admin_page(server_sock: socket.socket, pages: list[tuple]) -> int:
+def _admin_page(channel: RequestChannel, pages: list[tuple]) -> int:
     while True:
         command_prompt(user_state["userName"])
         opt = input()
@@ -852,8 +1065,7 @@ def _admin_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                     for genre in genres:
                         request["genres"].append(genre)
                 
-                sendall(server_sock, request)
-                response = json.loads(recvall(server_sock, BUFFER_MAXLEN))
+                response = channel.call(request)
 
                 if response["status"] == "OK":
                     print("The game has been added to the database.")
@@ -868,13 +1080,7 @@ def _admin_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                     return RETCODE_ERROR
             
             case "2":
-                while True:
-                    game_id = input("Game id: ")
-                    try:
-                        game_id = int(game_id)
-                        break
-                    except:
-                        print("Invalid input. Please try again.")
+                game_id = _prompt_game_id(channel, "Game id or name: ")
                 genres = input("Game genres (Press ENTER if you want to skip this. Split by commas if multiple inputs): ")
                 genres = [genre.strip() for genre in genres.split(',')] if genres else None
                 while True:
@@ -935,8 +1141,7 @@ def _admin_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                     for genre in genres:
                         request["genres"].append(genre)
                 
-                sendall(server_sock, request)
-                response = json.loads(recvall(server_sock, BUFFER_MAXLEN))
+                response = channel.call(request)
 
                 if response["status"] == "OK":
                     print("The game has been updated.")
@@ -955,6 +1160,14 @@ def _admin_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                     game_name = None
                 genres = input("Game genres (Press ENTER if you want to skip this. Split by commas if multiple inputs): ")
                 genres = [genre.strip() for genre in genres.split(",")] if genres else None
+                genre_match = None
+                if genres and len(genres) > 1:
+                    while True:
+                        genre_match = input("Find games with [Y]any [L]all of these genres (Press ENTER for any): ").upper()
+                        if genre_match in ("", "Y", "L"):
+                            genre_match = "all" if genre_match == "L" else "any"
+                            break
+                        print("Invalid input. Please try again.")
                 while True:
                     price_low = input("Price lower bound (Press ENTER if you want to skip this): ")
                     if not price_low:
@@ -979,68 +1192,47 @@ def _admin_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                         except:
                             print("Invalid input. Please try again.")
 
+                name_match = None
+                if game_name:
+                    while True:
+                        name_match = input("Match the game name by [S]substring [F]full text [T]typo-tolerant (Press ENTER for substring): ").upper()
+                        if name_match in ("", "S", "F", "T"):
+                            name_match = {"F": "fulltext", "T": "fuzzy"}.get(name_match, "substring")
+                            break
+                        print("Invalid input. Please try again.")
+
+                sort_options = {"1": "name", "2": "releaseDate", "3": "positiveRatings", "4": "price", "5": "averageRating", "6": "reviewCount"}
+                if game_name:
+                    sort_options["7"] = "relevance"
+                while True:
+                    sort_opt = input("Sort by [1] name [2] release date [3] positive ratings [4] price [5] average rating [6] review count{} (Press ENTER for the default order): ".format(" [7] relevance" if game_name else ""))
+                    if not sort_opt or sort_opt in sort_options:
+                        break
+                    print("Invalid input. Please try again.")
+
+                show_facets = input("Show result counts by genre, price band and release year? [y/N]: ").strip().upper() == "Y"
+
                 request = {
                     "requestType": "search games",
                     "gameName": game_name,
+                    "nameMatch": name_match,
                     "genres": genres,
+                    "genreMatch": genre_match,
                     "priceLow": price_low,
-                    "priceUpp": price_upp
+                    "priceUpp": price_upp,
+                    "sortBy": sort_options.get(sort_opt),
+                    "facets": show_facets
                 }
-                sendall(server_sock, request)
-                response = json.loads(recvall(server_sock, BUFFER_MAXLEN))
-
-                if response["status"] == "OK":
-                    print("Results:\n")
-                    if game_name:
-                        game_name_lc = game_name.lower()
-                    for data in response["data"]:
-                        if game_name:
-                            match_pos = data["gameName"].lower().find(game_name_lc)
-                            game_name_formatted = "{}{}{}{}{}".format(
-                                data["gameName"][:match_pos],
-                                FG_COLOR_GREEN,
-                                data["gameName"][match_pos:match_pos + len(game_name)],
-                                STYLE_DEFAULT,
-                                data["gameName"][match_pos + len(game_name):]
-                            )
-                            print("Game:\t\t\t{}".format(game_name_formatted))
-                        else:
-                            print("Game:\t\t\t{}".format(data["gameName"]))
-                        print("Game ID:\t\t{}".format(data["gameID"]))
-                        print("Genres:\t\t\t{}".format("/".join(data["genres"])))
-                        print("Release Date:\t\t{}".format(data["releaseDate"]))
-                        print("Total Achievements:\t{}".format(data["totalAchievements"]))
-                        print("Positive Ratings:\t{}".format(data["positiveRatings"]))
-                        print("Negative Ratings:\t{}".format(data["negativeRatings"]))
-                        print()
-
-                    print("{} games were found.".format(len(response["data"])))
-                    press_enter_to_continue()
-
-                    return RETCODE_NORMAL
-
-                elif response["status"] == "FAIL":
-                    print("Get the following error from server: {}".format(response))              
-                    return RETCODE_NORMAL
-                
-                else:
-                    return RETCODE_ERROR                
+                return _search_games(channel, request)
 
             case "4":
-                while True:
-                    game_id = input("Game id: ")
-                    try:
-                        game_id = int(game_id)
-                        break
-                    except:
-                        print("Invalid input. Please try again.")
+                game_id = _prompt_game_id(channel, "Game id or name: ")
                 request = {
                     "requestType": "delete game",
                     "gameID": game_id
                 }
 
-                sendall(server_sock, request)
-                response = json.loads(recvall(server_sock, BUFFER_MAXLEN))
+                response = channel.call(request)
 
                 if response["status"] == "OK":
                     print("The game has deleted.")
@@ -1087,8 +1279,7 @@ def _admin_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                 if new_password:
                     request["updated"]["password"] = new_password
 
-                sendall(server_sock, request)
-                response = json.loads(recvall(server_sock, BUFFER_MAXLEN))
+                response = channel.call(request)
 
                 if response["status"] == "OK":
                     print("Update OK. The updated profile is listed below:")
@@ -1103,6 +1294,42 @@ def _admin_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                 else:
                     return RETCODE_ERROR
             
+            case "6":
+                request = {
+                    "requestType": "server stats"
+                }
+
+                response = channel.call(request)
+
+                if response["status"] == "OK":
+                    print("Online users: {}".format(response["stats"]["onlineUsers"]))
+                    for section, counters in response["stats"].items():
+                        if type(counters) == dict:
+                            print("\n[{}]".format(section))
+                            for name, value in counters.items():
+                                print("  {}: {}".format(name, value))
+                    press_enter_to_continue()
+                    return RETCODE_NORMAL
+                elif response["status"] == "FAIL":
+                    print("Failed to get server statistics. Get the following error from the server: {}".format(response["errorMessage"]))
+                    press_enter_to_continue()
+                    return RETCODE_NORMAL
+                else:
+                    return RETCODE_ERROR
+
+            case "7":
+                path = input("Path of the JSON file (a list of games with the fields of [1] or [2]): ")
+                try:
+                    with open(path, encoding = "utf-8") as f:
+                        games = json.load(f)
+                    if type(games) != list or not all(type(game) == dict for game in games):
+                        raise ValueError("the file does not hold a list of games")
+                except Exception as e:
+                    print("Cannot read the file: {}".format(e))
+                    press_enter_to_continue()
+                    return RETCODE_NORMAL
+                return _bulk_games(channel, games)
+
             case "c":
                 return RETCODE_NORMAL
             
@@ -1111,25 +1338,25 @@ def _admin_page(server_sock: socket.socket, pages: list[tuple]) -> int:
                     "requestType": "exit",
                     "userID": user_state["userID"]
                 }
-                server_sock.send(json.dumps(request).encode('utf-8'))
+                channel.submit(request)
                 return RETCODE_QUIT
             case _:
                 print("Invalid option. Please try again.")
 
-def page_handle(server_sock: socket.socket, pages: list[tuple]) -> int:
+def page_handle(channel: RequestChannel, pages: list[tuple]) -> int:
     page_type = pages[-1][0]
     if page_type == PAGETYPE_INITIALIZE:
-        return _init_page(server_sock, pages)
+        return _init_page(channel, pages)
     elif page_type == PAGETYPE_SIGN_IN :
-        return _sign_in_page(server_sock, pages)
+        return _sign_in_page(channel, pages)
     elif page_type == PAGETYPE_SIGN_UP:
-        return _sign_up_page(server_sock, pages)
+        return _sign_up_page(channel, pages)
     elif page_type == PAGETYPE_USER_DASHBOARD:
-        return _user_dashboard_page(server_sock, pages)
+        return _user_dashboard_page(channel, pages)
     elif page_type == PAGETYPE_ROOM:
-        return _room_page(server_sock, pages)
+        return _room_page(channel, pages)
     elif page_type == PAGETYPE_ADMIN:
-        return _admin_page(server_sock, pages)
+        return _admin_page(channel, pages)
     else:
         return RETCODE_ERROR
 
@@ -1140,6 +1367,7 @@ def main(args):
     server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     try:
         server_sock.connect((host, port))
+        channel = RequestChannel(server_sock)
 
         print("Connect to server {}:{}".format(host, port))
         press_enter_to_continue()
@@ -1150,7 +1378,7 @@ def main(args):
             clear_screen()
             print(pages[-1][1], end = "")
 
-            code = page_handle(server_sock, pages)
+            code = page_handle(channel, pages)
             if code == RETCODE_ERROR:
                 server_sock.close()
                 raise Exception("Detect unexpected error. Aborted.\n")
@@ -0,0 +1,176 @@
+import socket
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from network_utils import *
+
+SLOW_CONSUMER_DROP_OLDEST = "drop_oldest"
+SLOW_CONSUMER_DISCONNECT = "disconnect"
+
+# Counters shared by all sessions, reported through "server stats"
+outbound_lock = threading.Lock()
+outbound_stats = {
+    "framesQueued": 0,
+    "framesDropped": 0,
+    "slowConsumerDisconnects": 0,
+    "queuePeak": 0
+}
+
+# A connected client as seen by the request handlers. Handlers only call reply() and push(),
+# so the same handler code serves both the thread-per-client and the asyncio server.
+# Outgoing frames go through a bounded per-session queue drained by a writer, so a slow
+# client never blocks the handler that is broadcasting to it.
+class ClientSession(ABC):
+    # Set once at startup from the server options
+    max_queue = 256
+    slow_consumer_policy = SLOW_CONSUMER_DROP_OLDEST
+
+    def __init__(self, client_addr):
+        self.client_addr = client_addr
+        self.user_id = None
+        self._lock = threading.RLock()
+        # Items are (frame, is_push). Only pushes count against max_queue, since
+        # replies are already bounded by the number of requests in flight.
+        self._queue = deque()
+        self._n_pushes = 0
+        self._closing = False
+
+    def send(self, obj: str | dict):
+        self.send_frame(encode_frame(obj), False)
+
+    def reply(self, request: dict, response: dict):
+        # Replies echo the ID of the request they answer, so pipelined requests can be
+        # answered out of order. Pushed messages never carry a request ID.
+        response["requestID"] = request.get("requestID")
+        self.send(response)
+
+    def push(self, message: dict):
+        self.send_frame(encode_frame(message), True)
+
+    def send_frame(self, frame: bytes, is_push: bool = True):
+        # Broadcasts encode a message once and hand the same bytes to every recipient
+        with self._lock:
+            if self._closing:
+                return
+            if is_push and self._n_pushes >= self.max_queue:
+                if self.slow_consumer_policy == SLOW_CONSUMER_DISCONNECT:
+                    self._closing = True
+                    self._queue.clear()
+                    self._n_pushes = 0
+                    with outbound_lock:
+                        outbound_stats["slowConsumerDisconnects"] += 1
+                    print("[Log] Disconnect slow client at {}:{}".format(self.client_addr[0], self.client_addr[1]))
+                    self._abort()
+                    return
+                self._drop_oldest_push()
+                with outbound_lock:
+                    outbound_stats["framesDropped"] += 1
+            self._queue.append((frame, is_push))
+            if is_push:
+                self._n_pushes += 1
+            queue_len = len(self._queue)
+
+        with outbound_lock:
+            outbound_stats["framesQueued"] += 1
+            outbound_stats["queuePeak"] = max(outbound_stats["queuePeak"], queue_len)
+        self._wake_writer()
+
+    def _drop_oldest_push(self):
+        for i, (_, is_push) in enumerate(self._queue):
+            if is_push:
+                del self._queue[i]
+                self._n_pushes -= 1
+                return
+
+    def _take_frames(self) -> tuple[list[bytes], bool]:
+        with self._lock:
+            frames = [frame for frame, _ in self._queue]
+            self._queue.clear()
+            self._n_pushes = 0
+            return frames, self._closing
+
+    def close(self):
+        # Frames already queued are still delivered before the connection is closed
+        with self._lock:
+            self._closing = True
+        self._wake_writer()
+
+    # Each server flavour drains the queue with its own writer
+    @abstractmethod
+    def _wake_writer(self):
+        pass
+
+    @abstractmethod
+    def _abort(self):
+        pass
+
+class ThreadClientSession(ClientSession):
+    def __init__(self, client_sock: socket.socket, client_addr):
+        super().__init__(client_addr)
+        self.sock = client_sock
+        self._ready = threading.Condition(self._lock)
+        self._writer = threading.Thread(target = self._write_loop, daemon = True)
+        self._writer.start()
+
+    def _wake_writer(self):
+        with self._ready:
+            self._ready.notify()
+
+    def _write_loop(self):
+        try:
+            while True:
+                with self._ready:
+                    while not self._queue and not self._closing:
+                        self._ready.wait()
+                frames, closing = self._take_frames()
+                for frame in frames:
+                    self.sock.sendall(frame)
+                if closing and not frames:
+                    break
+        except OSError:
+            pass
+        finally:
+            self.sock.close()
+
+    def _abort(self):
+        # Wakes up both the reader and the writer of this connection
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._wake_writer()
+
+class AsyncClientSession(ClientSession):
+    def __init__(self, writer: asyncio.StreamWriter, client_addr, loop: asyncio.AbstractEventLoop):
+        super().__init__(client_addr)
+        self.writer = writer
+        self.loop = loop
+        self._ready = asyncio.Event()
+        self.writer_task = loop.create_task(self._write_loop())
+
+    def _wake_writer(self):
+        # Handlers run in executor threads, so the writer is woken through the event loop
+        self.loop.call_soon_threadsafe(self._ready.set)
+
+    async def _write_loop(self):
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                frames, closing = self._take_frames()
+                for frame in frames:
+                    self.writer.write(frame)
+                if frames:
+                    # Waiting here is what lets the queue fill up behind a slow client
+                    await self.writer.drain()
+                if closing and not frames:
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.writer.close()
+
+    def _abort(self):
+        self.loop.call_soon_threadsafe(self.writer.transport.abort)
+        self._wake_writer()
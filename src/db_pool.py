@@ -0,0 +1,101 @@
+import time
+import threading
+from contextlib import contextmanager
+import psycopg
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import ConnectionPool, PoolTimeout
+
+# Prepared statements kept per connection. psycopg's default of 100 is less than the named
+# statements times the combinations of their optional filters, which would keep evicting
+# and re-preparing the game searches.
+PREPARED_MAX = 1000
+
+# Bounded PostgreSQL connection pool shared by all request handlers.
+# Connections are checked out per request and returned right after commit/rollback.
+class DBPool:
+    def __init__(self, host: str, port: int, user: str, password: str, dbname: str,
+                 size: int, min_idle: int, max_lifetime: float, acquire_timeout: float,
+                 isolation_level: int):
+        self.size = size
+        self.isolation_level = isolation_level
+        self._pool = ConnectionPool(
+            make_conninfo(host = host, port = port, user = user, password = password, dbname = dbname),
+            min_size = min(min_idle, size),
+            max_size = size,
+            max_lifetime = max_lifetime,
+            timeout = acquire_timeout,
+            check = ConnectionPool.check_connection,
+            configure = self._configure,
+            name = "steam-together",
+            open = False
+        )
+
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._in_use_peak = 0
+        self._n_acquired = 0
+        self._n_saturated = 0
+        self._n_timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _configure(self, pg_conn: psycopg.Connection):
+        pg_conn.set_isolation_level(self.isolation_level)
+        pg_conn.prepared_max = PREPARED_MAX
+
+    def open(self):
+        self._pool.open(wait = True)
+
+    def close(self):
+        self._pool.close()
+
+    @contextmanager
+    def connection(self):
+        with self._lock:
+            # Every connection is checked out, so this request has to queue
+            if self._in_use >= self.size:
+                self._n_saturated += 1
+
+        start = time.perf_counter()
+        try:
+            pg_conn = self._pool.getconn()
+        except PoolTimeout:
+            with self._lock:
+                self._n_timeouts += 1
+            raise
+        waited = time.perf_counter() - start
+
+        with self._lock:
+            self._n_acquired += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            self._in_use += 1
+            self._in_use_peak = max(self._in_use_peak, self._in_use)
+
+        try:
+            yield pg_conn
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._pool.putconn(pg_conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                "size": self.size,
+                "inUse": self._in_use,
+                "inUsePeak": self._in_use_peak,
+                "acquired": self._n_acquired,
+                "saturated": self._n_saturated,
+                "timeouts": self._n_timeouts,
+                "waitTotalMs": round(self._wait_total * 1000, 3),
+                "waitAvgMs": round(self._wait_total * 1000 / self._n_acquired, 3) if self._n_acquired else 0,
+                "waitMaxMs": round(self._wait_max * 1000, 3)
+            }
+        pool_stats = self._pool.get_stats()
+        stats["open"] = pool_stats.get("pool_size", 0)
+        stats["idle"] = pool_stats.get("pool_available", 0)
+        stats["waiting"] = pool_stats.get("requests_waiting", 0)
+        stats["connectionsLost"] = pool_stats.get("connections_lost", 0)
+        stats["returnsBad"] = pool_stats.get("returns_bad", 0)
+        return stats
@@ -0,0 +1,118 @@
+import re
+import math
+import threading
+from collections import Counter
+from catalog import Game, CatalogListener
+
+NGRAM_SIZE = 3
+
+# A game is a candidate when it shares this share of the query's trigrams
+MIN_SHARED_RATIO = 0.5
+
+# Candidates with the most shared trigrams that are re-ranked by edit distance
+CANDIDATE_MAXLEN = 200
+
+def compact(text: str) -> str:
+    # Case, spaces and punctuation are dropped, so "witcher3" reads like "The Witcher 3"
+    return "".join(re.findall(r"\w+", text.casefold()))
+
+def _ngrams(text: str) -> set[str]:
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+def _max_edits(query: str) -> int:
+    # About one typo per four characters
+    return max(1, len(query) // 4)
+
+def substring_distance(query: str, text: str, max_edits: int) -> int | None:
+    # Fewest edits turning query into some substring of text (Levenshtein distance with
+    # free gaps at both ends of text), or None when more than max_edits are needed
+    prev = [0] * (len(text) + 1)
+    for i, query_char in enumerate(query, 1):
+        cur = [i]
+        for j, text_char in enumerate(text, 1):
+            cur.append(min(prev[j - 1] + (query_char != text_char), prev[j] + 1, cur[j - 1] + 1))
+        # Every later row is at least the minimum of this one
+        if min(cur) > max_edits:
+            return None
+        prev = cur
+    distance = min(prev)
+    return distance if distance <= max_edits else None
+
+# Trigram index over the game names for "search games" with typos. Trigrams shared with
+# the query pick the candidates; the edit distance between the query and the closest
+# part of each candidate's name decides which of them match and how well.
+class FuzzyIndex(CatalogListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = {}
+        self._postings = {}
+
+    def catalog_loaded(self, games: list[Game]):
+        names = {game.game_id: compact(game.game_name) for game in games}
+        postings = {}
+        for game_id, name in names.items():
+            for ngram in _ngrams(name):
+                postings.setdefault(ngram, set()).add(game_id)
+        with self._lock:
+            self._names = names
+            self._postings = postings
+
+    def game_upserted(self, game: Game, old: Game | None):
+        with self._lock:
+            if old is not None:
+                if old.game_name == game.game_name:
+                    return
+                self._remove(old)
+            self._add(game)
+
+    def game_removed(self, game: Game):
+        with self._lock:
+            self._remove(game)
+
+    def _add(self, game: Game):
+        name = compact(game.game_name)
+        self._names[game.game_id] = name
+        for ngram in _ngrams(name):
+            self._postings.setdefault(ngram, set()).add(game.game_id)
+
+    def _remove(self, game: Game):
+        name = self._names.pop(game.game_id, None)
+        if name is None:
+            return
+        for ngram in _ngrams(name):
+            postings = self._postings.get(ngram)
+            if postings is not None:
+                postings.discard(game.game_id)
+                if not postings:
+                    del self._postings[ngram]
+
+    def match(self, query: str) -> dict[int, int]:
+        # Game id -> edit distance, for every game whose name is close enough to query
+        query = compact(query)
+        query_ngrams = _ngrams(query)
+        if not query_ngrams:
+            return {}
+        max_edits = _max_edits(query)
+        min_shared = math.ceil(len(query_ngrams) * MIN_SHARED_RATIO)
+
+        with self._lock:
+            n_shared = Counter()
+            for ngram in query_ngrams:
+                n_shared.update(self._postings.get(ngram, ()))
+
+            matches = {}
+            for game_id, count in n_shared.most_common(CANDIDATE_MAXLEN):
+                if count < min_shared:
+                    break
+                distance = substring_distance(query, self._names[game_id], max_edits)
+                if distance is not None:
+                    matches[game_id] = distance
+            return matches
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "names": len(self._names),
+                "ngrams": len(self._postings),
+                "postings": sum(len(postings) for postings in self._postings.values())
+            }
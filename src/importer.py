@@ -0,0 +1,229 @@
+import csv
+import time
+import secrets
+import argparse
+import datetime
+import psycopg
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+import queries
+import schema
+
+# Loads the Kaggle datasets cited in the README into an empty database:
+#   Steam Store Games (steam.csv)  -> "game", "game_genre"
+#   Steam Review Dataset (dataset.csv) -> "user", "user_role", "review"
+# The CSVs are read row by row and streamed to PostgreSQL with COPY, so memory does not
+# grow with their size; only the game IDs and per-game review counts are kept. Secondary
+# indexes and the review statistics trigger are set aside during the load and rebuilt
+# once at the end, all in one transaction.
+
+COPY_GAMES = """COPY "game" ("game_id", "game_name", "release_date", "price", "total_achievements", "positive_ratings", "negative_ratings") FROM STDIN"""
+COPY_GAME_GENRES = """COPY "game_genre" ("game_id", "genre") FROM STDIN"""
+COPY_USERS = """COPY "user" ("user_id", "user_name", "email", "password", "join_date") FROM STDIN"""
+COPY_USER_ROLES = """COPY "user_role" ("user_id", "role") FROM STDIN"""
+COPY_REVIEWS = """COPY "review" ("user_id", "game_id", "times", "texts", "rating") FROM STDIN"""
+
+LOADED_TABLES = ["game", "game_genre", "user", "user_role", "review"]
+
+# The review dataset only tells whether the reviewer recommends the game
+REVIEW_SCORE_RATINGS = {"1": 5, "-1": 1}
+
+# Games without genres get the same genre as in "add game"
+DEFAULT_GENRE = "Unknown"
+
+# Reviewers are anonymous in the dataset. The n-th review of every game is credited to the
+# n-th synthetic user, so no user reviews a game twice. Which games share a synthetic user
+# says nothing about taste, so precompute_neighbors leaves out the users of this role.
+SYNTHETIC_USER_NAME = "steam_reviewer_{}"
+SYNTHETIC_USER_ROLE = "Imported Reviewer"
+
+PROGRESS_EVERY = 100_000
+
+class _Progress:
+    def __init__(self, what: str):
+        self.what = what
+        self.n_rows = 0
+        self.start = time.perf_counter()
+
+    def add(self, n_rows: int = 1):
+        self.n_rows += n_rows
+        if self.n_rows % PROGRESS_EVERY < n_rows:
+            self.report(end = "\r")
+
+    def report(self, end: str = "\n"):
+        elapsed = time.perf_counter() - self.start
+        print("{}: {} rows in {:.1f}s ({:.0f} rows/s)".format(
+            self.what, self.n_rows, elapsed, self.n_rows / elapsed if elapsed else 0), end = end, flush = True)
+
+def _read_csv(path: str):
+    with open(path, newline = "", encoding = "utf-8") as f:
+        yield from csv.DictReader(f)
+
+def _int_or_none(text: str) -> int | None:
+    try:
+        return int(float(text))
+    except ValueError:
+        return None
+
+def _float_or_none(text: str) -> float | None:
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+def _date_or_none(text: str) -> datetime.date | None:
+    try:
+        return datetime.date.fromisoformat(text.strip())
+    except ValueError:
+        return None
+
+def normalize_genres(text: str) -> list[str]:
+    # "Action;Free to Play; action" -> ["Action", "Free to Play"]
+    genres = {}
+    for genre in text.split(";"):
+        genre = " ".join(genre.split())
+        if genre:
+            genres.setdefault(genre.casefold(), genre)
+    return sorted(genres.values()) or [DEFAULT_GENRE]
+
+def import_games(cursor: psycopg.Cursor, path: str) -> set[int]:
+    # Steam app IDs become game IDs, which is what the review dataset refers to
+    game_ids = set()
+    progress = _Progress("game")
+    with cursor.copy(COPY_GAMES) as copy:
+        for row in _read_csv(path):
+            game_id = _int_or_none(row["appid"])
+            if game_id is None or game_id in game_ids:
+                continue
+            game_ids.add(game_id)
+            copy.write_row((
+                game_id,
+                row["name"],
+                _date_or_none(row["release_date"]),
+                _float_or_none(row["price"]),
+                _int_or_none(row["achievements"]),
+                _int_or_none(row["positive_ratings"]),
+                _int_or_none(row["negative_ratings"])
+            ))
+            progress.add()
+    progress.report()
+
+    # Only one COPY can run on a connection at a time, so the genres are a second pass
+    written = set()
+    progress = _Progress("game_genre")
+    with cursor.copy(COPY_GAME_GENRES) as copy:
+        for row in _read_csv(path):
+            game_id = _int_or_none(row["appid"])
+            if game_id is None or game_id in written:
+                continue
+            written.add(game_id)
+            for genre in normalize_genres(row["genres"]):
+                copy.write_row((game_id, genre))
+                progress.add()
+    progress.report()
+
+    queries.execute(cursor, "import.max_game_id")
+    queries.execute(cursor, "import.set_sequence", {"table": '"game"', "column": "game_id", "value": cursor.fetchone()["max"]})
+    return game_ids
+
+def _review_rows(path: str, game_ids: set[int]):
+    # (game ID, rating, text) of every review of a known game
+    for row in _read_csv(path):
+        game_id = _int_or_none(row["app_id"])
+        rating = REVIEW_SCORE_RATINGS.get(row["review_score"].strip())
+        if game_id in game_ids and rating is not None:
+            yield game_id, rating, row["review_text"]
+
+def import_reviews(cursor: psycopg.Cursor, path: str, game_ids: set[int]):
+    # First pass: how many synthetic users are needed
+    n_users = 0
+    n_reviews = {}
+    for game_id, _, _ in _review_rows(path, game_ids):
+        n_reviews[game_id] = n_reviews.get(game_id, 0) + 1
+        n_users = max(n_users, n_reviews[game_id])
+
+    queries.execute(cursor, "import.max_user_id")
+    first_user_id = cursor.fetchone()["max"] + 1
+    join_date = datetime.date.today()
+
+    progress = _Progress("user")
+    with cursor.copy(COPY_USERS) as copy:
+        for i in range(n_users):
+            user_id = first_user_id + i
+            # Nobody knows the password, so the synthetic users cannot sign in
+            copy.write_row((user_id, SYNTHETIC_USER_NAME.format(user_id), SYNTHETIC_USER_NAME.format(user_id) + "@example.com",
+                            secrets.token_urlsafe(16), join_date))
+            progress.add()
+    progress.report()
+
+    progress = _Progress("user_role")
+    with cursor.copy(COPY_USER_ROLES) as copy:
+        for i in range(n_users):
+            copy.write_row((first_user_id + i, SYNTHETIC_USER_ROLE))
+            progress.add()
+    progress.report()
+
+    queries.execute(cursor, "import.set_sequence", {"table": '"user"', "column": "user_id", "value": first_user_id + n_users - 1})
+
+    # Second pass: the reviews themselves, wrapped in double quotes like those added by users
+    n_reviews.clear()
+    progress = _Progress("review")
+    with cursor.copy(COPY_REVIEWS) as copy:
+        for game_id, rating, text in _review_rows(path, game_ids):
+            n = n_reviews.get(game_id, 0)
+            n_reviews[game_id] = n + 1
+            copy.write_row((first_user_id + n, game_id, None, "\"{}\"".format(text), rating))
+            progress.add()
+    progress.report()
+
+def main(args):
+    # Long review texts exceed the csv module's default field size limit
+    csv.field_size_limit(2 ** 31 - 1)
+
+    conninfo = make_conninfo(host = args.pg_host, port = args.pg_port, user = args.pg_user,
+                             password = args.pg_password, dbname = args.pg_dbname)
+    with psycopg.connect(conninfo) as pg_conn:
+        schema.apply(pg_conn)
+
+        start = time.perf_counter()
+        with pg_conn.cursor(row_factory = dict_row) as cursor:
+            # Building an index once over the loaded rows is much faster than updating it
+            # row by row, so every index not backing a constraint is dropped until the end
+            queries.execute(cursor, "import.secondary_indexes", {"tables": ['"{}"'.format(table) for table in LOADED_TABLES]})
+            indexes = cursor.fetchall()
+            for index in indexes:
+                cursor.execute("DROP INDEX {};".format(index["name"]))
+            cursor.execute("""ALTER TABLE "review" DISABLE TRIGGER "review_stats_trigger";""")
+
+            if args.games:
+                game_ids = import_games(cursor, args.games)
+            if args.reviews:
+                if not args.games:
+                    queries.execute(cursor, "import.game_ids")
+                    game_ids = {row["game_id"] for row in cursor.fetchall()}
+                import_reviews(cursor, args.reviews, game_ids)
+
+            index_start = time.perf_counter()
+            for index in indexes:
+                cursor.execute(index["definition"])
+            cursor.execute("""ALTER TABLE "review" ENABLE TRIGGER "review_stats_trigger";""")
+            queries.execute(cursor, "review_stats.clear")
+            queries.execute(cursor, "review_stats.rebuild")
+            print("Rebuilt {} indexes and the review statistics in {:.1f}s".format(len(indexes), time.perf_counter() - index_start))
+
+        pg_conn.commit()
+        print("Import finished in {:.1f}s".format(time.perf_counter() - start))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type = str, help = "steam.csv of the Steam Store Games dataset.", default = None)
+    parser.add_argument("--reviews", type = str, help = "dataset.csv of the Steam Review Dataset.", default = None)
+    parser.add_argument("--pg_host", type = str, help = "Host IP of the PostgreSQL server. (default = \"localhost\")", default = "localhost")
+    parser.add_argument("--pg_port", type = int, help = "Port of the PostgreSQL server. (default = 5432)", default = 5432)
+    parser.add_argument("--pg_user", type = str, help = "User to login PostgreSQL server. (default = \"postgres\")", default = "postgres")
+    parser.add_argument("--pg_password", type = str, help = "Password for login the PostgreSQL server. (default = \"postgres\")", default = "postgres")
+    parser.add_argument("--pg_dbname", type = str, help = "Database to connect. (default = \"Steam-Together\")", default = "Steam-Together")
+    args = parser.parse_args()
+    if not args.games and not args.reviews:
+        parser.error("Nothing to import: give --games, --reviews or both")
+    main(args)
@@ -1,22 +1,104 @@
 import json
 import socket
+import struct
+from collections import deque
 
-def sendall(sock: socket.socket, obj: str | dict):
+# Every message on the wire is a 4-byte big-endian payload length followed by the UTF-8 payload
+FRAME_HEADER = struct.Struct("!I")
+FRAME_MAXLEN = 64 * 1024 * 1024
+
+def encode_message(obj: str | dict) -> bytes:
     if type(obj) == str:
-        sock.sendall(obj.encode("utf-8"))
+        return obj.encode("utf-8")
     elif type(obj) == dict:
-        sock.sendall(json.dumps(obj).encode("utf-8"))
+        return json.dumps(obj).encode("utf-8")
     else:
         raise TypeError("Expected object types are str or dict, get {}".format(type(obj)))
-    
-def recvall(sock: socket.socket, bufsize: int) -> str:
-    fragments = []
-    while True:
-        try:
-            sock.settimeout(0.5)
-            chunk = sock.recv(bufsize)
-        except socket.timeout:
-            break
-        fragments.append(chunk.decode("utf-8"))
-    return ''.join(fragments)
 
+def encode_frame(obj: str | dict) -> bytes:
+    payload = encode_message(obj)
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+def sendall(sock: socket.socket, obj: str | dict):
+    sock.sendall(encode_frame(obj))
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    received = 0
+    while received < n:
+        n_bytes = sock.recv_into(view[received:], n - received)
+        if n_bytes == 0:
+            raise ConnectionError("Connection closed by peer")
+        received += n_bytes
+    return bytes(buf)
+
+def recvall(sock: socket.socket) -> str:
+    # Reads exactly one frame, so bytes of the next message stay in the socket buffer
+    # and select() still reports the socket as readable for them
+    (length,) = FRAME_HEADER.unpack(_recv_exact(sock, FRAME_HEADER.size))
+    if length > FRAME_MAXLEN:
+        raise ValueError("Frame of {} bytes exceeds the limit of {} bytes".format(length, FRAME_MAXLEN))
+    return _recv_exact(sock, length).decode("utf-8")
+
+class FrameDecoder:
+    # Incremental decoder for a byte stream that may split or coalesce frames arbitrarily
+    def __init__(self, max_frame_len: int = FRAME_MAXLEN):
+        self.max_frame_len = max_frame_len
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> list[bytes]:
+        self._buffer += data
+        frames = []
+        start = 0
+        while len(self._buffer) - start >= FRAME_HEADER.size:
+            (length,) = FRAME_HEADER.unpack_from(self._buffer, start)
+            if length > self.max_frame_len:
+                raise ValueError("Frame of {} bytes exceeds the limit of {} bytes".format(length, self.max_frame_len))
+            end = start + FRAME_HEADER.size + length
+            if len(self._buffer) < end:
+                break
+            frames.append(bytes(self._buffer[start + FRAME_HEADER.size:end]))
+            start = end
+        if start:
+            del self._buffer[:start]
+        return frames
+
+class RequestChannel:
+    # Client side of a connection. Every request gets an ID; replies echo it, while pushed
+    # messages (room communication / room control) carry none. This lets a caller keep
+    # several requests in flight on one socket and never mistake a push for a reply.
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.pushes = deque()
+        self._next_request_id = 1
+        self._replies = {}
+
+    def submit(self, request: dict) -> int:
+        request_id = self._next_request_id
+        self._next_request_id += 1
+        request["requestID"] = request_id
+        sendall(self.sock, request)
+        return request_id
+
+    def wait(self, request_id: int) -> dict:
+        while request_id not in self._replies:
+            self.poll()
+        return self._replies.pop(request_id)
+
+    def call(self, request: dict) -> dict:
+        return self.wait(self.submit(request))
+
+    def poll(self):
+        # Blocks until one message arrives and files it as either a reply or a push
+        message = json.loads(recvall(self.sock))
+        if "requestID" in message:
+            self._replies[message["requestID"]] = message
+        else:
+            self.pushes.append(message)
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+    def close(self):
+        self.sock.close()
@@ -0,0 +1,120 @@
+import time
+import argparse
+import numpy as np
+import psycopg
+from psycopg.conninfo import make_conninfo
+import queries
+import schema
+from importer import SYNTHETIC_USER_ROLE
+
+COPY_NEIGHBORS = """COPY "game_neighbor" ("game_id", "neighbor_id", "similarity") FROM STDIN"""
+
+# Item-to-item collaborative filtering. Users and the games they rated or favorited form
+# a sparse user x game matrix; two games are similar when the same users are interested
+# in both (cosine similarity of their columns). The most similar games of every game are
+# stored in "game_neighbor", from which "recommend games" scores the games a user has
+# not seen yet.
+
+class InteractionMatrix:
+    # The matrix in compressed sparse row form (the games of every user) and compressed
+    # sparse column form (the users of every game)
+    def __init__(self, user_ids: np.ndarray, game_ids: np.ndarray, weights: np.ndarray):
+        self.user_keys, rows = np.unique(user_ids, return_inverse = True)
+        self.game_keys, cols = np.unique(game_ids, return_inverse = True)
+        self.n_users = len(self.user_keys)
+        self.n_games = len(self.game_keys)
+
+        order = np.lexsort((cols, rows))
+        self.user_ptr = self._pointers(rows[order], self.n_users)
+        self.user_games = cols[order]
+        self.user_weights = weights[order]
+
+        order = np.lexsort((rows, cols))
+        self.game_ptr = self._pointers(cols[order], self.n_games)
+        self.game_users = rows[order]
+        self.game_weights = weights[order]
+
+        self.norms = np.sqrt(np.bincount(cols, weights = weights * weights, minlength = self.n_games))
+
+    @staticmethod
+    def _pointers(indices: np.ndarray, n: int) -> np.ndarray:
+        ptr = np.zeros(n + 1, dtype = np.int64)
+        np.cumsum(np.bincount(indices, minlength = n), out = ptr[1:])
+        return ptr
+
+    def similarities(self, game: int) -> tuple[np.ndarray, np.ndarray]:
+        # Cosine similarity of one game to every game, and the number of users they share.
+        # The dot products are summed with one bincount over every (user, game) entry of
+        # the users of this game.
+        lo, hi = self.game_ptr[game], self.game_ptr[game + 1]
+        users = self.game_users[lo:hi]
+        starts = self.user_ptr[users]
+        lengths = self.user_ptr[users + 1] - starts
+        # Positions of those users' entries in the row arrays, without a Python loop
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        entries = np.arange(lengths.sum()) + offsets
+
+        others = self.user_games[entries]
+        products = self.user_weights[entries] * np.repeat(self.game_weights[lo:hi], lengths)
+        dots = np.bincount(others, weights = products, minlength = self.n_games)
+        support = np.bincount(others, minlength = self.n_games)
+
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            similarity = dots / (self.norms[game] * self.norms)
+        similarity[game] = 0.0
+        return np.nan_to_num(similarity), support
+
+    def neighbors(self, k: int, min_support: int):
+        # (game ID, neighbor ID, similarity) of the k most similar games of every game
+        for game in range(self.n_games):
+            similarity, support = self.similarities(game)
+            similarity[support < min_support] = 0.0
+            candidates = np.flatnonzero(similarity > 0)
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(-similarity[candidates], k - 1)[:k]]
+            for other in candidates[np.argsort(-similarity[candidates], kind = "stable")]:
+                yield int(self.game_keys[game]), int(self.game_keys[other]), float(similarity[other])
+
+def load_matrix(cursor: psycopg.Cursor) -> InteractionMatrix:
+    # The imported reviews are credited to synthetic users by position, not by who wrote them
+    queries.execute(cursor, "neighbor.interactions", {"excluded_role": SYNTHETIC_USER_ROLE})
+    rows = cursor.fetchall()
+    user_ids = np.fromiter((row[0] for row in rows), dtype = np.int64, count = len(rows))
+    game_ids = np.fromiter((row[1] for row in rows), dtype = np.int64, count = len(rows))
+    weights = np.fromiter((row[2] for row in rows), dtype = np.float64, count = len(rows))
+    return InteractionMatrix(user_ids, game_ids, weights)
+
+def main(args):
+    conninfo = make_conninfo(host = args.pg_host, port = args.pg_port, user = args.pg_user,
+                             password = args.pg_password, dbname = args.pg_dbname)
+    with psycopg.connect(conninfo) as pg_conn:
+        schema.apply(pg_conn)
+
+        with pg_conn.cursor() as cursor:
+            start = time.perf_counter()
+            matrix = load_matrix(cursor)
+            print("Loaded {} interactions of {} users on {} games in {:.1f}s".format(
+                len(matrix.user_games), matrix.n_users, matrix.n_games, time.perf_counter() - start))
+
+            # Readers keep seeing the old neighbors until the new ones are committed
+            start = time.perf_counter()
+            n_rows = 0
+            queries.execute(cursor, "neighbor.clear")
+            with cursor.copy(COPY_NEIGHBORS) as copy:
+                for row in matrix.neighbors(args.neighbors, args.min_support):
+                    copy.write_row(row)
+                    n_rows += 1
+        pg_conn.commit()
+        print("Wrote {} neighbors in {:.1f}s".format(n_rows, time.perf_counter() - start))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--neighbors", type = int, help = "Number of similar games stored per game. (default = 20)", default = 20)
+    parser.add_argument("--min_support", type = int, help = "Minimum number of users two games must share to be similar. (default = 2)", default = 2)
+    parser.add_argument("--pg_host", type = str, help = "Host IP of the PostgreSQL server. (default = \"localhost\")", default = "localhost")
+    parser.add_argument("--pg_port", type = int, help = "Port of the PostgreSQL server. (default = 5432)", default = 5432)
+    parser.add_argument("--pg_user", type = str, help = "User to login PostgreSQL server. (default = \"postgres\")", default = "postgres")
+    parser.add_argument("--pg_password", type = str, help = "Password for login the PostgreSQL server. (default = \"postgres\")", default = "postgres")
+    parser.add_argument("--pg_dbname", type = str, help = "Database to connect. (default = \"Steam-Together\")", default = "Steam-Together")
+    args = parser.parse_args()
+    main(args)
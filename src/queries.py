@@ -0,0 +1,521 @@
+import time
+import threading
+from psycopg import Cursor
+
+# Named, parameterized statements used by the request handlers. They are executed with
+# prepare=True, so each pooled connection parses and plans a statement once and reuses it.
+# Optional filters are written as "(%(x)s IS NULL OR ...)" to keep every statement static.
+# psycopg prepares one server-side statement per query text and parameter types, and a
+# NULL is sent with a different type than a value, so a statement with optional filters
+# is prepared once per combination of given filters (see db_pool.PREPARED_MAX).
+QUERIES = {
+    # Transactions
+    "txn.read_committed": """
+        SET TRANSACTION ISOLATION LEVEL READ COMMITTED;
+        """,
+
+    # Users
+    "user.credentials": """
+        SELECT "user_name", "password"
+        FROM "user"
+        WHERE "user_id" = %(user_id)s;
+        """,
+    "user.role": """
+        SELECT "role"
+        FROM "user_role"
+        WHERE "user_id" = %(user_id)s;
+        """,
+    "user.insert": """
+        INSERT INTO "user" ("user_name", "email", "password", "join_date")
+        VALUES (%(user_name)s, %(email)s, %(password)s, %(join_date)s)
+        RETURNING "user_id";
+        """,
+    "user_role.insert": """
+        INSERT INTO "user_role" ("user_id", "role")
+        VALUES (%(user_id)s, %(role)s);
+        """,
+    "user.name": """
+        SELECT "user_name"
+        FROM "user"
+        WHERE "user_id" = %(user_id)s;
+        """,
+    "user.info": """
+        SELECT "user_id", "user_name", "join_date"
+        FROM "user"
+        WHERE "user_id" = %(user_id)s;
+        """,
+    "user.update_profile": """
+        UPDATE "user"
+        SET "user_name" = COALESCE(%(user_name)s::text, "user_name"),
+            "email" = COALESCE(%(email)s::text, "email"),
+            "password" = COALESCE(%(password)s::text, "password")
+        WHERE "user_id" = %(user_id)s;
+        """,
+    "user.profile": """
+        SELECT "user_name", "email"
+        FROM "user"
+        WHERE "user_id" = %(user_id)s;
+        """,
+
+    # Cluster-wide sessions
+    # A session is only taken over from a node whose heartbeat has stopped
+    "online_session.claim": """
+        INSERT INTO "online_session" ("user_id", "node_id", "since")
+        VALUES (%(user_id)s, %(node_id)s, now())
+        ON CONFLICT ("user_id") DO UPDATE
+        SET "node_id" = EXCLUDED."node_id",
+            "since" = EXCLUDED."since"
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM "server_node" AS "n"
+            WHERE "n"."node_id" = "online_session"."node_id"
+              AND "n"."heartbeat" > now() - make_interval(secs => %(node_timeout)s)
+        )
+        RETURNING "user_id";
+        """,
+    "online_session.release": """
+        DELETE FROM "online_session"
+        WHERE "user_id" = %(user_id)s AND "node_id" = %(node_id)s;
+        """,
+    "online_session.clear_node": """
+        DELETE FROM "online_session"
+        WHERE "node_id" = %(node_id)s;
+        """,
+    "server_node.heartbeat": """
+        INSERT INTO "server_node" ("node_id", "heartbeat")
+        VALUES (%(node_id)s, now())
+        ON CONFLICT ("node_id") DO UPDATE
+        SET "heartbeat" = EXCLUDED."heartbeat";
+        """,
+    "server_node.remove": """
+        DELETE FROM "server_node"
+        WHERE "node_id" = %(node_id)s;
+        """,
+
+    # Broadcast bus
+    "bus.notify": """
+        SELECT pg_notify(%(channel)s, %(payload)s);
+        """,
+
+    # Games
+    "game.exists": """
+        SELECT COUNT(*)
+        FROM "game"
+        WHERE "game_id" = %(game_id)s;
+        """,
+    "game.insert": """
+        INSERT INTO "game" ("game_name", "release_date")
+        VALUES (%(game_name)s, %(release_date)s)
+        RETURNING "game_id";
+        """,
+    "game.update": """
+        UPDATE "game"
+        SET "price" = COALESCE(%(price)s, "price"),
+            "total_achievements" = COALESCE(%(total_achievements)s::int, "total_achievements"),
+            "positive_ratings" = COALESCE(%(positive_ratings)s::int, "positive_ratings"),
+            "negative_ratings" = COALESCE(%(negative_ratings)s::int, "negative_ratings")
+        WHERE "game_id" = %(game_id)s;
+        """,
+    # Set-based statements of "bulk add games" and "bulk update games", which pass one
+    # array per column. Game IDs are drawn from the sequence up front, so the genre rows
+    # can be sent along without reading the new games back.
+    "game.preallocate_ids": """
+        SELECT nextval(pg_get_serial_sequence('"game"', 'game_id'))::int AS "game_id"
+        FROM generate_series(1, %(n)s);
+        """,
+    "game.bulk_insert": """
+        INSERT INTO "game" ("game_id", "game_name", "release_date")
+        SELECT * FROM unnest(%(game_ids)s::int[], %(game_names)s::text[], %(release_dates)s::date[]);
+        """,
+    "game.bulk_update": """
+        UPDATE "game" AS "g"
+        SET "price" = COALESCE("u"."price", "g"."price"),
+            "total_achievements" = COALESCE("u"."total_achievements", "g"."total_achievements"),
+            "positive_ratings" = COALESCE("u"."positive_ratings", "g"."positive_ratings"),
+            "negative_ratings" = COALESCE("u"."negative_ratings", "g"."negative_ratings")
+        FROM unnest(%(game_ids)s::int[], %(prices)s::numeric[], %(total_achievements)s::int[],
+                    %(positive_ratings)s::int[], %(negative_ratings)s::int[])
+            AS "u" ("game_id", "price", "total_achievements", "positive_ratings", "negative_ratings")
+        WHERE "g"."game_id" = "u"."game_id"
+        RETURNING "g"."game_id";
+        """,
+    "game.delete": """
+        DELETE FROM "game"
+        WHERE "game_id" = %(game_id)s;
+        """,
+    "catalog.games": """
+        SELECT "g"."game_id", "g"."game_name", "g"."release_date", "g"."price", "g"."total_achievements",
+            "g"."positive_ratings", "g"."negative_ratings", "s"."review_count", "s"."rating_sum",
+            "s"."version" AS "review_version"
+        FROM "game" AS "g"
+            LEFT JOIN "game_review_stats" AS "s" ON "s"."game_id" = "g"."game_id"
+        WHERE (%(game_ids)s::int[] IS NULL OR "g"."game_id" = ANY(%(game_ids)s::int[]));
+        """,
+    "catalog.genres": """
+        SELECT "game_id", "genre"
+        FROM "game_genre"
+        WHERE (%(game_ids)s::int[] IS NULL OR "game_id" = ANY(%(game_ids)s::int[]));
+        """,
+    "game_genre.insert": """
+        INSERT INTO "game_genre" ("game_id", "genre")
+        SELECT %(game_id)s, unnest(%(genres)s::text[]);
+        """,
+    "game_genre.delete": """
+        DELETE FROM "game_genre"
+        WHERE "game_id" = %(game_id)s;
+        """,
+    "game_genre.bulk_insert": """
+        INSERT INTO "game_genre" ("game_id", "genre")
+        SELECT * FROM unnest(%(game_ids)s::int[], %(genres)s::text[]);
+        """,
+    "game_genre.bulk_delete": """
+        DELETE FROM "game_genre"
+        WHERE "game_id" = ANY(%(game_ids)s::int[]);
+        """,
+
+    # Reviews
+    "review.count": """
+        SELECT COUNT(*)
+        FROM "review"
+        WHERE "user_id" = %(user_id)s AND "game_id" = %(game_id)s;
+        """,
+    "review.insert": """
+        INSERT INTO "review" ("user_id", "game_id", "times", "texts", "rating")
+        VALUES (%(user_id)s, %(game_id)s, %(times)s, %(texts)s, %(rating)s);
+        """,
+    "review.delete": """
+        DELETE FROM "review"
+        WHERE "user_id" = %(user_id)s AND "game_id" = %(game_id)s
+        RETURNING "rating";
+        """,
+    # Ranked full-text matches, best first. ts_headline has to read the whole text, so the
+    # snippets are only made for the rows of the page.
+    "review.search": """
+        SELECT "m"."game_id", "m"."user_id", "m"."times", "m"."rating", "m"."rank",
+            ts_headline('english', "m"."texts", websearch_to_tsquery('english', %(query)s),
+                        'StartSel=<mark>, StopSel=</mark>, MaxWords=30, MinWords=10, MaxFragments=2') AS "snippet"
+        FROM (
+            SELECT "r"."game_id", "r"."user_id", "r"."times", "r"."rating", "r"."texts",
+                ts_rank("r"."texts_tsv", websearch_to_tsquery('english', %(query)s)) AS "rank"
+            FROM "review" AS "r"
+            WHERE "r"."texts_tsv" @@ websearch_to_tsquery('english', %(query)s)
+                AND (%(game_id)s::int IS NULL OR "r"."game_id" = %(game_id)s::int)
+                AND (%(rating)s::int IS NULL OR "r"."rating" = %(rating)s::int)
+        ) AS "m"
+        WHERE ("m"."rank", "m"."game_id", "m"."user_id") < (%(after_rank)s::real, %(after_game_id)s, %(after_user_id)s)
+        ORDER BY "m"."rank" DESC, "m"."game_id" DESC, "m"."user_id" DESC
+        LIMIT %(limit)s;
+        """,
+    "review_stats.by_game": """
+        SELECT "review_count", "rating_sum", "rating_1", "rating_2", "rating_3", "rating_4", "rating_5", "version"
+        FROM "game_review_stats"
+        WHERE "game_id" = %(game_id)s;
+        """,
+
+    # Favorites
+    "favorite.count": """
+        SELECT COUNT(*)
+        FROM "add_to_favorite"
+        WHERE "user_id" = %(user_id)s AND "game_id" = %(game_id)s;
+        """,
+    "favorite.insert": """
+        INSERT INTO "add_to_favorite" ("user_id", "game_id")
+        VALUES (%(user_id)s, %(game_id)s);
+        """,
+    "favorite.games_by_user": """
+        SELECT "g"."game_id", "g"."game_name"
+        FROM "add_to_favorite" AS "f"
+            JOIN "game" AS "g" ON "f"."game_id" = "g"."game_id"
+        WHERE "f"."user_id" = %(user_id)s;
+        """,
+
+    # Collaborative filtering. A user's interest in a game is 1 for a favorite and grows
+    # from 0 to 1 with the review rating from 1 to 5.
+    "neighbor.interactions": """
+        SELECT "i"."user_id", "i"."game_id", MAX("i"."weight") AS "weight"
+        FROM (
+            SELECT "user_id", "game_id", ("rating" - 1) / 4.0 AS "weight" FROM "review"
+            UNION ALL
+            SELECT "user_id", "game_id", 1.0 FROM "add_to_favorite"
+        ) AS "i"
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM "user_role" AS "ur"
+            WHERE "ur"."user_id" = "i"."user_id" AND "ur"."role" = %(excluded_role)s
+        )
+        GROUP BY "i"."user_id", "i"."game_id"
+        HAVING MAX("i"."weight") > 0;
+        """,
+    "neighbor.clear": """
+        DELETE FROM "game_neighbor";
+        """,
+    "neighbor.recommend": """
+        WITH "seed" AS (
+            SELECT "game_id", MAX("weight") AS "weight"
+            FROM (
+                SELECT "game_id", ("rating" - 1) / 4.0 AS "weight" FROM "review" WHERE "user_id" = %(user_id)s
+                UNION ALL
+                SELECT "game_id", 1.0 FROM "add_to_favorite" WHERE "user_id" = %(user_id)s
+            ) AS "i"
+            GROUP BY "game_id"
+        )
+        SELECT "n"."neighbor_id" AS "game_id", SUM("n"."similarity" * "s"."weight") AS "score"
+        FROM "seed" AS "s"
+            JOIN "game_neighbor" AS "n" ON "s"."game_id" = "n"."game_id"
+        WHERE "n"."neighbor_id" NOT IN (SELECT "game_id" FROM "seed")
+        GROUP BY "n"."neighbor_id"
+        HAVING SUM("n"."similarity" * "s"."weight") > 0
+        ORDER BY "score" DESC, "n"."neighbor_id"
+        LIMIT %(limit)s;
+        """,
+
+    # Rooms
+    "room.insert": """
+        INSERT INTO "room" ("creator_id", "room_name", "game_id", "start_time", "status", "max_players")
+        VALUES (%(creator_id)s, %(room_name)s, %(game_id)s, %(start_time)s, 'Active', %(max_players)s)
+        RETURNING "room_id";
+        """,
+    "room.lock": """
+        SELECT "status", "max_players", "creator_id"
+        FROM "room"
+        WHERE "room_id" = %(room_id)s
+        FOR UPDATE;
+        """,
+    "room.details": """
+        SELECT "r"."room_name", "r"."max_players", "u"."user_name", "g"."game_name"
+        FROM "room" AS "r"
+            JOIN "user" AS "u" ON "u"."user_id" = "r"."creator_id"
+            JOIN "game" AS "g" ON "g"."game_id" = "r"."game_id"
+        WHERE "room_id" = %(room_id)s;
+        """,
+    "room.close": """
+        UPDATE "room"
+        SET "end_time" = %(end_time)s, "status" = 'Closed'
+        WHERE "room_id" = %(room_id)s;
+        """,
+    "room.registry": """
+        SELECT "r"."room_id", "r"."room_name", "r"."creator_id", "u"."user_name", "r"."game_id", "g"."game_name", "r"."max_players"
+        FROM "room" AS "r"
+            JOIN "user" AS "u" ON "u"."user_id" = "r"."creator_id"
+            JOIN "game" AS "g" ON "g"."game_id" = "r"."game_id"
+        WHERE "r"."status" = 'Active'
+            AND (%(room_id)s::int IS NULL OR "r"."room_id" = %(room_id)s::int);
+        """,
+    "user_in_room.insert": """
+        INSERT INTO "user_in_room" ("user_id", "room_id", "join_time")
+        VALUES (%(user_id)s, %(room_id)s, %(join_time)s);
+        """,
+    "user_in_room.count_active": """
+        SELECT COUNT(*)
+        FROM "user_in_room"
+        WHERE "room_id" = %(room_id)s AND "leave_time" IS NULL;
+        """,
+    "user_in_room.membership": """
+        SELECT "user_id", "room_id", "leave_time"
+        FROM "user_in_room"
+        WHERE "user_id" = %(user_id)s AND "room_id" = %(room_id)s;
+        """,
+    "user_in_room.rejoin": """
+        UPDATE "user_in_room"
+        SET "join_time" = %(join_time)s, "leave_time" = NULL
+        WHERE "user_id" = %(user_id)s AND "room_id" = %(room_id)s;
+        """,
+    "user_in_room.leave": """
+        UPDATE "user_in_room"
+        SET "leave_time" = %(leave_time)s
+        WHERE "user_id" = %(user_id)s AND "room_id" = %(room_id)s;
+        """,
+    "user_in_room.leave_all": """
+        UPDATE "user_in_room"
+        SET "leave_time" = %(leave_time)s
+        WHERE "room_id" = %(room_id)s AND "leave_time" IS NULL;
+        """,
+    "user_in_room.registry": """
+        SELECT "uir"."room_id", "uir"."user_id", "u"."user_name"
+        FROM "user_in_room" AS "uir"
+            JOIN "room" AS "r" ON "r"."room_id" = "uir"."room_id"
+            JOIN "user" AS "u" ON "u"."user_id" = "uir"."user_id"
+        WHERE "r"."status" = 'Active' AND "uir"."leave_time" IS NULL
+            AND (%(room_id)s::int IS NULL OR "r"."room_id" = %(room_id)s::int);
+        """,
+
+    # Bulk import (src/importer.py)
+    "import.secondary_indexes": """
+        SELECT "i"."indexrelid"::regclass::text AS "name", pg_get_indexdef("i"."indexrelid") AS "definition"
+        FROM pg_index AS "i"
+        WHERE "i"."indrelid" = ANY(%(tables)s::regclass[])
+            AND NOT EXISTS (SELECT 1 FROM pg_constraint AS "c" WHERE "c"."conindid" = "i"."indexrelid");
+        """,
+    "import.game_ids": """
+        SELECT "game_id"
+        FROM "game";
+        """,
+    "import.max_user_id": """
+        SELECT COALESCE(MAX("user_id"), 0) AS "max"
+        FROM "user";
+        """,
+    "import.max_game_id": """
+        SELECT COALESCE(MAX("game_id"), 0) AS "max"
+        FROM "game";
+        """,
+    "import.set_sequence": """
+        SELECT setval(pg_get_serial_sequence(%(table)s, %(column)s), GREATEST(%(value)s::bigint, 1));
+        """,
+    "review_stats.clear": """
+        DELETE FROM "game_review_stats";
+        """,
+    "review_stats.rebuild": """
+        INSERT INTO "game_review_stats"
+            ("game_id", "review_count", "rating_sum", "rating_1", "rating_2", "rating_3", "rating_4", "rating_5")
+        SELECT
+            "game_id",
+            COUNT(*),
+            SUM("rating"),
+            COUNT(*) FILTER (WHERE "rating" = 1),
+            COUNT(*) FILTER (WHERE "rating" = 2),
+            COUNT(*) FILTER (WHERE "rating" = 3),
+            COUNT(*) FILTER (WHERE "rating" = 4),
+            COUNT(*) FILTER (WHERE "rating" = 5)
+        FROM "review"
+        WHERE "rating" BETWEEN 1 AND 5
+        GROUP BY "game_id";
+        """
+}
+
+# Keyset-paged game search. ORDER BY cannot be a parameter, so every sort key gets its own
+# statement: sort key -> (sort expression, direction, position before the first row).
+# The sort expressions match the expression indexes in sql/002_game_search.sql, except
+# the rating sorts, which read "game_review_stats".
+GAME_SORT_KEYS = {
+    "name": ('"g"."game_name"', "ASC", ("", 0)),
+    "releaseDate": ("""COALESCE("g"."release_date", DATE '0001-01-01')""", "DESC", ("infinity", 2147483647)),
+    "positiveRatings": ('COALESCE("g"."positive_ratings", 0)', "DESC", ("2147483647", 2147483647)),
+    "price": ('COALESCE("g"."price", 0)', "ASC", ("-1", 0)),
+    "averageRating": ('COALESCE("s"."rating_sum"::float8 / NULLIF("s"."review_count", 0), 0)', "DESC", ("Infinity", 2147483647)),
+    "reviewCount": ('COALESCE("s"."review_count", 0)', "DESC", ("2147483647", 2147483647))
+}
+
+# Name filters, each with its own statements so the planner always sees which index applies:
+# match mode -> (filter, relevance expression). Substring matches use the trigram index and
+# full-text matches the tsvector index from sql/003_game_name_search.sql. Searches without
+# a name are answered by the in-memory search engine and have no statements.
+GAME_NAME_MATCHES = {
+    "substring": (
+        """AND LOWER("g"."game_name") LIKE %(name_pattern)s""",
+        """similarity(LOWER("g"."game_name"), %(name_query)s)"""
+    ),
+    "fulltext": (
+        """AND to_tsvector('simple', "g"."game_name") @@ plainto_tsquery('simple', %(name_query)s)""",
+        """ts_rank(to_tsvector('simple', "g"."game_name"), plainto_tsquery('simple', %(name_query)s))"""
+    )
+}
+RELEVANCE_START = ("Infinity", 2147483647)
+
+def game_search_query(name_match: str, sort_by: str) -> str:
+    return "game.search.{}.{}".format(name_match, sort_by)
+
+for name_match, (name_filter, relevance_expr) in GAME_NAME_MATCHES.items():
+    sort_keys = dict(GAME_SORT_KEYS)
+    sort_keys["relevance"] = (relevance_expr, "DESC", RELEVANCE_START)
+
+    # Every game matching a name, for the facet counts of a name search
+    QUERIES["game.ids_by_name." + name_match] = """
+        SELECT "g"."game_id"
+        FROM "game" AS "g"
+        WHERE true {name_filter};
+        """.format(name_filter = name_filter)
+
+    for sort_by, (sort_expr, direction, _) in sort_keys.items():
+        # The seek value is sent as untyped text, so PostgreSQL reads it as the sort column's type
+        QUERIES[game_search_query(name_match, sort_by)] = """
+            SELECT
+                "g"."game_id",
+                "g"."game_name",
+                "g"."release_date",
+                "g"."price",
+                "g"."total_achievements",
+                "g"."positive_ratings",
+                "g"."negative_ratings",
+                "s"."review_count",
+                "s"."rating_sum",
+                {sort_expr} AS "sort_value"
+            FROM "game" AS "g"
+                LEFT JOIN "game_review_stats" AS "s" ON "s"."game_id" = "g"."game_id"
+            WHERE ({sort_expr}, "g"."game_id") {seek_op} (%(after_value)s, %(after_id)s)
+                {name_filter}
+                AND (%(genres)s::text[] IS NULL OR EXISTS (
+                    SELECT 1
+                    FROM "game_genre" AS "gg"
+                    WHERE "gg"."game_id" = "g"."game_id" AND "gg"."genre" = ANY(%(genres)s::text[])
+                ))
+                AND (%(genres_all)s::text[] IS NULL OR cardinality(%(genres_all)s::text[]) = (
+                    SELECT COUNT(DISTINCT "gg"."genre")
+                    FROM "game_genre" AS "gg"
+                    WHERE "gg"."game_id" = "g"."game_id" AND "gg"."genre" = ANY(%(genres_all)s::text[])
+                ))
+                AND (%(price_low)s::float8 IS NULL OR "g"."price" >= %(price_low)s::float8)
+                AND (%(price_upp)s::float8 IS NULL OR "g"."price" <= %(price_upp)s::float8)
+            ORDER BY {sort_expr} {direction}, "g"."game_id" {direction}
+            LIMIT %(limit)s;
+            """.format(sort_expr = sort_expr, seek_op = ">" if direction == "ASC" else "<",
+                       direction = direction, name_filter = name_filter)
+
+# Keyset-paged reviews of one game, like the game search: sort key -> (sort expression,
+# direction, position before the first row). Ties are broken by user ID, since a user
+# reviews a game only once. The expressions match the indexes in sql/005_review_browse.sql.
+REVIEW_SORT_KEYS = {
+    "newest": ("""COALESCE("times", TIMESTAMP '0001-01-01')""", "DESC", ("infinity", 2147483647)),
+    "oldest": ("""COALESCE("times", TIMESTAMP '0001-01-01')""", "ASC", ("-infinity", 0)),
+    "ratingHigh": ('COALESCE("rating", 0)', "DESC", ("2147483647", 2147483647)),
+    "ratingLow": ('COALESCE("rating", 0)', "ASC", ("-1", 0))
+}
+
+# Position before the first match of review.search: (rank, game ID, user ID)
+REVIEW_SEARCH_START = ("Infinity", 2147483647, 2147483647)
+
+def review_page_query(sort_by: str) -> str:
+    return "review.page.{}".format(sort_by)
+
+for sort_by, (sort_expr, direction, _) in REVIEW_SORT_KEYS.items():
+    QUERIES[review_page_query(sort_by)] = """
+        SELECT "user_id", "times", "texts", "rating", {sort_expr} AS "sort_value"
+        FROM "review"
+        WHERE "game_id" = %(game_id)s
+            AND ({sort_expr}, "user_id") {seek_op} (%(after_value)s, %(after_id)s)
+            AND (%(user_id)s::int IS NULL OR "user_id" = %(user_id)s::int)
+            AND (%(rating)s::int IS NULL OR "rating" = %(rating)s::int)
+        ORDER BY {sort_expr} {direction}, "user_id" {direction}
+        LIMIT %(limit)s;
+        """.format(sort_expr = sort_expr, seek_op = ">" if direction == "ASC" else "<", direction = direction)
+
+# Utility statements such as SET cannot be prepared by PostgreSQL
+UNPREPARED_QUERIES = {"txn.read_committed"}
+
+# name -> [calls, cumulative seconds]
+query_lock = threading.Lock()
+query_stats = {}
+
+def execute(cursor: Cursor, name: str, params: dict | None = None) -> Cursor:
+    start = time.perf_counter()
+    try:
+        return cursor.execute(QUERIES[name], params, prepare = name not in UNPREPARED_QUERIES)
+    finally:
+        elapsed = time.perf_counter() - start
+        with query_lock:
+            stats = query_stats.setdefault(name, [0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed
+
+def report() -> list[dict]:
+    # Statements sorted by cumulative time, most expensive first
+    with query_lock:
+        items = sorted(query_stats.items(), key = lambda item: item[1][1], reverse = True)
+    return [
+        {
+            "name": name,
+            "calls": calls,
+            "totalMs": round(total * 1000, 3),
+            "avgMs": round(total * 1000 / calls, 3)
+        }
+        for name, (calls, total) in items
+    ]
@@ -0,0 +1,84 @@
+import heapq
+import threading
+from bisect import bisect_left, insort
+from catalog import Game, CatalogListener
+
+RECOMMEND_SIZE = 5
+
+# Sizes of the personal recommendations of "recommend games"
+PERSONAL_RECOMMEND_SIZE = 10
+PERSONAL_RECOMMEND_MAXLEN = 50
+
+def _rank(game: Game) -> tuple:
+    # Most positive ratings first
+    return (-(game.positive_ratings or 0), game.game_id)
+
+# Games of every genre ranked by positive ratings, kept in step with the catalog. The
+# best games of a few genres are a merge of the heads of their lists.
+class GenreRanking(CatalogListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._games = {}
+        self._rankings = {}
+
+    def catalog_loaded(self, games: list[Game]):
+        rankings = {}
+        for game in games:
+            for genre in game.genres:
+                rankings.setdefault(genre, []).append(_rank(game))
+        for ranking in rankings.values():
+            ranking.sort()
+        with self._lock:
+            self._games = {game.game_id: game for game in games}
+            self._rankings = rankings
+
+    def game_upserted(self, game: Game, old: Game | None):
+        with self._lock:
+            if old is not None:
+                self._remove(old)
+            self._add(game)
+
+    def game_removed(self, game: Game):
+        with self._lock:
+            self._remove(game)
+
+    def _add(self, game: Game):
+        self._games[game.game_id] = game
+        for genre in game.genres:
+            insort(self._rankings.setdefault(genre, []), _rank(game))
+
+    def _remove(self, game: Game):
+        self._games.pop(game.game_id, None)
+        rank = _rank(game)
+        for genre in game.genres:
+            ranking = self._rankings.get(genre)
+            if ranking:
+                i = bisect_left(ranking, rank)
+                if i < len(ranking) and ranking[i] == rank:
+                    del ranking[i]
+                if not ranking:
+                    del self._rankings[genre]
+
+    def recommend(self, genres: list[str], exclude: int | None = None, limit: int = RECOMMEND_SIZE) -> list[Game]:
+        # The games with the most positive ratings among those of any of the genres.
+        # The merge stops after limit games, so only the heads of the lists are read.
+        with self._lock:
+            rankings = [self._rankings.get(genre, []) for genre in set(genres)]
+            games = []
+            last = None
+            for rank in heapq.merge(*rankings):
+                # A game of several of the genres comes once from each of their lists
+                if rank == last or rank[1] == exclude:
+                    continue
+                last = rank
+                games.append(self._games[rank[1]])
+                if len(games) == limit:
+                    break
+            return games
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "genres": len(self._rankings),
+                "entries": sum(len(ranking) for ranking in self._rankings.values())
+            }
@@ -0,0 +1,107 @@
+import threading
+from psycopg import Cursor
+import queries
+
+class Room:
+    def __init__(self, room_id: int, room_name: str, host_id: int, host_name: str, game_id: int, game_name: str, capacity: int):
+        self.room_id = room_id
+        self.room_name = room_name
+        self.host_id = host_id
+        self.host_name = host_name
+        self.game_id = game_id
+        self.game_name = game_name
+        self.capacity = capacity
+        # Live members: user_id -> display name
+        self.members = {}
+
+# Authoritative in-memory view of the active rooms. The database is still written on
+# every membership change, but chat fan-out only reads from here.
+class RoomRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rooms = {}
+
+    def load(self, cursor: Cursor, room_id: int | None = None):
+        # Loads every active room, or refreshes a single one when room_id is given
+        queries.execute(cursor, "room.registry", {"room_id": room_id})
+        rooms = {}
+        for row in cursor.fetchall():
+            rooms[row["room_id"]] = Room(row["room_id"], row["room_name"], row["creator_id"], row["user_name"],
+                                         row["game_id"], row["game_name"], row["max_players"])
+
+        queries.execute(cursor, "user_in_room.registry", {"room_id": room_id})
+        for row in cursor.fetchall():
+            room = rooms.get(row["room_id"])
+            if room:
+                room.members[row["user_id"]] = row["user_name"]
+
+        with self._lock:
+            if room_id is None:
+                self._rooms = rooms
+            elif room_id in rooms:
+                self._rooms[room_id] = rooms[room_id]
+            else:
+                self._rooms.pop(room_id, None)
+
+    def create(self, room: Room, host_name: str):
+        with self._lock:
+            room.members[room.host_id] = host_name
+            self._rooms[room.room_id] = room
+
+    def join(self, room_id: int, user_id: int, user_name: str) -> list[int]:
+        # Returns the members who should be told about the new one
+        with self._lock:
+            room = self._rooms.get(room_id)
+            if room is None:
+                return []
+            others = [member_id for member_id in room.members if member_id != user_id]
+            room.members[user_id] = user_name
+            return others
+
+    def leave(self, room_id: int, user_id: int) -> list[int]:
+        with self._lock:
+            room = self._rooms.get(room_id)
+            if room is None:
+                return []
+            room.members.pop(user_id, None)
+            return list(room.members)
+
+    def close(self, room_id: int) -> list[int]:
+        with self._lock:
+            room = self._rooms.pop(room_id, None)
+            return list(room.members) if room else []
+
+    def get(self, room_id: int) -> Room | None:
+        with self._lock:
+            return self._rooms.get(room_id)
+
+    def member_name(self, room_id: int, user_id: int) -> str | None:
+        with self._lock:
+            room = self._rooms.get(room_id)
+            return room.members.get(user_id) if room else None
+
+    def members(self, room_id: int) -> list[int]:
+        with self._lock:
+            room = self._rooms.get(room_id)
+            return list(room.members) if room else []
+
+    def list(self, game_ids: set[int] | None = None, hide_full: bool = False) -> list[tuple[Room, int]]:
+        # Active rooms with their live member counts, optionally only those of the given
+        # games and those with a free seat
+        with self._lock:
+            rooms = []
+            for room in self._rooms.values():
+                if game_ids is not None and room.game_id not in game_ids:
+                    continue
+                n_members = len(room.members)
+                if hide_full and n_members >= room.capacity:
+                    continue
+                rooms.append((room, n_members))
+            return rooms
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "activeRooms": len(self._rooms),
+                "members": sum(len(room.members) for room in self._rooms.values())
+            }
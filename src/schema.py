@@ -0,0 +1,19 @@
+import os
+import psycopg
+
+# DDL shipped with the server, applied in file name order at every startup.
+# Every file must be idempotent (IF NOT EXISTS / OR REPLACE).
+SQL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "sql")
+
+# Serializes schema changes when several nodes start at the same time
+SCHEMA_LOCK_KEY = 7_350_001
+
+def apply(pg_conn: psycopg.Connection):
+    with pg_conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s);", (SCHEMA_LOCK_KEY,))
+        for file_name in sorted(os.listdir(SQL_DIR)):
+            if not file_name.endswith(".sql"):
+                continue
+            with open(os.path.join(SQL_DIR, file_name), encoding = "utf-8") as f:
+                cursor.execute(f.read())
+    pg_conn.commit()
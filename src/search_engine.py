@@ -0,0 +1,305 @@
+import heapq
+import datetime
+import threading
+from bisect import bisect_left, bisect_right, insort
+from catalog import Game, CatalogListener
+
+GENRE_MATCH_ANY = "any"
+GENRE_MATCH_ALL = "all"
+
+# Sort key -> function giving the key under which games are listed in ascending order.
+# Descending sorts negate the value. Missing values sort like the SQL search's COALESCE.
+SORT_KEYS = {
+    "name": lambda game: game.game_name,
+    "releaseDate": lambda game: -(game.release_date or datetime.date.min).toordinal(),
+    "positiveRatings": lambda game: -(game.positive_ratings or 0),
+    "price": lambda game: game.price or 0.0,
+    "averageRating": lambda game: -(game.average_rating() or 0.0),
+    "reviewCount": lambda game: -game.review_count
+}
+
+# Price bands reported as facets: (label, lowest price, highest price)
+PRICE_BANDS = [
+    ("free", 0.0, 0.0),
+    ("0-5", 0.01, 4.99),
+    ("5-10", 5.0, 9.99),
+    ("10-20", 10.0, 19.99),
+    ("20-40", 20.0, 39.99),
+    ("40+", 40.0, float("inf"))
+]
+
+def _price_band(price: float | None) -> str | None:
+    if price is None:
+        return None
+    for label, _, highest in PRICE_BANDS:
+        if price <= highest:
+            return label
+    return PRICE_BANDS[-1][0]
+
+def _bitmap(game_ids) -> int:
+    # Bit i is set when game i is in the set. Built through a byte array, because or-ing
+    # single bits into a large int copies the whole int every time.
+    game_ids = list(game_ids)
+    if not game_ids:
+        return 0
+    bits = bytearray(max(game_ids) // 8 + 1)
+    for game_id in game_ids:
+        bits[game_id >> 3] |= 1 << (game_id & 7)
+    return int.from_bytes(bits, "little")
+
+# Below this share of the catalog, matching games are sorted directly instead of
+# scanning the whole sort order for them
+SMALL_RESULT_RATIO = 0.05
+
+def _intersect(a: list[int], b: list[int]) -> list[int]:
+    # Both lists are sorted. When one is much shorter, each of its ids is looked up with
+    # bisect in a shrinking window of the other; otherwise the two are merged.
+    if len(a) > len(b):
+        a, b = b, a
+    result = []
+    if len(a) * 8 < len(b):
+        lo = 0
+        for game_id in a:
+            lo = bisect_left(b, game_id, lo)
+            if lo == len(b):
+                break
+            if b[lo] == game_id:
+                result.append(game_id)
+        return result
+
+    i = j = 0
+    while i < len(a) and j < len(b):
+        if a[i] == b[j]:
+            result.append(a[i])
+            i += 1
+            j += 1
+        elif a[i] < b[j]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+def _union(lists: list[list[int]]) -> list[int]:
+    result = []
+    for game_id in heapq.merge(*lists):
+        if not result or result[-1] != game_id:
+            result.append(game_id)
+    return result
+
+# Inverted indexes over the catalog for the genre and price filters of "search games":
+# genre -> sorted game ids, and (price, game id) pairs sorted by price for range lookups.
+# Every sort key also keeps the whole catalog in that order, so the pages of a search
+# come out already sorted and grouped, without touching PostgreSQL.
+class SearchEngine(CatalogListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._games = {}
+        self._genre_postings = {}
+        self._prices = []
+        self._orders = {sort_by: [] for sort_by in SORT_KEYS}
+        # Facet bitmaps: facet value -> int with a bit set per game id
+        self._genre_bits = {}
+        self._band_bits = {}
+        self._year_bits = {}
+
+    def catalog_loaded(self, games: list[Game]):
+        genre_postings = {}
+        for game in sorted(games, key = lambda game: game.game_id):
+            for genre in game.genres:
+                genre_postings.setdefault(genre, []).append(game.game_id)
+        prices = sorted((game.price, game.game_id) for game in games if game.price is not None)
+        orders = {
+            sort_by: sorted((key(game), game.game_id) for game in games)
+            for sort_by, key in SORT_KEYS.items()
+        }
+        band_ids = {}
+        year_ids = {}
+        for game in games:
+            band = _price_band(game.price)
+            if band is not None:
+                band_ids.setdefault(band, []).append(game.game_id)
+            if game.release_date is not None:
+                year_ids.setdefault(game.release_date.year, []).append(game.game_id)
+        genre_bits = {genre: _bitmap(postings) for genre, postings in genre_postings.items()}
+        band_bits = {band: _bitmap(ids) for band, ids in band_ids.items()}
+        year_bits = {year: _bitmap(ids) for year, ids in year_ids.items()}
+
+        with self._lock:
+            self._games = {game.game_id: game for game in games}
+            self._genre_postings = genre_postings
+            self._prices = prices
+            self._orders = orders
+            self._genre_bits = genre_bits
+            self._band_bits = band_bits
+            self._year_bits = year_bits
+
+    def game_upserted(self, game: Game, old: Game | None):
+        with self._lock:
+            if old is not None:
+                self._remove(old)
+            self._add(game)
+
+    def game_removed(self, game: Game):
+        with self._lock:
+            self._remove(game)
+
+    def _add(self, game: Game):
+        self._games[game.game_id] = game
+        for genre in game.genres:
+            insort(self._genre_postings.setdefault(genre, []), game.game_id)
+        if game.price is not None:
+            insort(self._prices, (game.price, game.game_id))
+        for sort_by, key in SORT_KEYS.items():
+            insort(self._orders[sort_by], (key(game), game.game_id))
+        bit = 1 << game.game_id
+        for bitmaps, value in self._facet_values(game):
+            bitmaps[value] = bitmaps.get(value, 0) | bit
+
+    def _remove(self, game: Game):
+        self._games.pop(game.game_id, None)
+        for genre in game.genres:
+            postings = self._genre_postings.get(genre)
+            if postings:
+                i = bisect_left(postings, game.game_id)
+                if i < len(postings) and postings[i] == game.game_id:
+                    del postings[i]
+                if not postings:
+                    del self._genre_postings[genre]
+        if game.price is not None:
+            i = bisect_left(self._prices, (game.price, game.game_id))
+            if i < len(self._prices) and self._prices[i] == (game.price, game.game_id):
+                del self._prices[i]
+        for sort_by, key in SORT_KEYS.items():
+            order = self._orders[sort_by]
+            i = bisect_left(order, (key(game), game.game_id))
+            if i < len(order) and order[i][1] == game.game_id:
+                del order[i]
+        bit = 1 << game.game_id
+        for bitmaps, value in self._facet_values(game):
+            bitmaps[value] = bitmaps.get(value, 0) & ~bit
+            if not bitmaps[value]:
+                del bitmaps[value]
+
+    def _facet_values(self, game: Game) -> list[tuple[dict, object]]:
+        values = [(self._genre_bits, genre) for genre in game.genres]
+        band = _price_band(game.price)
+        if band is not None:
+            values.append((self._band_bits, band))
+        if game.release_date is not None:
+            values.append((self._year_bits, game.release_date.year))
+        return values
+
+    def _price_range(self, price_low: float | None, price_upp: float | None) -> list[int]:
+        lo = bisect_left(self._prices, (price_low, -1)) if price_low is not None else 0
+        hi = bisect_right(self._prices, (price_upp, float("inf"))) if price_upp is not None else len(self._prices)
+        return sorted(game_id for _, game_id in self._prices[lo:hi])
+
+    def _match(self, genres: list[str] | None, genre_match: str, price_low: float | None, price_upp: float | None,
+               restrict_to: list[int] | None = None) -> list[int] | None:
+        # Sorted ids of the games passing every filter, or None when nothing is filtered
+        candidates = [restrict_to] if restrict_to is not None else []
+        if genres:
+            postings = [self._genre_postings.get(genre, []) for genre in genres]
+            if genre_match == GENRE_MATCH_ALL:
+                postings.sort(key = len)
+                matched = postings[0]
+                for other in postings[1:]:
+                    matched = _intersect(matched, other)
+                candidates.append(matched)
+            else:
+                candidates.append(_union(postings))
+        if price_low is not None or price_upp is not None:
+            candidates.append(self._price_range(price_low, price_upp))
+
+        if not candidates:
+            return None
+        candidates.sort(key = len)
+        matched = candidates[0]
+        for other in candidates[1:]:
+            matched = _intersect(matched, other)
+        return matched
+
+    def search(self, genres: list[str] | None = None, genre_match: str = GENRE_MATCH_ANY,
+               price_low: float | None = None, price_upp: float | None = None,
+               sort_by: str = "name", after: tuple | None = None,
+               limit: int = 50, restrict_to: list[int] | None = None,
+               relevance: dict[int, object] | None = None) -> tuple[list[Game], tuple | None]:
+        # Returns one page of games and, when more games match, the position to pass as
+        # after for the next page. restrict_to (sorted ids) limits the search to the given
+        # games; with sort_by "relevance" they are listed by ascending relevance[game id].
+        with self._lock:
+            matched = self._match(genres, genre_match, price_low, price_upp, restrict_to)
+            if sort_by == "relevance":
+                order = None
+                key = lambda game: relevance[game.game_id]
+            else:
+                order = self._orders[sort_by]
+                key = SORT_KEYS[sort_by]
+
+            if order is None or matched is not None and len(matched) < len(order) * SMALL_RESULT_RATIO:
+                positions = ((key(self._games[game_id]), game_id) for game_id in matched)
+                if after is not None:
+                    positions = (position for position in positions if position > after)
+                page = heapq.nsmallest(limit + 1, positions)
+            else:
+                start = bisect_right(order, after) if after is not None else 0
+                matched_set = set(matched) if matched is not None else None
+                page = []
+                for i in range(start, len(order)):
+                    if matched_set is None or order[i][1] in matched_set:
+                        page.append(order[i])
+                        if len(page) > limit:
+                            break
+
+            has_more = len(page) > limit
+            page = page[:limit]
+            games = [self._games[game_id] for _, game_id in page]
+            return games, (page[-1] if has_more else None)
+
+    def facets(self, genres: list[str] | None = None, genre_match: str = GENRE_MATCH_ANY,
+               price_low: float | None = None, price_upp: float | None = None,
+               restrict_to: list[int] | None = None) -> dict:
+        # Counts of matching games per genre, price band and release year. Each facet is
+        # counted with its own filter left out, so the genre counts tell how many games
+        # picking that genre would give under the other filters, and likewise for prices.
+        # restrict_to limits everything to the given ids, e.g. the games matching a name.
+        with self._lock:
+            everything = -1
+            restrict_bits = _bitmap(restrict_to) if restrict_to is not None else everything
+
+            genre_bits = everything
+            if genres:
+                selected = [self._genre_bits.get(genre, 0) for genre in genres]
+                genre_bits = selected[0]
+                for bits in selected[1:]:
+                    genre_bits = genre_bits & bits if genre_match == GENRE_MATCH_ALL else genre_bits | bits
+
+            price_bits = everything
+            if price_low is not None or price_upp is not None:
+                price_bits = _bitmap(self._price_range(price_low, price_upp))
+
+            return {
+                "genres": self._count(self._genre_bits, restrict_bits & price_bits),
+                "priceBands": self._count(self._band_bits, restrict_bits & genre_bits),
+                "releaseYears": self._count(self._year_bits, restrict_bits & genre_bits & price_bits)
+            }
+
+    def _count(self, bitmaps: dict, base: int) -> dict:
+        # -1 has every bit set, so an unfiltered base counts the whole facet
+        counts = {}
+        for value, bits in bitmaps.items():
+            count = (bits & base).bit_count()
+            if count:
+                counts[str(value)] = count
+        return counts
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "games": len(self._games),
+                "genres": len(self._genre_postings),
+                "pricedGames": len(self._prices),
+                "facetBitmaps": len(self._genre_bits) + len(self._band_bits) + len(self._year_bits),
+                "facetBitmapBytes": sum((bits.bit_length() + 7) // 8 for bitmaps in (self._genre_bits, self._band_bits, self._year_bits)
+                                        for bits in bitmaps.values())
+            }
@@ -2,24 +2,85 @@ import sys
 import argparse
 import psycopg
 from psycopg import Cursor
+from psycopg.conninfo import make_conninfo
 from psycopg.rows import dict_row
+from psycopg.types.numeric import Int4, Float8
 import socket
 import threading
+import asyncio
 import json
+import base64
 import datetime
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
 from display_utils import *
 from network_utils import *
+from client_session import *
+from db_pool import DBPool, PoolTimeout
+from room_registry import Room, RoomRegistry
+from broadcast_bus import *
+from catalog import Game, Catalog
+from search_engine import SearchEngine, GENRE_MATCH_ANY, GENRE_MATCH_ALL, SORT_KEYS as SEARCH_SORT_KEYS
+from fuzzy_index import FuzzyIndex
+from recommender import GenreRanking, PERSONAL_RECOMMEND_SIZE, PERSONAL_RECOMMEND_MAXLEN
+from suggest_index import SuggestIndex, SUGGEST_SIZE, SUGGEST_MAXLEN
+import queries
+import schema
 
 RETCODE_NORMAL = 1
 RETCODE_EXIT = 0
 RETCODE_ERROR = -1
 
-BUFFER_MAXLEN = 4096
+BUFFER_MAXLEN = 65536
 
-join_room_lock = threading.Lock()
+# Record the sessions of the clients signed in on this node. Which node every signed-in
+# user is connected to is recorded cluster-wide in the "online_session" table.
+client_id2session = {}
 
-# Record all clients' sockets
-client_id2sock = {}
+# Name of this server node in "online_session" and on the broadcast bus
+NODE_ID = None
+
+# Seconds between the heartbeats of this node, and seconds without a heartbeat after which
+# a node counts as dead and the users signed in on it may sign in on another node
+NODE_HEARTBEAT_INTERVAL = 5.0
+NODE_TIMEOUT = 30.0
+heartbeat_stopped = threading.Event()
+
+# Carries room events to the other server nodes
+broadcast_bus: BroadcastBus = LocalBus("local")
+
+# Live members of every active room
+room_registry = RoomRegistry()
+
+# Games and their genres, kept in step with the database by the admin handlers
+catalog = Catalog()
+
+# Genre and price indexes over the catalog
+search_engine = SearchEngine()
+catalog.add_listener(search_engine)
+
+# Trigram index over the game names for fuzzy name searches
+fuzzy_index = FuzzyIndex()
+catalog.add_listener(fuzzy_index)
+
+# Games of every genre by positive ratings, for the recommendations after a good review
+genre_ranking = GenreRanking()
+catalog.add_listener(genre_ranking)
+
+# Name completion index over the catalog
+suggest_index = SuggestIndex()
+catalog.add_listener(suggest_index)
+
+SERVER_MODE_THREAD = "thread"
+SERVER_MODE_ASYNCIO = "asyncio"
+
+# Worker threads running the blocking database handlers
+db_executor = None
+
+# Maximum number of pipelined requests in flight per connection
+MAX_INFLIGHT = 32
+
+# Connection pool shared by all handlers
+db_pool: DBPool = None
 
 # PostgreSQL connection settings
 PG_HOST = None 
@@ -50,22 +111,203 @@ REQUEST_MAP = {
     # Admin functions
     "add game": 15,
     "update game": 16,
-    "delete game": 17
+    "delete game": 17,
+    # Maintenance functions
+    "server stats": 18,
+    # Several requests in one round trip
+    "batch": 19,
+    # User functions
+    "suggest games": 20,
+    "recommend games": 21,
+    "search reviews": 22,
+    # Admin functions
+    "bulk add games": 23,
+    "bulk update games": 24
+}
+
+# Request types that may appear inside a batch. Session and room requests are left out
+# because they register sockets or broadcast to other users before the batch commits.
+BATCHABLE_REQUESTS = {
+    "search games",
+    "add review",
+    "delete review",
+    "add to favorite",
+    "check user",
+    "update profile",
+    "list rooms",
+    "check reviews",
+    "recommend games",
+    "search reviews",
+    "add game",
+    "update game",
+    "delete game"
+}
+BATCH_MAXLEN = 100
+
+# Length of a chat message as JSON text. The rest of the bus event takes well under the
+# remaining NOTIFY payload bytes.
+ROOM_MESSAGE_MAXLEN = 4000
+
+# Games per bulk request, and games written per transaction of a bulk request
+BULK_MAXLEN = 10000
+BULK_CHUNK_SIZE = 500
+
+# Orders of "list rooms": oldest room first, or fullest first so that rooms about to
+# start come on top
+ROOM_SORT_KEYS = {
+    "roomID": lambda item: item[0].room_id,
+    "fillLevel": lambda item: (-item[1] / item[0].capacity if item[0].capacity else 0, item[0].room_id)
+}
+
+# Name match of "search games" served by the fuzzy index instead of PostgreSQL
+NAME_MATCH_FUZZY = "fuzzy"
+
+# Page sizes of paged requests
+PAGE_SIZE = 50
+PAGE_MAXLEN = 200
+
+# Request types served without a database connection
+NO_DB_REQUESTS = {
+    "room communication",
+    "server stats",
+    "suggest games",
+    "list rooms"
 }
 
-def _exit(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_sock: socket.socket):
+def _push_to_users(user_ids: list[int], message: dict):
+    # The message is encoded once and the same frame is queued for every recipient.
+    # Members who are not connected any more are skipped.
+    frame = encode_frame(message)
+    for user_id in user_ids:
+        session = client_id2session.get(user_id)
+        if session:
+            session.send_frame(frame)
+
+def _apply_room_event(event: dict):
+    # Applies a room event to this node's registry and pushes it to the members connected
+    # here. Runs on the node that made the change and, through the bus, on every other node.
+    room_id = event.get("roomID")
+    match event["kind"]:
+        case "room create":
+            room = Room(room_id, event["roomName"], event["userID"], event["userName"],
+                        event["gameID"], event["gameName"], event["roomNumMembersLimit"])
+            room_registry.create(room, event["userName"])
+        case "room join":
+            _push_to_users(room_registry.join(room_id, event["userID"], event["userName"]), event["message"])
+        case "room leave":
+            _push_to_users(room_registry.leave(room_id, event["userID"]), event["message"])
+        case "room close":
+            _push_to_users([member_id for member_id in room_registry.close(room_id) if member_id != event["userID"]], event["message"])
+        case "push":
+            _push_to_users(event["userIDs"], event["message"])
+
+def _apply_bus_event(event: dict):
+    # Events published by other nodes
+    if event["kind"] == "catalog":
+        with db_pool.connection() as pg_conn, pg_conn.cursor(row_factory = dict_row) as cursor:
+            catalog.refresh(cursor, event["gameIDs"])
+            pg_conn.commit()
+    elif event["kind"] == "review":
+        catalog.apply_review_stats(event["gameID"], event["reviewCount"], event["ratingSum"], event["version"])
+    else:
+        _apply_room_event(event)
+
+def _resync_from_db():
+    with db_pool.connection() as pg_conn, pg_conn.cursor(row_factory = dict_row) as cursor:
+        room_registry.load(cursor)
+        catalog.load(cursor)
+        pg_conn.commit()
+
+def _after_commit(pg_conn: psycopg.Connection, action):
+    # Inside an atomic batch the transaction only commits with the whole batch, so the action
+    # waits for it and is dropped if the batch rolls back
+    if isinstance(pg_conn, _BatchConnection):
+        pg_conn.after_commit.append(action)
+    else:
+        action()
+
+def _write_through_games(cursor: Cursor, game_ids: list[int]):
+    # Called by the admin handlers right before they commit. Tells the other nodes, which
+    # only hear about it if the commit succeeds. Returns the action that has this node's
+    # catalog re-read the rows after the commit, the same way the other nodes do.
+    broadcast_bus.publish({"kind": "catalog", "gameIDs": game_ids}, cursor)
+    return lambda: _refresh_catalog(cursor, game_ids)
+
+def _refresh_catalog(cursor: Cursor, game_ids: list[int]):
+    # The write has committed and is answered OK either way; a failed read only leaves
+    # this node's catalog behind
+    try:
+        catalog.refresh(cursor, game_ids)
+        cursor.connection.commit()
+    except Exception as e:
+        cursor.connection.rollback()
+        print("[Error] Catalog refresh failed: {}".format(e))
+
+def _use_read_committed(pg_conn: psycopg.Connection, cursor: Cursor):
+    # Batchable handlers only: an atomic batch runs in one transaction, whose isolation
+    # level can no longer be changed after its first request
+    if not isinstance(pg_conn, _BatchConnection):
+        queries.execute(cursor, "txn.read_committed")
+
+def _publish_review(cursor: Cursor, game_id: int, rating: int | None):
+    # Called by the review handlers right before they commit. The trigger on "review" has
+    # updated "game_review_stats" and holds the row lock until the commit, so the row read
+    # here is the one the commit makes visible. The catalogs of every node set it, not
+    # add to it, once the commit is done.
+    if rating is None:
+        return
+    queries.execute(cursor, "review_stats.by_game", {"game_id": game_id})
+    row = cursor.fetchone()
+    if not row:
+        return
+    review_count, rating_sum, version = row["review_count"], row["rating_sum"], row["version"]
+    broadcast_bus.publish({
+        "kind": "review",
+        "gameID": game_id,
+        "reviewCount": review_count,
+        "ratingSum": rating_sum,
+        "version": version
+    }, cursor)
+    return lambda: catalog.apply_review_stats(game_id, review_count, rating_sum, version)
+
+def _heartbeat_loop():
+    while not heartbeat_stopped.wait(NODE_HEARTBEAT_INTERVAL):
+        try:
+            with db_pool.connection() as pg_conn, pg_conn.cursor() as cursor:
+                queries.execute(cursor, "server_node.heartbeat", {"node_id": NODE_ID})
+                pg_conn.commit()
+        except Exception as e:
+            print("[Error] Heartbeat failed: {}".format(e))
+
+def _end_session(pg_conn: psycopg.Connection, cursor: Cursor, user_id: int):
+    queries.execute(cursor, "online_session.release", {"user_id": user_id, "node_id": NODE_ID})
+    pg_conn.commit()
+    client_id2session.pop(user_id, None)
+
+def _encode_page_cursor(position: list) -> str:
+    # Cursors are opaque to clients; they only hand back what the previous page returned
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii")
+
+def _decode_page_cursor(page_cursor: str) -> list:
+    return json.loads(base64.urlsafe_b64decode(page_cursor.encode("ascii")))
+
+def _escape_like(text: str) -> str:
+    # User input is matched literally; backslash is LIKE's default escape character
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _page_size(request: dict) -> int:
+    page_size = request.get("pageSize") or PAGE_SIZE
+    return max(1, min(int(page_size), PAGE_MAXLEN))
+
+def _exit(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
     user_id = request["userID"]
-    client_id2sock.pop(user_id)
+    if client_id2session.get(user_id) is client:
+        _end_session(pg_conn, cursor, user_id)
 
-def _sign_in(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_sock: socket.socket):
+def _sign_in(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
     try:
         user_id = request["userID"]
-        query = """
-                SELECT "user_name", "password" 
-                FROM "user"
-                WHERE "user_id" = {};
-                """.format(user_id)
-        cursor.execute(query)
+        queries.execute(cursor, "user.credentials", {"user_id": user_id})
         row = cursor.fetchone()
         
         if not row:
@@ -76,36 +318,36 @@ def _sign_in(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_
         else:
             user_name, password = row["user_name"], row["password"]
             if request["password"] == password:
-                query = """
-                        SELECT "role" 
-                        FROM "user_role" 
-                        WHERE "user_id" = {};
-                        """.format(user_id)
-                cursor.execute(query)
+                queries.execute(cursor, "user.role", {"user_id": user_id})
                 row = cursor.fetchone()
                 role = row["role"]
-                response = {
-                    "status": "OK",
-                    "userName": user_name,
-                    "role": role
-                }
-            else:
-                response = {
-                    "status": "FAIL",
-                    "errorMessage": "Authentication failed"
-                }
 
-            if not client_id2sock.get(user_id):
-                client_id2sock[user_id] = client_sock
+                # The primary key on "online_session" lets only one node claim the user
+                queries.execute(cursor, "online_session.claim", {"user_id": user_id, "node_id": NODE_ID, "node_timeout": NODE_TIMEOUT})
+                if cursor.fetchone():
+                    response = {
+                        "status": "OK",
+                        "userName": user_name,
+                        "role": role
+                    }
+                else:
+                    response = {
+                        "status": "FAIL",
+                        "errorMessage": "You have already signed in somewhere."
+                    }
             else:
                 response = {
                     "status": "FAIL",
-                    "errorMessage": "You have already signed in somewhere."
+                    "errorMessage": "Authentication failed"
                 }
 
-        sendall(client_sock, response)
-        
         pg_conn.commit()
+
+        if response["status"] == "OK":
+            client_id2session[user_id] = client
+            client.user_id = user_id
+
+        client.reply(request, response)
     
     except Exception as e:
         pg_conn.rollback()
@@ -114,38 +356,34 @@ def _sign_in(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_
             "status": "FAIL",
             "errorMessage": "Unknwon error"
         }
-        sendall(client_sock, response)
+        client.reply(request, response)
 
-def _sign_up(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_sock: socket.socket):
+def _sign_up(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
     try:
-        user_name = request["userName"].replace("\'", "\'\'")
-        email = request["email"].replace("\'", "\'\'")
-        password = request["password"].replace("\'", "\'\'")
+        user_name = request["userName"]
+        email = request["email"]
+        password = request["password"]
         role = request["role"]
-        join_date = str(datetime.date.today())
-
-        query = """
-                INSERT INTO "user" ("user_name", "email", "password", "join_date") 
-                VALUES ('{}', '{}', '{}', '{}')
-                RETURNING "user_id";
-                """.format(user_name, email, password, join_date)
-        cursor.execute(query)
+        join_date = datetime.date.today()
+
+        queries.execute(cursor, "user.insert", {
+            "user_name": user_name,
+            "email": email,
+            "password": password,
+            "join_date": join_date
+        })
         user_id = cursor.fetchone()["user_id"]
 
-        query = """
-                INSERT INTO "user_role" ("user_id", "role")
-                VALUES ({}, '{}');
-                """.format(user_id, role)
-        cursor.execute(query)
+        queries.execute(cursor, "user_role.insert", {"user_id": user_id, "role": role})
         
         response = {
             "status": "OK",
             "userID": user_id
         }
 
-        sendall(client_sock, response)
-
         pg_conn.commit()
+
+        client.reply(request, response)
     
     except Exception as e:
         pg_conn.rollback()
@@ -154,89 +392,288 @@ def _sign_up(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_
             "status": "FAIL",
             "errorMessage": "Unknown error"
         }
-        sendall(client_sock, response)
+        client.reply(request, response)
+
+def _game_record(game: Game) -> dict:
+    return {
+        "gameID": game.game_id,
+        "gameName": game.game_name,
+        "genres": list(game.genres),
+        "releaseDate": str(game.release_date) if game.release_date is not None else "",
+        "price": game.price if game.price is not None else "",
+        "totalAchievements": game.total_achievements if game.total_achievements is not None else "",
+        "positiveRatings": game.positive_ratings if game.positive_ratings is not None else "",
+        "negativeRatings": game.negative_ratings if game.negative_ratings is not None else "",
+        "reviewCount": game.review_count,
+        "averageRating": round(game.average_rating(), 2) if game.review_count else ""
+    }
+
+def _search_games_in_memory(request: dict, genres: list[str] | None, genre_match: str,
+                            price_low: float | None, price_upp: float | None, sort_by: str, page_size: int,
+                            fuzzy_name: str | None = None) -> dict:
+    if sort_by not in SEARCH_SORT_KEYS and not (fuzzy_name and sort_by == "relevance"):
+        return {
+            "status": "FAIL",
+            "errorMessage": "Games can be sorted by {}, or by relevance when searching by name".format(", ".join(SEARCH_SORT_KEYS))
+        }
 
-def _user_search_games(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_sock: socket.socket):
+    restrict_to = None
+    relevance = None
+    cursor_source = "memory." + sort_by
+    if fuzzy_name:
+        # Closest names first, the more popular game first among equally close ones
+        matches = fuzzy_index.match(fuzzy_name)
+        restrict_to = sorted(matches)
+        relevance = {}
+        for game_id, distance in matches.items():
+            game = catalog.get(game_id)
+            relevance[game_id] = (distance, -(game.positive_ratings or 0) if game else 0)
+        cursor_source = "memory.fuzzy." + sort_by
+
+    after = None
+    if request.get("cursor"):
+        try:
+            page_source, after_key, after_id = _decode_page_cursor(request["cursor"])
+        except ValueError:
+            page_source = None
+        if page_source != cursor_source:
+            return {
+                "status": "FAIL",
+                "errorMessage": "Invalid cursor"
+            }
+        # Relevance keys are pairs, which come back from JSON as lists
+        after = (tuple(after_key) if type(after_key) == list else after_key, after_id)
+
+    games, last = search_engine.search(genres, genre_match, price_low, price_upp, sort_by, after, page_size,
+                                       restrict_to, relevance)
+    response = {
+        "status": "OK",
+        "data": [_game_record(game) for game in games],
+        "nextCursor": _encode_page_cursor([cursor_source, last[0], last[1]]) if last else None
+    }
+    if request.get("facets"):
+        response["facets"] = search_engine.facets(genres, genre_match, price_low, price_upp, restrict_to)
+    return response
+
+def _user_search_games(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
     try:
         game_name = request.get("gameName")
-        genres = request.get("genres")
-        price_low = request.get("priceLow")
-        price_upp = request.get("priceUpp")
-        
-        query = """
-                SELECT 
-                    "g"."game_id", 
-                    "game_name", 
-                    "release_date", 
-                    "total_achievements", 
-                    "positive_ratings", 
-                    "negative_ratings", 
-                    "genre"
-                FROM "game" AS "g"
-                    JOIN "game_genre" AS "gg" ON "g"."game_id" = "gg"."game_id"
-                WHERE"""
-        conditions = [" true "]
-        if game_name:
-            conditions.append(""" LOWER("game_name") LIKE LOWER('%{}%') """.format(game_name))
-        if genres:
-            conditions.append(""" "genre" IN ('{}') """.format("','".join(genres)))
-        if price_low:
-            conditions.append(""" "price" >= {} """.format(price_low))
-        if price_upp:
-            conditions.append(""" "price" <= {} """.format(price_upp))
-        query += "AND".join(conditions) + ';'
-        cursor.execute(query)
+        genres = sorted(set(request["genres"])) if request.get("genres") else None
+        genre_match = request.get("genreMatch") or GENRE_MATCH_ANY
+        price_low = request.get("priceLow") or None
+        price_upp = request.get("priceUpp") or None
+        name_match = (request.get("nameMatch") or "substring") if game_name else "none"
+        sort_by = request.get("sortBy") or ("relevance" if game_name else "name")
+        page_size = _page_size(request)
+
+        if game_name and name_match not in queries.GAME_NAME_MATCHES and name_match != NAME_MATCH_FUZZY:
+            response = {
+                "status": "FAIL",
+                "errorMessage": "Game names can be matched by substring, fulltext or fuzzy"
+            }
+            client.reply(request, response)
+            return
+
+        if genre_match not in (GENRE_MATCH_ANY, GENRE_MATCH_ALL):
+            response = {
+                "status": "FAIL",
+                "errorMessage": "Genres can be matched by any or all"
+            }
+            client.reply(request, response)
+            return
+
+        # Without a name, the genre and price filters are answered by the in-memory search engine
+        if name_match == "none":
+            client.reply(request, _search_games_in_memory(request, genres, genre_match, price_low, price_upp, sort_by, page_size))
+            return
+
+        # Names with typos are looked up in the in-memory trigram index
+        if name_match == NAME_MATCH_FUZZY:
+            client.reply(request, _search_games_in_memory(request, genres, genre_match, price_low, price_upp, sort_by, page_size,
+                                                          game_name))
+            return
+
+        query_name = queries.game_search_query(name_match, sort_by)
+        if query_name not in queries.QUERIES:
+            response = {
+                "status": "FAIL",
+                "errorMessage": "Games can be sorted by {}, or by relevance when searching by name".format(", ".join(queries.GAME_SORT_KEYS))
+            }
+            client.reply(request, response)
+            return
+
+        # A cursor is the (sort value, game ID) of the last game on the previous page;
+        # the next page seeks past it instead of skipping rows with OFFSET
+        if request.get("cursor"):
+            try:
+                cursor_query_name, after_value, after_id = _decode_page_cursor(request["cursor"])
+            except ValueError:
+                cursor_query_name = None
+            if cursor_query_name != query_name:
+                response = {
+                    "status": "FAIL",
+                    "errorMessage": "Invalid cursor"
+                }
+                client.reply(request, response)
+                return
+        elif sort_by == "relevance":
+            after_value, after_id = queries.RELEVANCE_START
+        else:
+            after_value, after_id = queries.GAME_SORT_KEYS[sort_by][2]
+
+        # psycopg prepares a statement per parameter types, and sends a Python int as the
+        # smallest integer type that holds it. Numbers are pinned to one type each, so only
+        # the given/missing (NULL) filters make a search use another prepared statement.
+        queries.execute(cursor, query_name, {
+            "after_value": after_value,
+            "after_id": Int4(after_id),
+            "name_pattern": "%{}%".format(_escape_like(game_name.lower())) if game_name else None,
+            "name_query": game_name.lower() if game_name else None,
+            "genres": genres if genre_match == GENRE_MATCH_ANY else None,
+            "genres_all": genres if genre_match == GENRE_MATCH_ALL else None,
+            "price_low": Float8(price_low) if price_low is not None else None,
+            "price_upp": Float8(price_upp) if price_upp is not None else None,
+            "limit": Int4(page_size + 1)
+        })
         rows = cursor.fetchall()
 
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        # Genres come from the catalog instead of a second query
+        genres_by_game = {}
+        for row in rows:
+            game = catalog.get(row["game_id"])
+            genres_by_game[row["game_id"]] = list(game.genres) if game else []
+
         response = {
             "status": "OK",
-            "data": []
+            "data": [],
+            "nextCursor": _encode_page_cursor([query_name, str(rows[-1]["sort_value"]), rows[-1]["game_id"]]) if has_more else None
         }
-        gameid2idx = {}
         for row in rows:
-            idx = gameid2idx.get(row["game_id"])
-            if idx is None:
-                response["data"].append({
-                    "gameID": row["game_id"],
-                    "gameName": row["game_name"],
-                    "genres": [row["genre"]],
-                    "releaseDate": str(row["release_date"]) if row["release_date"] is not None else "",
-                    "totalAchievements": row["total_achievements"] if row["total_achievements"] is not None else "",
-                    "positiveRatings": row["positive_ratings"] if row["positive_ratings"] is not None else "",
-                    "negativeRatings": row["negative_ratings"] if row["negative_ratings"] is not None else ""
-                })
-                gameid2idx[row["game_id"]] = len(response["data"]) - 1
-            else:
-                response["data"][idx]["genres"].append(row["genre"])
+            response["data"].append({
+                "gameID": row["game_id"],
+                "gameName": row["game_name"],
+                "genres": genres_by_game[row["game_id"]],
+                "releaseDate": str(row["release_date"]) if row["release_date"] is not None else "",
+                "price": float(row["price"]) if row["price"] is not None else "",
+                "totalAchievements": row["total_achievements"] if row["total_achievements"] is not None else "",
+                "positiveRatings": row["positive_ratings"] if row["positive_ratings"] is not None else "",
+                "negativeRatings": row["negative_ratings"] if row["negative_ratings"] is not None else "",
+                "reviewCount": row["review_count"] or 0,
+                "averageRating": round(row["rating_sum"] / row["review_count"], 2) if row["review_count"] else ""
+            })
 
-        sendall(client_sock, response)
+        if request.get("facets"):
+            # The name filter is applied in PostgreSQL; every other facet filter in memory
+            queries.execute(cursor, "game.ids_by_name." + name_match, {
+                "name_pattern": "%{}%".format(_escape_like(game_name.lower())),
+                "name_query": game_name.lower()
+            })
+            name_ids = [row["game_id"] for row in cursor.fetchall()]
+            response["facets"] = search_engine.facets(genres, genre_match, price_low, price_upp, name_ids)
 
         pg_conn.commit()
+
+        client.reply(request, response)
     
     except Exception as e:
-        pg_conn.rollback()
+        if pg_conn:
+            pg_conn.rollback()
         print("[Error] {}".format(e))
         response = {
             "status": "FAIL",
             "errorMessage": "Unknown error"
         }
-        sendall(client_sock, response)
+        client.reply(request, response)
     
-def _user_add_reviews(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_sock: socket.socket):
+def _user_suggest_games(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
+    # Called on every keystroke, so it is answered from the suggest index alone
+    try:
+        limit = min(int(request.get("limit") or SUGGEST_SIZE), SUGGEST_MAXLEN)
+        games = suggest_index.suggest(request.get("prefix") or "", limit)
+
+        response = {
+            "status": "OK",
+            "suggestions": [{
+                "gameID": game.game_id,
+                "gameName": game.game_name,
+                "positiveRatings": game.positive_ratings if game.positive_ratings is not None else ""
+            } for game in games]
+        }
+        client.reply(request, response)
+
+    except Exception as e:
+        print("[Error] {}".format(e))
+        response = {
+            "status": "FAIL",
+            "errorMessage": "Unknown error"
+        }
+        client.reply(request, response)
+
+def _user_recommend_games(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
+    try:
+        user_id = request["userID"]
+        limit = min(int(request.get("limit") or PERSONAL_RECOMMEND_SIZE), PERSONAL_RECOMMEND_MAXLEN)
+
+        # Games similar to those the user rated well or favorited, from the neighbor lists
+        # written by precompute_neighbors.py
+        queries.execute(cursor, "neighbor.recommend", {"user_id": user_id, "limit": limit})
+        rows = cursor.fetchall()
+
+        recommendations = []
+        for row in rows:
+            game = catalog.get(row["game_id"])
+            if game:
+                recommendations.append((game, float(row["score"])))
+        source = "neighbors"
+
+        # New users, and games nobody shares with anyone yet, get the most popular games
+        if not recommendations:
+            games, _ = search_engine.search(sort_by = "positiveRatings", limit = limit)
+            recommendations = [(game, None) for game in games]
+            source = "popular"
+
+        response = {
+            "status": "OK",
+            "source": source,
+            "recommendations": [{
+                "gameID": game.game_id,
+                "gameName": game.game_name,
+                "positiveRatings": game.positive_ratings if game.positive_ratings is not None else "",
+                "score": round(score, 4) if score is not None else ""
+            } for game, score in recommendations]
+        }
+        pg_conn.commit()
+
+        client.reply(request, response)
+
+    except Exception as e:
+        pg_conn.rollback()
+        print("[Error] {}".format(e))
+        response = {
+            "status": "FAIL",
+            "errorMessage": "Unknown error"
+        }
+        client.reply(request, response)
+
+def _user_add_reviews(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
     try:
         user_id = request["userID"]
         game_id = request["gameID"]
         review_text = request["reviewText"]
         review_rating = request["reviewRating"]
 
-        query = """
-                SELECT COUNT(*)
-                FROM "review"
-                WHERE "user_id" = {} AND "game_id" = {};
-                """.format(user_id, game_id)
-        cursor.execute(query)
+        # The trigger on "review" adds to the game's row in "game_review_stats". Under
+        # READ COMMITTED concurrent reviews of one game wait for that row lock instead of
+        # failing to serialize.
+        _use_read_committed(pg_conn, cursor)
+
+        queries.execute(cursor, "review.count", {"user_id": user_id, "game_id": game_id})
         count = cursor.fetchone()["count"]
 
+        update_catalog = None
         if count == 1:
             response = {
                 "status": "FAIL",
@@ -244,45 +681,35 @@ def _user_add_reviews(pg_conn: psycopg.Connection, request: dict, cursor: Cursor
             }
         
         else:
-            current_time = str(datetime.datetime.now().replace(microsecond = 0))
-            query = """
-                    INSERT INTO "review" ("user_id", "game_id", "times", "texts", "rating")
-                    VALUES ({}, {}, '{}', '"{}"', {});
-                    """.format(user_id, game_id, current_time, review_text, review_rating)
-            cursor.execute(query)
+            current_time = datetime.datetime.now().replace(microsecond = 0)
+            # Review texts are stored wrapped in double quotes, like the imported reviews
+            queries.execute(cursor, "review.insert", {
+                "user_id": user_id,
+                "game_id": game_id,
+                "times": current_time,
+                "texts": "\"{}\"".format(review_text),
+                "rating": review_rating
+            })
+            update_catalog = _publish_review(cursor, game_id, review_rating)
 
             response = {
                 "status": "OK"            
             }
 
             if review_rating >= 4:
-                query = """
-                        SELECT "genre"
-                        FROM "game_genre"
-                        WHERE "game_id" = {};
-                        """.format(game_id)
-                cursor.execute(query)
-                genres = [row["genre"] for row in cursor.fetchall()]
-                if genres:
-                    query = """
-                            SELECT g."game_id", g."game_name", g."positive_ratings"
-                            FROM "game" g
-                            JOIN "game_genre" gg ON g."game_id" = gg."game_id"
-                            WHERE gg."genre" IN ('{}') AND g."game_id" != {}
-                            GROUP BY g."game_id"
-                            ORDER BY g."positive_ratings" DESC
-                            LIMIT 5;
-                            """.format("','".join(genres), game_id)
-                    cursor.execute(query)
-                    recommendations = cursor.fetchall()
+                game = catalog.get(game_id)
+                if game and game.genres:
+                    recommendations = genre_ranking.recommend(list(game.genres), exclude = game_id)
                     response["recommendations"] = [
-                        {"gameID": row["game_id"], "gameName": row["game_name"], "positiveRatings": row["positive_ratings"]}
-                        for row in recommendations
+                        {"gameID": rec.game_id, "gameName": rec.game_name, "positiveRatings": rec.positive_ratings}
+                        for rec in recommendations
                     ]
 
-        sendall(client_sock, response)
-        
         pg_conn.commit()
+        if update_catalog:
+            _after_commit(pg_conn, update_catalog)
+
+        client.reply(request, response)
 
     except Exception as e:
         pg_conn.rollback()
@@ -291,26 +718,29 @@ def _user_add_reviews(pg_conn: psycopg.Connection, request: dict, cursor: Cursor
             "status": "FAIL",
             "errorMessage": "Unknwon error"
         }
-        sendall(client_sock, response)
+        client.reply(request, response)
         
-def _user_delete_reviews(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_sock: socket.socket):
+def _user_delete_reviews(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
     try:
         user_id = request["userID"]
         game_id = request["gameID"]
 
-        query = """
-                DELETE FROM "review"
-                WHERE "user_id" = {} AND "game_id" = {};
-                """.format(user_id, game_id)
-        cursor.execute(query)
+        # READ COMMITTED for the same reason as adding a review
+        _use_read_committed(pg_conn, cursor)
+
+        queries.execute(cursor, "review.delete", {"user_id": user_id, "game_id": game_id})
+        row = cursor.fetchone()
+        update_catalog = _publish_review(cursor, game_id, row["rating"]) if row else None
 
         response = {
             "status": "OK"
         }
 
-        sendall(client_sock, response)
-
         pg_conn.commit()
+        if update_catalog:
+            _after_commit(pg_conn, update_catalog)
+
+        client.reply(request, response)
 
     except Exception as e:
         pg_conn.rollback()
@@ -319,27 +749,18 @@ def _user_delete_reviews(pg_conn: psycopg.Connection, request: dict, cursor: Cur
             "status": "FAIL",
             "errorMessage": "Unknown error"
         }
-        sendall(client_sock, response)
+        client.reply(request, response)
 
-def _user_add_to_favorites(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_sock: socket.socket):
+def _user_add_to_favorites(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
     try:
         user_id = request["userID"]
         game_id = request["gameID"]
 
-        query = """
-                SELECT COUNT(*)
-                FROM "add_to_favorite"
-                WHERE "user_id" = {} AND "game_id" = {};
-                """.format(user_id, game_id)
-        cursor.execute(query)
+        queries.execute(cursor, "favorite.count", {"user_id": user_id, "game_id": game_id})
         existed = cursor.fetchone()["count"]
 
         if not existed:
-            query = """
-                    INSERT INTO "add_to_favorite" ("user_id", "game_id")
-                    VALUES ({}, {});
-                    """.format(user_id, game_id)
-            cursor.execute(query)
+            queries.execute(cursor, "favorite.insert", {"user_id": user_id, "game_id": game_id})
 
             response = {
                 "status": "OK"
@@ -351,9 +772,9 @@ def _user_add_to_favorites(pg_conn: psycopg.Connection, request: dict, cursor: C
                 "errorMessage": "The game is in your favorites already"
             }
 
-        sendall(client_sock, response)
-
         pg_conn.commit()
+
+        client.reply(request, response)
          
     except Exception as e:
         pg_conn.rollback()
@@ -362,55 +783,65 @@ def _user_add_to_favorites(pg_conn: psycopg.Connection, request: dict, cursor: C
             "status": "FAIL",
             "errorMessage": "Unknown error"
         }
-        sendall(client_sock, response)
+        client.reply(request, response)
 
-def _user_create_room(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_sock: socket.socket):
+def _user_create_room(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
     try:
         user_id = request["userID"]
-        room_name = request["roomName"].replace("\'", "\'\'")
+        room_name = request["roomName"]
         game_id = request["gameID"]
         max_members = request["roomNumMembersLimit"] 
-        start_datetime = str(datetime.datetime.now().replace(microsecond=0))
-
-        query = """
-                INSERT INTO "room" ("creator_id", "room_name", "game_id", "start_time", "status", "max_players")
-                VALUES ({}, '{}', {}, '{}', '{}', {})
-                RETURNING "room_id";
-                """.format(user_id, room_name, game_id, start_datetime, "Active", max_members)
-        cursor.execute(query)
-        room_id = cursor.fetchone()["room_id"]
-
-        query = """
-                INSERT INTO "user_in_room" ("user_id", "room_id", "join_time")
-                VALUES ({}, {}, '{}');
-                """.format(user_id, room_id, start_datetime)
-        cursor.execute(query)
-
-        query = """
-                SELECT "game_name"
-                FROM "game"
-                WHERE "game_id" = {};
-                """.format(game_id)
-        cursor.execute(query)
-        game_name = cursor.fetchone()["game_name"]
-
-        if game_name:
-            response = {
-                "status": "OK",
-                "roomID": room_id,
-                "gameName": game_name
-            }
+        start_datetime = datetime.datetime.now().replace(microsecond=0)
 
-        else:
+        game = catalog.get(game_id)
+        if game is None:
+            # The connection goes back to the pool, so it must not stay in a transaction
+            pg_conn.rollback()
             response = {
                 "status": "FAIL",
                 "errorMessage": "Game not found."
             }
+            client.reply(request, response)
+            return
+        game_name = game.game_name
+
+        queries.execute(cursor, "room.insert", {
+            "creator_id": user_id,
+            "room_name": room_name,
+            "game_id": game_id,
+            "start_time": start_datetime,
+            "max_players": max_members
+        })
+        room_id = cursor.fetchone()["room_id"]
+
+        queries.execute(cursor, "user_in_room.insert", {"user_id": user_id, "room_id": room_id, "join_time": start_datetime})
+
+        queries.execute(cursor, "user.name", {"user_id": user_id})
+        host_name = cursor.fetchone()["user_name"]
 
-        sendall(client_sock, response)
+        response = {
+            "status": "OK",
+            "roomID": room_id,
+            "gameName": game_name
+        }
+
+        create_event = {
+            "kind": "room create",
+            "roomID": room_id,
+            "roomName": room_name,
+            "userID": user_id,
+            "userName": host_name,
+            "gameID": game_id,
+            "gameName": game_name,
+            "roomNumMembersLimit": max_members
+        }
+        broadcast_bus.publish(create_event, cursor)
 
         pg_conn.commit()
 
+        client.reply(request, response)
+        _apply_room_event(create_event)
+
     except Exception as e:
         pg_conn.rollback()
         print("[Error] {}".format(e))
@@ -418,22 +849,20 @@ def _user_create_room(pg_conn: psycopg.Connection, request: dict, cursor: Cursor
             "status": "FAIL",
             "errorMessage": "Unknown error"
         }
-        sendall(client_sock, response)
-
-def _user_join_room(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_sock: socket.socket):
-    join_room_lock.acquire()
+        client.reply(request, response)
 
+def _user_join_room(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
     try:
         user_id = request["userID"]
         room_id = request["roomID"]
-        join_time = str(datetime.datetime.now().replace(microsecond=0))
-
-        query = """
-                SELECT "status", "max_players"
-                FROM "room"
-                WHERE "room_id" = {};
-                """.format(room_id)
-        cursor.execute(query)
+        join_time = datetime.datetime.now().replace(microsecond=0)
+
+        # Admission is decided while holding the room's row lock, so joins into different rooms
+        # run in parallel and joins into the same room are serialized even across server processes.
+        # Under READ COMMITTED the member count sees every join committed while we waited for the lock.
+        queries.execute(cursor, "txn.read_committed")
+
+        queries.execute(cursor, "room.lock", {"room_id": room_id})
         row = cursor.fetchone()
 
         room_found = row and row["status"] == "Active"
@@ -442,81 +871,40 @@ def _user_join_room(pg_conn: psycopg.Connection, request: dict, cursor: Cursor,
                 "status": "FAIL",
                 "errorMessage": "Room not found"
             }
-            sendall(client_sock, response)
         
         else:
-            room_found = True
             max_members = row["max_players"]
             
-            query = """
-                    SELECT COUNT(*)
-                    FROM "user_in_room"
-                    WHERE "room_id" = {} AND "leave_time" IS NULL;
-                    """.format(room_id)
-            cursor.execute(query)
+            queries.execute(cursor, "user_in_room.count_active", {"room_id": room_id})
             n_members = cursor.fetchone()["count"]
 
             if n_members < max_members:
-                query = """
-                        SELECT "user_id", "room_id"
-                        FROM "user_in_room"
-                        WHERE "user_id" = {} AND "room_id" = {};
-                        """.format(user_id, room_id)
-                cursor.execute(query)
+                membership = {"user_id": user_id, "room_id": room_id, "join_time": join_time}
+                queries.execute(cursor, "user_in_room.membership", membership)
                 row = cursor.fetchone()
+                if not row or row["leave_time"] is not None:
+                    n_members += 1
 
                 if not row:
-                    query = """
-                            INSERT INTO "user_in_room" ("user_id", "room_id", "join_time")
-                            VALUES ({}, {}, '{}');
-                            """.format(user_id, room_id, join_time)
+                    queries.execute(cursor, "user_in_room.insert", membership)
                 else:
-                    query = """
-                            UPDATE "user_in_room"
-                            SET "join_time" = '{}', "leave_time" = NULL
-                            WHERE "user_id" = {} AND "room_id" = {};
-                            """.format(join_time, user_id, room_id)
-                cursor.execute(query)
-
-                query = """
-                        SELECT "r"."room_name", "r"."max_players", "u"."user_name", "g"."game_name"
-                        FROM "room" AS "r"
-                            JOIN "user" AS "u" ON "u"."user_id" = "r"."creator_id"
-                            JOIN "game" AS "g" ON "g"."game_id" = "r"."game_id"
-                        WHERE "room_id" = {};
-                        """.format(room_id)
-                cursor.execute(query)
+                    queries.execute(cursor, "user_in_room.rejoin", membership)
+
+                queries.execute(cursor, "room.details", {"room_id": room_id})
                 row =  cursor.fetchone()
-                room_name = row["room_name"]
-                max_members = row["max_players"]
-                room_host = row["user_name"]
-                game_name = row["game_name"]
-
-                query = """
-                        SELECT "user_id", "leave_time"
-                        FROM "user_in_room"
-                        WHERE "room_id" = {} AND "leave_time" IS NULL;
-                        """.format(room_id)
-                cursor.execute(query)
-                users_in_room = cursor.fetchall()
+
+                queries.execute(cursor, "user.name", {"user_id": user_id})
+                user_name = cursor.fetchone()["user_name"]
 
                 response = {
                     "status": "OK",
-                    "roomName": room_name,
-                    "roomHost": room_host,
-                    "roomNumMembers": len(users_in_room),
-                    "roomNumMembersLimit": max_members,
-                    "gameName": game_name
+                    "roomName": row["room_name"],
+                    "roomHost": row["user_name"],
+                    "roomNumMembers": n_members,
+                    "roomNumMembersLimit": row["max_players"],
+                    "gameName": row["game_name"]
                 }
 
-                query = """
-                        SELECT "user_name"
-                        FROM "user"
-                        WHERE "user_id" = {};
-                        """.format(user_id)
-                cursor.execute(query)
-                user_name = cursor.fetchone()["user_name"]
-
                 response_broadcast = {
                     "status": "OK",
                     "messageType": "room control",
@@ -525,21 +913,32 @@ def _user_join_room(pg_conn: psycopg.Connection, request: dict, cursor: Cursor,
                     "userName": user_name
                 }
 
-                sendall(client_sock, response)
-                if room_found:
-                    for user in users_in_room:
-                        if user["user_id"] != user_id:
-                            sendall(client_id2sock[user["user_id"]], response_broadcast)
+                # NOTIFY is delivered at commit, so other nodes only hear about admitted joins
+                join_event = {
+                    "kind": "room join",
+                    "roomID": room_id,
+                    "userID": user_id,
+                    "userName": user_name,
+                    "message": response_broadcast
+                }
+                broadcast_bus.publish(join_event, cursor)
             
             else:
                 response = {
                     "status": "FAIL",
                     "errorMessage": "The room is full now"
                 }
-                sendall(client_sock, response)       
         
+        # Committing releases the room lock; nothing below runs inside the critical section
         pg_conn.commit()
 
+        client.reply(request, response)
+        if response["status"] == "OK":
+            if not room_registry.get(room_id):
+                room_registry.load(cursor, room_id)
+                pg_conn.commit()
+            _apply_room_event(join_event)
+
     except Exception as e:
         pg_conn.rollback()
         print("[Error] {}".format(e))
@@ -547,20 +946,13 @@ def _user_join_room(pg_conn: psycopg.Connection, request: dict, cursor: Cursor,
             "status": "FAIL",
             "errorMessage": "Unknown error"
         }
-        sendall(client_sock, response)
-    
-    join_room_lock.release()
+        client.reply(request, response)
 
-def _user_check_user(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_sock: socket.socket):
+def _user_check_user(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
     try:
         user_id = request["userID"]
 
-        query = """
-                SELECT "user_id", "user_name", "join_date"
-                FROM "user"
-                WHERE "user_id" = {};
-                """.format(user_id)
-        cursor.execute(query)
+        queries.execute(cursor, "user.info", {"user_id": user_id})
         row = cursor.fetchone()
         
         if row:
@@ -576,13 +968,7 @@ def _user_check_user(pg_conn: psycopg.Connection, request: dict, cursor: Cursor,
                 }
             }
 
-            query = """
-                    SELECT "g"."game_id", "g"."game_name"
-                    FROM "add_to_favorite" AS "f"
-                        JOIN "game" AS "g" ON "f"."game_id" = "g"."game_id"
-                    WHERE "f"."user_id" = {};
-                    """.format(user_id)
-            cursor.execute(query)
+            queries.execute(cursor, "favorite.games_by_user", {"user_id": user_id})
             rows = cursor.fetchall()
 
             for row in rows:
@@ -597,10 +983,10 @@ def _user_check_user(pg_conn: psycopg.Connection, request: dict, cursor: Cursor,
                 "errorMessage": "User not found"
             }
 
-        sendall(client_sock, response)
-
         pg_conn.commit()
 
+        client.reply(request, response)
+
     except Exception as e:
         pg_conn.rollback()
         print("[Error] {}".format(e))
@@ -608,44 +994,31 @@ def _user_check_user(pg_conn: psycopg.Connection, request: dict, cursor: Cursor,
             "status": "FAIL",
             "errorMessage": "Unknwon error"
         }
-        sendall(client_sock, response)
+        client.reply(request, response)
 
-def _user_update_profile(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_sock: socket.socket):
+def _user_update_profile(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
     user_id = request["userID"]
     new_name = request["updated"].get("name")
     new_email = request["updated"].get("email")
     new_password = request["updated"].get("password")
 
-    query = """
-            UPDATE "user"
-            SET {{}}
-            WHERE "user_id" = {0}
-            """.format(user_id)
-    updates = []
-    if new_name:
-        updates.append("\"user_name\" = \'{}\'".format(new_name))
-    if new_email:
-        updates.append("\"email\" = \'{}\'".format(new_email))
-    if new_password:
-        updates.append("\"password\" = \'{}\'".format(new_password))
-    
-    if len(updates) == 0:
+    if not (new_name or new_email or new_password):
         response = {
             "status": "FAIL",
             "errorMessage": "Nothing to do"
         }
-        sendall(client_sock, response)
+        client.reply(request, response)
     
     else:
         try:
-            query = query.format(", ".join(updates))
-            cursor.execute(query)
-            query = """
-                    SELECT "user_name", "email"
-                    FROM "user"
-                    WHERE "user_id" = {};
-                    """.format(user_id)
-            cursor.execute(query)
+            # Fields left out are passed as NULL and keep their current value
+            queries.execute(cursor, "user.update_profile", {
+                "user_id": user_id,
+                "user_name": new_name or None,
+                "email": new_email or None,
+                "password": new_password or None
+            })
+            queries.execute(cursor, "user.profile", {"user_id": user_id})
             row = cursor.fetchone()
             name = row["user_name"]
             email = row["email"]
@@ -658,9 +1031,9 @@ def _user_update_profile(pg_conn: psycopg.Connection, request: dict, cursor: Cur
                 }
             }
 
-            sendall(client_sock, response)
-
             pg_conn.commit()
+
+            client.reply(request, response)
             
         except Exception as e:
             pg_conn.rollback()
@@ -669,92 +1042,136 @@ def _user_update_profile(pg_conn: psycopg.Connection, request: dict, cursor: Cur
                 "status": "FAIL",
                 "errorMessage": "Unknown error"
             }
-            sendall(client_sock, response)
+            client.reply(request, response)
 
-def _user_list_rooms(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_sock: socket.socket):
+def _user_list_rooms(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
+    # Served from the room registry, whose member counts are live on every node
     try:
         game_id = request.get("gameID")
+        genres = set(request["genres"]) if request.get("genres") else None
+        sort_by = request.get("sortBy") or "roomID"
+
+        if sort_by not in ROOM_SORT_KEYS:
+            response = {
+                "status": "FAIL",
+                "errorMessage": "Rooms can be sorted by {}".format(", ".join(ROOM_SORT_KEYS))
+            }
+            client.reply(request, response)
+            return
 
-        query = """
-                SELECT "r"."room_id", "r"."room_name", "g"."game_name", "r"."creator_id", "u"."user_name", "r"."max_players"
-                FROM "room" AS "r" 
-                    JOIN "user" AS "u" ON "r"."creator_id" = "u"."user_id"
-	                JOIN "game" AS "g" ON "r"."game_id" = "g"."game_id"
-                WHERE "r"."status" = 'Active' """
-        if game_id:
-            query += """ AND "r"."game_id" = {}""".format(game_id)
-        cursor.execute(query)
-        rooms = cursor.fetchall()
-
-        for room in rooms:
-            query = """
-                    SELECT COUNT(*)
-                    FROM "user_in_room"
-                    WHERE "room_id" = {} AND "leave_time" IS NULL;
-                    """.format(room["room_id"])
-            cursor.execute(query)
-            room["roomNumMembers"] = cursor.fetchone()["count"]
+        rooms = room_registry.list({game_id} if game_id else None, bool(request.get("hideFull")))
+        if genres:
+            # Genres of the rooms' games come from the catalog
+            genre_rooms = []
+            for room, n_members in rooms:
+                game = catalog.get(room.game_id)
+                if game and genres.intersection(game.genres):
+                    genre_rooms.append((room, n_members))
+            rooms = genre_rooms
+        rooms.sort(key = ROOM_SORT_KEYS[sort_by])
 
         response = {
             "status": "OK",
             "rooms": []
         }
-        for room in rooms:
+        for room, n_members in rooms:
             response["rooms"].append({
-                "roomID": room["room_id"],
-                "roomName": room["room_name"],
-                "playGame": room["game_name"],
-                "hostID": room["creator_id"],
-                "hostName": room["user_name"],
-                "roomNumMembers": room["roomNumMembers"],
-                "roomNumMembersLimit": room["max_players"]
+                "roomID": room.room_id,
+                "roomName": room.room_name,
+                "playGame": room.game_name,
+                "hostID": room.host_id,
+                "hostName": room.host_name,
+                "roomNumMembers": n_members,
+                "roomNumMembersLimit": room.capacity
             })
 
-        sendall(client_sock, response)
+        client.reply(request, response)
 
-        pg_conn.commit()
-    
     except Exception as e:
-        pg_conn.rollback()
         print("[Error] {}".format(e))
         response = {
             "status": "FAIL",
             "errorMessage": "Unknwon error"
         }
-        sendall(client_sock, response)
-
-def _user_check_reviews(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_sock: socket.socket):
+        client.reply(request, response)
+
+def _review_summary(cursor: Cursor, game_id: int) -> dict:
+    # One row of "game_review_stats" instead of aggregating the game's reviews
+    queries.execute(cursor, "review_stats.by_game", {"game_id": game_id})
+    row = cursor.fetchone()
+    n_reviews = row["review_count"] if row else 0
+    return {
+        "count": n_reviews,
+        "average": round(row["rating_sum"] / n_reviews, 2) if n_reviews else None,
+        "histogram": {str(rating): row["rating_{}".format(rating)] if row else 0 for rating in range(1, 6)}
+    }
+
+def _user_check_reviews(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
     try:
         user_id = request.get("userID")
         game_id = request["gameID"]
         rating = request.get("rating")
+        sort_by = request.get("sortBy") or "newest"
+        page_size = _page_size(request)
 
-        query = """
-                SELECT "user_id", "texts", "rating"
-                FROM "review"
-                WHERE "game_id" = {}""".format(game_id)
-        if user_id:
-            query += """ AND "user_id" = {}""".format(user_id)
-        if rating:
-            query += """ AND "rating" = {}""".format(rating)
-        cursor.execute(query)
+        if sort_by not in queries.REVIEW_SORT_KEYS:
+            response = {
+                "status": "FAIL",
+                "errorMessage": "Reviews can be sorted by {}".format(", ".join(queries.REVIEW_SORT_KEYS))
+            }
+            client.reply(request, response)
+            return
+
+        query_name = queries.review_page_query(sort_by)
+        if request.get("cursor"):
+            try:
+                cursor_query_name, after_value, after_id = _decode_page_cursor(request["cursor"])
+            except ValueError:
+                cursor_query_name = None
+            if cursor_query_name != query_name:
+                response = {
+                    "status": "FAIL",
+                    "errorMessage": "Invalid cursor"
+                }
+                client.reply(request, response)
+                return
+        else:
+            after_value, after_id = queries.REVIEW_SORT_KEYS[sort_by][2]
+
+        queries.execute(cursor, query_name, {
+            "game_id": game_id,
+            "after_value": after_value,
+            "after_id": after_id,
+            "user_id": user_id or None,
+            "rating": rating or None,
+            "limit": page_size + 1
+        })
         rows = cursor.fetchall()
 
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
         response = {
             "status": "OK",
-            "reviews": []
+            "reviews": [],
+            "nextCursor": _encode_page_cursor([query_name, str(rows[-1]["sort_value"]), rows[-1]["user_id"]]) if has_more else None
         }
         for row in rows:
             response["reviews"].append({
                 "userID": row["user_id"],
+                "reviewTime": str(row["times"]) if row["times"] is not None else "",
                 "reviewText": row["texts"],
                 "reviewRating": row["rating"]
             })
 
-        sendall(client_sock, response)
+        # The summary describes every review of the game, so it comes with the first page only
+        if not request.get("cursor"):
+            response["summary"] = _review_summary(cursor, game_id)
 
         pg_conn.commit()
 
+        client.reply(request, response)
+
     except Exception as e:
         pg_conn.rollback()
         print("[Error] {}".format(e))
@@ -762,23 +1179,104 @@ def _user_check_reviews(pg_conn: psycopg.Connection, request: dict, cursor: Curs
             "status": "FAIL",
             "errorMessage": "Unknown error"
         }
-        sendall(client_sock, response)
+        client.reply(request, response)
     
-def _user_room_communication(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_sock: socket.socket):
+def _user_search_reviews(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
+    try:
+        query = (request.get("query") or "").strip()
+        game_id = request.get("gameID")
+        rating = request.get("rating")
+        page_size = _page_size(request)
+
+        if not query:
+            response = {
+                "status": "FAIL",
+                "errorMessage": "Please give the words to search for"
+            }
+            client.reply(request, response)
+            return
+
+        # A cursor is the search it belongs to followed by the (rank, game ID, user ID) of
+        # the last review on the previous page. Reused with other filters, it would skip
+        # or repeat reviews.
+        search = [query, game_id or None, rating or None]
+        if request.get("cursor"):
+            try:
+                position = _decode_page_cursor(request["cursor"])
+                cursor_search, (after_rank, after_game_id, after_user_id) = position[:3], position[3:]
+            except ValueError:
+                cursor_search = None
+            if cursor_search != search:
+                response = {
+                    "status": "FAIL",
+                    "errorMessage": "Invalid cursor"
+                }
+                client.reply(request, response)
+                return
+        else:
+            after_rank, after_game_id, after_user_id = queries.REVIEW_SEARCH_START
+
+        queries.execute(cursor, "review.search", {
+            "query": query,
+            "game_id": search[1],
+            "rating": search[2],
+            "after_rank": after_rank,
+            "after_game_id": after_game_id,
+            "after_user_id": after_user_id,
+            "limit": page_size + 1
+        })
+        rows = cursor.fetchall()
+
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        response = {
+            "status": "OK",
+            "reviews": [],
+            "nextCursor": _encode_page_cursor(search + [rows[-1]["rank"], rows[-1]["game_id"], rows[-1]["user_id"]]) if has_more else None
+        }
+        for row in rows:
+            game = catalog.get(row["game_id"])
+            response["reviews"].append({
+                "gameID": row["game_id"],
+                "gameName": game.game_name if game else "",
+                "userID": row["user_id"],
+                "reviewTime": str(row["times"]) if row["times"] is not None else "",
+                "reviewRating": row["rating"],
+                "snippet": row["snippet"],
+                "rank": round(row["rank"], 4)
+            })
+
+        pg_conn.commit()
+
+        client.reply(request, response)
+
+    except Exception as e:
+        pg_conn.rollback()
+        print("[Error] {}".format(e))
+        response = {
+            "status": "FAIL",
+            "errorMessage": "Unknown error"
+        }
+        client.reply(request, response)
+
+def _user_room_communication(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
+    # Served from the room registry only; pg_conn and cursor are None here
     try:
         room_id = request["roomID"]
         sender_id = request["fromUserID"]
         timestamp = request["timestamp"]
         content = request["content"]
 
-        query = """
-                SELECT "user_name"
-                FROM "user"
-                WHERE "user_id" = {};
-                """.format(sender_id)
-        cursor.execute(query)
-        sender_name = cursor.fetchone()["user_name"]
-        
+        sender_name = room_registry.member_name(room_id, sender_id)
+        if sender_name is None:
+            response = {
+                "status": "FAIL",
+                "errorMessage": "You are not in the room"
+            }
+            client.reply(request, response)
+            return
+
         response_sender = {
             "status": "OK"
         }
@@ -792,61 +1290,59 @@ def _user_room_communication(pg_conn: psycopg.Connection, request: dict, cursor:
             "content": content
         }
 
-        query = """
-                SELECT "user_id", "leave_time"
-                FROM "user_in_room"
-                WHERE "room_id" = {};
-                """.format(room_id)
-        cursor.execute(query)
-        users_in_room = cursor.fetchall()
-
-        sendall(client_sock, response_sender)
-        for user in users_in_room:
-            if user["user_id"] != sender_id and not user["leave_time"]:
-                sendall(client_id2sock[user["user_id"]], response_broadcast)
+        # The message has to fit in one bus event, whether or not the room has members on
+        # other nodes right now
+        if len(json.dumps(content)) > ROOM_MESSAGE_MAXLEN:
+            response = {
+                "status": "FAIL",
+                "errorMessage": "Message is too long"
+            }
+            client.reply(request, response)
+            return
+
+        # Members connected to other nodes are reached through the bus. When the whole
+        # room is connected here, no NOTIFY is sent at all. The sender is only told OK
+        # once the message is on its way to everyone.
+        recipients = [user_id for user_id in room_registry.members(room_id) if user_id != sender_id]
+        remote_recipients = [user_id for user_id in recipients if user_id not in client_id2session]
+        if remote_recipients:
+            broadcast_bus.publish({
+                "kind": "push",
+                "userIDs": remote_recipients,
+                "message": response_broadcast
+            })
 
-        pg_conn.commit()
+        client.reply(request, response_sender)
+        _push_to_users(recipients, response_broadcast)
 
     except Exception as e:
-        pg_conn.rollback()
         print("[Error] {}".format(e))
         response = {
             "status": "FAIL",
             "errorMessage": "Unknown error"
         }
-        sendall(client_sock, response)
+        client.reply(request, response)
 
-def _user_leave_room(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_sock: socket.socket):
+def _user_leave_room(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
     try:
         user_id = request["userID"]
         room_id = request["roomID"]
-        leave_time = str(datetime.datetime.now().replace(microsecond=0))
-
-        query = """
-                SELECT "creator_id"
-                FROM "room"
-                WHERE "room_id" = {}
-                """.format(room_id)
-        cursor.execute(query)
+        leave_time = datetime.datetime.now().replace(microsecond=0)
+
+        # Same room lock as joins, so a join racing with the host closing the room is either
+        # seen by the close or rejected because the room is no longer active
+        queries.execute(cursor, "txn.read_committed")
+
+        queries.execute(cursor, "room.lock", {"room_id": room_id})
         room_host_id = cursor.fetchone()["creator_id"]
 
-        query = """
-                UPDATE "user_in_room"
-                SET "leave_time" = '{}'
-                WHERE "user_id" = {} AND "room_id" = {};
-                """.format(leave_time, user_id, room_id)
-        cursor.execute(query)
+        queries.execute(cursor, "user_in_room.leave", {"user_id": user_id, "room_id": room_id, "leave_time": leave_time})
 
         response = {
             "status": "OK"
         }
 
-        query = """
-                SELECT "user_name"
-                FROM "user"
-                WHERE "user_id" = {};
-                """.format(user_id)
-        cursor.execute(query)
+        queries.execute(cursor, "user.name", {"user_id": user_id})
         user_name = cursor.fetchone()["user_name"]
 
         response_broadcast_leave = {
@@ -857,47 +1353,38 @@ def _user_leave_room(pg_conn: psycopg.Connection, request: dict, cursor: Cursor,
             "userName": user_name
         }
 
-        query = """
-                SELECT "user_id", "leave_time"
-                FROM "user_in_room"
-                WHERE "room_id" = {} AND "leave_time" IS NULL;
-                """.format(room_id)
-        cursor.execute(query)
-        users_in_room = cursor.fetchall()
-        
-        if room_host_id == user_id:
-            response_broadcast_close = {
-                "status": "OK",
-                "messageType": "room control",
-                "event": "close"
-            }
+        response_broadcast_close = {
+            "status": "OK",
+            "messageType": "room control",
+            "event": "close"
+        }
 
-            for user in users_in_room:
-                query = """
-                UPDATE "user_in_room"
-                SET "leave_time" = '{}'
-                WHERE "user_id" = {} AND "room_id" = {};
-                """.format(leave_time, user["user_id"], room_id)
-                cursor.execute(query)
+        if room_host_id == user_id:
+            queries.execute(cursor, "user_in_room.leave_all", {"room_id": room_id, "leave_time": leave_time})
             
-            end_time = str(datetime.datetime.now().replace(microsecond=0))
-            query = """
-                    UPDATE "room"
-                    SET "end_time" = '{}', "status" = 'Closed'
-                    WHERE "room_id" = {};
-                    """.format(end_time, room_id)
-            cursor.execute(query)
-
-        sendall(client_sock, response)
-        for user in users_in_room:
-            if user["user_id"] != user_id:
-                if room_host_id == user_id:
-                    sendall(client_id2sock[user["user_id"]], response_broadcast_close)
-                else:
-                    sendall(client_id2sock[user["user_id"]], response_broadcast_leave)
+            end_time = datetime.datetime.now().replace(microsecond=0)
+            queries.execute(cursor, "room.close", {"room_id": room_id, "end_time": end_time})
+
+            room_event = {
+                "kind": "room close",
+                "roomID": room_id,
+                "userID": user_id,
+                "message": response_broadcast_close
+            }
+        else:
+            room_event = {
+                "kind": "room leave",
+                "roomID": room_id,
+                "userID": user_id,
+                "message": response_broadcast_leave
+            }
+        broadcast_bus.publish(room_event, cursor)
 
         pg_conn.commit()
 
+        client.reply(request, response)
+        _apply_room_event(room_event)
+
     except Exception as e:
         pg_conn.rollback()
         print("[Error] {}".format(e))
@@ -905,11 +1392,11 @@ def _user_leave_room(pg_conn: psycopg.Connection, request: dict, cursor: Cursor,
             "status": "FAIL",
             "errorMessage": "Unknown error"
         }
-        sendall(client_sock, response)
+        client.reply(request, response)
 
-def _admin_add_game(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_sock: socket.socket):
+def _admin_add_game(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
     try:
-        game_name = request["gameName"].replace("\'", "\'\'")
+        game_name = request["gameName"]
         genres = request.get("genres")
         release_date = request["releaseDate"]
         price = request.get("price")
@@ -917,54 +1404,32 @@ def _admin_add_game(pg_conn: psycopg.Connection, request: dict, cursor: Cursor,
         positive_ratings = request.get("positiveRatings")
         negative_ratings = request.get("negativeRatings")
 
-        query = """
-                INSERT INTO "game" ({})
-                VALUES ({})
-                RETURNING "game_id";
-                """
-        columns = ["\"game_name\"", "\"release_date\""]
-        values = ["\'{}\'".format(game_name), "\'{}\'".format(release_date)]
-        if price:
-            columns.append("\"price\"")
-            values.append(str(price))
-        if total_achievements:
-            columns.append("\"total_achievements\"")
-            values.append(str(total_achievements))
-        if positive_ratings:
-            columns.append("\"positive_ratings\"")
-            values.append(str(positive_ratings))
-        if negative_ratings:
-            columns.append("\"negative_ratings\"")
-            values.append(str(negative_ratings))
-        query = query.format(", ".join(columns), ", ".join(values))
-        cursor.execute(query)
+        queries.execute(cursor, "game.insert", {"game_name": game_name, "release_date": release_date})
         game_id = cursor.fetchone()["game_id"]
 
-        if genres:
-            query = """
-                    INSERT INTO "game_genre" ("game_id", "genre")
-                    VALUES """
-            values = []
-            for genre in genres:
-                values.append("({}, \'{}\')".format(game_id, genre))
-            query += ", ".join(values) + ";"
-            cursor.execute(query)
-        
-        else:
-            query = """
-                    INSERT INTO "game_genre" ("game_id", "genre")
-                    VALUES ({}, 'Unknown')
-                    """.format(game_id)
-            cursor.execute(query)
+        # Optional attributes go through the update statement, so columns that are
+        # not given keep their table defaults
+        if price or total_achievements or positive_ratings or negative_ratings:
+            queries.execute(cursor, "game.update", {
+                "game_id": game_id,
+                "price": price or None,
+                "total_achievements": total_achievements or None,
+                "positive_ratings": positive_ratings or None,
+                "negative_ratings": negative_ratings or None
+            })
+
+        queries.execute(cursor, "game_genre.insert", {"game_id": game_id, "genres": genres or ["Unknown"]})
 
         response = {
             "status": "OK",
             "gameID": game_id
         }
 
-        sendall(client_sock, response)
-
+        update_catalog = _write_through_games(cursor, [game_id])
         pg_conn.commit()
+        _after_commit(pg_conn, update_catalog)
+
+        client.reply(request, response)
     
     except Exception as e:
         pg_conn.rollback()
@@ -973,9 +1438,9 @@ def _admin_add_game(pg_conn: psycopg.Connection, request: dict, cursor: Cursor,
             "status": "FAIL",
             "errorMessage": "Unknown error"
         }
-        sendall(client_sock, response)
+        client.reply(request, response)
 
-def _admin_update_game(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_sock: socket.socket):
+def _admin_update_game(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
     try:
         game_id = request["gameID"]
         genres = request.get("genres")
@@ -984,62 +1449,39 @@ def _admin_update_game(pg_conn: psycopg.Connection, request: dict, cursor: Curso
         positive_ratings = request.get("positiveRatings")
         negative_ratings = request.get("negativeRatings")
 
-        query = """
-                SELECT COUNT(*)
-                FROM "game"
-                WHERE "game_id" = {};
-                """.format(game_id)
-        cursor.execute(query)
+        queries.execute(cursor, "game.exists", {"game_id": game_id})
         game_found = cursor.fetchone()["count"]
 
         if game_found:
-            query = """
-                    UPDATE "game"
-                    SET {{}}
-                    WHERE "game_id" = {};
-                    """.format(game_id)
-            updates = []
-            if price:
-                updates.append("\"price\" = {}".format(price))
-            if total_achievements:
-                updates.append("\"total_achievements\" = {}".format(total_achievements))
-            if positive_ratings:
-                updates.append("\"positive_ratings\" = {}".format(positive_ratings))
-            if negative_ratings:
-                updates.append("\"negative_ratings\" = {}".format(negative_ratings))
-            if updates:
-                query = query.format(", ".join(updates))
-                cursor.execute(query)
+            if price or total_achievements or positive_ratings or negative_ratings:
+                queries.execute(cursor, "game.update", {
+                    "game_id": game_id,
+                    "price": price or None,
+                    "total_achievements": total_achievements or None,
+                    "positive_ratings": positive_ratings or None,
+                    "negative_ratings": negative_ratings or None
+                })
 
             if genres:
-                query = """
-                        DELETE FROM "game_genre"
-                        WHERE "game_id" = {};
-                        """.format(game_id)
-                cursor.execute(query)
-
-                query = """
-                        INSERT INTO "game_genre" ("game_id", "genre")
-                        VALUES """
-                values = []
-                for genre in genres:
-                    values.append("({}, \'{}\')".format(game_id, genre))
-                query += ", ".join(values) + ";"
-                cursor.execute(query)
+                queries.execute(cursor, "game_genre.delete", {"game_id": game_id})
+                queries.execute(cursor, "game_genre.insert", {"game_id": game_id, "genres": genres})
 
             response = {
                 "status": "OK"
             }
 
+            update_catalog = _write_through_games(cursor, [game_id])
+            pg_conn.commit()
+            _after_commit(pg_conn, update_catalog)
+
         else:
             response = {
                 "status": "FAIL",
                 "errorMessage": "Game not found"
             }
+            pg_conn.commit()
 
-        sendall(client_sock, response)
-
-        pg_conn.commit()
+        client.reply(request, response)
     
     except Exception as e:
         pg_conn.rollback()
@@ -1048,25 +1490,23 @@ def _admin_update_game(pg_conn: psycopg.Connection, request: dict, cursor: Curso
             "status": "FAIL",
             "errorMessage": "Unknown error"
         }
-        sendall(client_sock, response)
+        client.reply(request, response)
 
-def _admin_delete_game(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_sock: socket.socket):
+def _admin_delete_game(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
     try:
         game_id = request["gameID"]
 
-        query = """
-                DELETE FROM "game"
-                WHERE "game_id" = {};
-                """.format(game_id)
-        cursor.execute(query)
+        queries.execute(cursor, "game.delete", {"game_id": game_id})
 
         response = {
             "status": "OK"
         }
 
-        sendall(client_sock, response)
-
+        update_catalog = _write_through_games(cursor, [game_id])
         pg_conn.commit()
+        _after_commit(pg_conn, update_catalog)
+
+        client.reply(request, response)
 
     except Exception as e:
         pg_conn.rollback()
@@ -1075,88 +1515,511 @@ def _admin_delete_game(pg_conn: psycopg.Connection, request: dict, cursor: Curso
             "status": "FAIL",
             "errorMessage": "Unknown error"
         }
-        sendall(client_sock, response)
+        client.reply(request, response)
+
+def _bulk_game_item(item: dict, adding: bool) -> dict:
+    # Checks one game of a bulk request before it reaches PostgreSQL, where a single bad
+    # value would fail its whole chunk. Raises ValueError with the reason.
+    if type(item) != dict:
+        raise ValueError("A game is given as an object")
+
+    fields = {}
+    if adding:
+        if not isinstance(item.get("gameName"), str) or not item["gameName"].strip():
+            raise ValueError("Game name is missing")
+        fields["game_name"] = item["gameName"]
+        try:
+            fields["release_date"] = datetime.date.fromisoformat(str(item["releaseDate"]))
+        except (KeyError, ValueError):
+            raise ValueError("Release date is missing or not in YYYY-MM-DD form")
+    else:
+        if type(item.get("gameID")) != int:
+            raise ValueError("Game ID is missing")
+        fields["game_id"] = item["gameID"]
+
+    # Like "add game" and "update game", missing or zero values leave the column as it is
+    try:
+        fields["price"] = float(item["price"]) if item.get("price") else None
+        fields["total_achievements"] = int(item["totalAchievements"]) if item.get("totalAchievements") else None
+        fields["positive_ratings"] = int(item["positiveRatings"]) if item.get("positiveRatings") else None
+        fields["negative_ratings"] = int(item["negativeRatings"]) if item.get("negativeRatings") else None
+    except (TypeError, ValueError):
+        raise ValueError("Price and counts must be numbers")
+
+    genres = item.get("genres")
+    if genres and (type(genres) != list or not all(isinstance(genre, str) for genre in genres)):
+        raise ValueError("Genres are given as a list of names")
+    fields["genres"] = sorted(set(genres)) if genres else None
+    return fields
+
+def _bulk_update_params(game_ids: list[int], items: list[dict]) -> dict:
+    return {
+        "game_ids": game_ids,
+        "prices": [fields["price"] for fields in items],
+        "total_achievements": [fields["total_achievements"] for fields in items],
+        "positive_ratings": [fields["positive_ratings"] for fields in items],
+        "negative_ratings": [fields["negative_ratings"] for fields in items]
+    }
+
+def _bulk_add_chunk(cursor: Cursor, items: list[dict]) -> list[dict]:
+    queries.execute(cursor, "game.preallocate_ids", {"n": len(items)})
+    game_ids = [row["game_id"] for row in cursor.fetchall()]
+
+    queries.execute(cursor, "game.bulk_insert", {
+        "game_ids": game_ids,
+        "game_names": [fields["game_name"] for fields in items],
+        "release_dates": [fields["release_date"] for fields in items]
+    })
+    optional = ("price", "total_achievements", "positive_ratings", "negative_ratings")
+    if any(fields[name] is not None for fields in items for name in optional):
+        queries.execute(cursor, "game.bulk_update", _bulk_update_params(game_ids, items))
+
+    genre_game_ids = []
+    genres = []
+    for game_id, fields in zip(game_ids, items):
+        for genre in fields["genres"] or ["Unknown"]:
+            genre_game_ids.append(game_id)
+            genres.append(genre)
+    queries.execute(cursor, "game_genre.bulk_insert", {"game_ids": genre_game_ids, "genres": genres})
+
+    return [{"status": "OK", "gameID": game_id} for game_id in game_ids]
+
+def _bulk_update_chunk(cursor: Cursor, items: list[dict]) -> list[dict]:
+    game_ids = [fields["game_id"] for fields in items]
+    # Returns the games that exist, which are the ones updated
+    queries.execute(cursor, "game.bulk_update", _bulk_update_params(game_ids, items))
+    found = {row["game_id"] for row in cursor.fetchall()}
+
+    # Given genres replace all the old ones
+    regenred = [fields for fields in items if fields["genres"] and fields["game_id"] in found]
+    if regenred:
+        queries.execute(cursor, "game_genre.bulk_delete", {"game_ids": [fields["game_id"] for fields in regenred]})
+        queries.execute(cursor, "game_genre.bulk_insert", {
+            "game_ids": [fields["game_id"] for fields in regenred for _ in fields["genres"]],
+            "genres": [genre for fields in regenred for genre in fields["genres"]]
+        })
+
+    return [
+        {"status": "OK", "gameID": game_id} if game_id in found else {"status": "FAIL", "errorMessage": "Game not found"}
+        for game_id in game_ids
+    ]
+
+def _admin_bulk_games(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession, adding: bool):
+    items = request.get("games")
+    if type(items) != list or len(items) > BULK_MAXLEN:
+        response = {
+            "status": "FAIL",
+            "errorMessage": "A bulk request carries a list of at most {} games".format(BULK_MAXLEN)
+        }
+        client.reply(request, response)
+        return
+
+    # Results line up with the given games
+    results = [None] * len(items)
+    valid = []
+    seen_ids = set()
+    for i, item in enumerate(items):
+        try:
+            fields = _bulk_game_item(item, adding)
+        except ValueError as e:
+            results[i] = {"status": "FAIL", "errorMessage": str(e)}
+            continue
+        if not adding:
+            # Two updates of one game in a single UPDATE would apply in no defined order
+            if fields["game_id"] in seen_ids:
+                results[i] = {"status": "FAIL", "errorMessage": "Game ID is given more than once"}
+                continue
+            seen_ids.add(fields["game_id"])
+        valid.append((i, fields))
+
+    # Every chunk is its own transaction and tells the other nodes when it commits. This
+    # node's catalog is refreshed once, after the last chunk.
+    changed_ids = []
+    for start in range(0, len(valid), BULK_CHUNK_SIZE):
+        chunk = valid[start:start + BULK_CHUNK_SIZE]
+        items = [fields for _, fields in chunk]
+        try:
+            chunk_results = _bulk_add_chunk(cursor, items) if adding else _bulk_update_chunk(cursor, items)
+            chunk_ids = [result["gameID"] for result in chunk_results if result["status"] == "OK"]
+            if chunk_ids:
+                broadcast_bus.publish({"kind": "catalog", "gameIDs": chunk_ids}, cursor)
+            pg_conn.commit()
+
+            changed_ids.extend(chunk_ids)
+            for (i, _), result in zip(chunk, chunk_results):
+                results[i] = result
+
+        except Exception as e:
+            pg_conn.rollback()
+            print("[Error] {}".format(e))
+            for i, _ in chunk:
+                results[i] = {"status": "FAIL", "errorMessage": "Unknown error"}
+
+    if changed_ids:
+        _refresh_catalog(cursor, changed_ids)
+
+    response = {
+        "status": "OK",
+        "succeeded": sum(1 for result in results if result["status"] == "OK"),
+        "results": results
+    }
+    client.reply(request, response)
+
+def _server_stats(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
+    response = {
+        "status": "OK",
+        "stats": {
+            "onlineUsers": len(client_id2session),
+            "bus": broadcast_bus.stats(),
+            "pool": db_pool.stats(),
+            "rooms": room_registry.stats(),
+            "catalog": catalog.stats(),
+            "searchEngine": search_engine.stats(),
+            "fuzzyIndex": fuzzy_index.stats(),
+            "genreRanking": genre_ranking.stats(),
+            "suggestIndex": suggest_index.stats(),
+            "outbound": dict(outbound_stats),
+            "queries": queries.report()
+        }
+    }
+    client.reply(request, response)
+
+class _BatchCollector:
+    # Stands in for the client session while a sub-request of a batch runs
+    def __init__(self, client: ClientSession):
+        self.client = client
+        self.user_id = client.user_id
+        self.response = None
+
+    def reply(self, request: dict, response: dict):
+        self.response = response
+
+    def push(self, message: dict):
+        self.client.push(message)
+
+class _BatchConnection:
+    # Stands in for the connection in an atomic batch, so the handlers' own
+    # commit() calls do not end the shared transaction
+    def __init__(self, pg_conn: psycopg.Connection):
+        self.pg_conn = pg_conn
+        self.rolled_back = False
+        # Cache updates of the sub-requests, run once the batch has committed
+        self.after_commit = []
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self.rolled_back = True
+        self.after_commit.clear()
+        self.pg_conn.rollback()
+
+def _batch(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession):
+    sub_requests = request.get("requests")
+    atomic = bool(request.get("atomic"))
+
+    if type(sub_requests) != list or len(sub_requests) > BATCH_MAXLEN:
+        response = {
+            "status": "FAIL",
+            "errorMessage": "A batch carries a list of at most {} requests".format(BATCH_MAXLEN)
+        }
+        client.reply(request, response)
+        return
+
+    batch_conn = _BatchConnection(pg_conn) if atomic else pg_conn
+    results = []
+    aborted = False
+    for sub_request in sub_requests:
+        if aborted:
+            results.append({
+                "status": "FAIL",
+                "errorMessage": "Skipped because an earlier request of the batch failed"
+            })
+            continue
+
+        if type(sub_request) != dict or sub_request.get("requestType") not in BATCHABLE_REQUESTS:
+            result = {
+                "status": "FAIL",
+                "errorMessage": "Request type is not allowed in a batch"
+            }
+        else:
+            collector = _BatchCollector(client)
+            try:
+                _dispatch_request(batch_conn, sub_request, cursor, collector)
+            except Exception as e:
+                batch_conn.rollback()
+                print("[Error] {}".format(e))
+            result = collector.response or {
+                "status": "FAIL",
+                "errorMessage": "Unknown error"
+            }
+            result.pop("requestID", None)
+        results.append(result)
+
+        if atomic and (result["status"] != "OK" or batch_conn.rolled_back):
+            if not batch_conn.rolled_back:
+                batch_conn.rollback()
+            aborted = True
+
+    if atomic and not aborted:
+        pg_conn.commit()
+        for action in batch_conn.after_commit:
+            action()
+
+    if aborted:
+        response = {
+            "status": "FAIL",
+            "errorMessage": "The batch was rolled back",
+            "results": results
+        }
+    else:
+        response = {
+            "status": "OK",
+            "results": results
+        }
+    client.reply(request, response)
 
-def handle_request(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client_sock: socket.socket) -> int:
-    request_id = REQUEST_MAP[request["requestType"]]
-    match request_id:
+def _dispatch_request(pg_conn: psycopg.Connection, request: dict, cursor: Cursor, client: ClientSession) -> int:
+    match REQUEST_MAP.get(request["requestType"]):
         case 0:
-            _exit(pg_conn, request, cursor, client_sock)
+            _exit(pg_conn, request, cursor, client)
             return RETCODE_EXIT
         case 1:
-            _sign_in(pg_conn, request, cursor, client_sock)
+            _sign_in(pg_conn, request, cursor, client)
         case 2:
-            _sign_up(pg_conn, request, cursor, client_sock)
+            _sign_up(pg_conn, request, cursor, client)
         case 3:
-            _user_search_games(pg_conn, request, cursor, client_sock)
+            _user_search_games(pg_conn, request, cursor, client)
         case 4:
-            _user_add_reviews(pg_conn, request, cursor, client_sock)
+            _user_add_reviews(pg_conn, request, cursor, client)
         case 5:
-            _user_delete_reviews(pg_conn, request, cursor, client_sock)
+            _user_delete_reviews(pg_conn, request, cursor, client)
         case 6:
-            _user_add_to_favorites(pg_conn, request, cursor, client_sock)
+            _user_add_to_favorites(pg_conn, request, cursor, client)
         case 7:
-            _user_create_room(pg_conn, request, cursor, client_sock)
+            _user_create_room(pg_conn, request, cursor, client)
         case 8:
-            _user_join_room(pg_conn, request, cursor, client_sock)
+            _user_join_room(pg_conn, request, cursor, client)
         case 9:
-            _user_check_user(pg_conn, request, cursor, client_sock)
+            _user_check_user(pg_conn, request, cursor, client)
         case 10:
-            _user_update_profile(pg_conn, request, cursor, client_sock)
+            _user_update_profile(pg_conn, request, cursor, client)
         case 11:
-            _user_list_rooms(pg_conn, request, cursor, client_sock)
+            _user_list_rooms(pg_conn, request, cursor, client)
         case 12:
-            _user_check_reviews(pg_conn, request, cursor, client_sock)
+            _user_check_reviews(pg_conn, request, cursor, client)
         case 13:
-            _user_room_communication(pg_conn, request, cursor, client_sock)
+            _user_room_communication(pg_conn, request, cursor, client)
         case 14:
-            _user_leave_room(pg_conn, request, cursor, client_sock)
+            _user_leave_room(pg_conn, request, cursor, client)
         case 15:
-            _admin_add_game(pg_conn, request, cursor, client_sock)
+            _admin_add_game(pg_conn, request, cursor, client)
         case 16:
-            _admin_update_game(pg_conn, request, cursor, client_sock)
+            _admin_update_game(pg_conn, request, cursor, client)
         case 17:
-            _admin_delete_game(pg_conn, request, cursor, client_sock)
+            _admin_delete_game(pg_conn, request, cursor, client)
+        case 18:
+            _server_stats(pg_conn, request, cursor, client)
+        case 19:
+            _batch(pg_conn, request, cursor, client)
+        case 20:
+            _user_suggest_games(pg_conn, request, cursor, client)
+        case 21:
+            _user_recommend_games(pg_conn, request, cursor, client)
+        case 22:
+            _user_search_reviews(pg_conn, request, cursor, client)
+        case 23:
+            _admin_bulk_games(pg_conn, request, cursor, client, adding = True)
+        case 24:
+            _admin_bulk_games(pg_conn, request, cursor, client, adding = False)
         case _:
-           return RETCODE_ERROR
+            return RETCODE_ERROR
+
+    return RETCODE_NORMAL
+
+def _needs_db(request: dict) -> bool:
+    if request["requestType"] in NO_DB_REQUESTS:
+        return False
+    # Searches without a name or with a fuzzy name are served by the in-memory indexes
+    if request["requestType"] == "search games" and (not request.get("gameName") or request.get("nameMatch") == NAME_MATCH_FUZZY):
+        return False
+    return True
+
+def handle_request(request: dict, client: ClientSession) -> int:
+    request_id = REQUEST_MAP.get(request["requestType"])
+    if request_id is None:
+        return RETCODE_ERROR
+
+    # The connection goes back to the pool as soon as the handler has committed or rolled back
+    try:
+        if not _needs_db(request):
+            return _dispatch_request(None, request, None, client)
+
+        with db_pool.connection() as pg_conn, pg_conn.cursor(row_factory = dict_row) as cursor:
+            return _dispatch_request(pg_conn, request, cursor, client)
 
-    return RETCODE_NORMAL    
+    except PoolTimeout as e:
+        print("[Error] {}".format(e))
+        response = {
+            "status": "FAIL",
+            "errorMessage": "Server is busy. Please try again later."
+        }
+        client.reply(request, response)
+
+    except Exception as e:
+        # Pipelined requests run on worker threads, so nothing upstream would report this
+        print("[Error] {}".format(e))
+        response = {
+            "status": "FAIL",
+            "errorMessage": "Unknown error"
+        }
+        client.reply(request, response)
+
+    return RETCODE_NORMAL
+
+def _release_client(client: ClientSession):
+    # A client that disconnects without exiting still has to give up its cluster-wide session
+    if client.user_id is not None and client_id2session.get(client.user_id) is client:
+        try:
+            with db_pool.connection() as pg_conn, pg_conn.cursor(row_factory = dict_row) as cursor:
+                _end_session(pg_conn, cursor, client.user_id)
+        except Exception as e:
+            print("[Error] {}".format(e))
+            client_id2session.pop(client.user_id, None)
+
+def _request_retcode(request: dict) -> int:
+    # Decided by the connection reader before the request is handed to a worker
+    request_id = REQUEST_MAP.get(request.get("requestType"))
+    if request_id is None:
+        return RETCODE_ERROR
+    elif request_id == 0:
+        return RETCODE_EXIT
+    else:
+        return RETCODE_NORMAL
 
 def handle_client(client_sock: socket.socket, client_addr):
+    client = ThreadClientSession(client_sock, client_addr)
+    decoder = FrameDecoder()
+    # Requests from one connection are answered out of order by the shared workers;
+    # the semaphore stops a single client from flooding the worker queue
+    inflight = threading.BoundedSemaphore(MAX_INFLIGHT)
+    pending = set()
     try:
-        pg_conn = psycopg.connect(
-            host = PG_HOST,
-            port = PG_PORT,
-            user = PG_USER,
-            password = PG_PASSWORD,
-            dbname = PG_DBNAME
-        )
-        pg_conn.set_isolation_level(ISOLATION_LEVEL)
-        cursor = pg_conn.cursor(row_factory = dict_row)
-        while True:
-            request_str = client_sock.recv(BUFFER_MAXLEN).decode("utf-8")
-            if request_str:
-                request = json.loads(request_str)
-                retcode = handle_request(pg_conn, request, cursor, client_sock)
+        retcode = RETCODE_NORMAL
+        while retcode == RETCODE_NORMAL:
+            data = client_sock.recv(BUFFER_MAXLEN)
+            if not data:
+                print("[Log] Client at {}:{} disconnected.".format(client_addr[0], client_addr[1]))
+                break
+            for frame in decoder.feed(data):
+                request = json.loads(frame.decode("utf-8"))
+                retcode = _request_retcode(request)
                 if retcode == RETCODE_ERROR:
                     print("[Error] Failed to handle the request. Abort the client connection.")
                     break
                 elif retcode == RETCODE_EXIT:
+                    wait_futures(pending.copy())
+                    handle_request(request, client)
                     print("[Log] Client at {}:{} exited.".format(client_addr[0], client_addr[1]))
                     break
 
+                inflight.acquire()
+                future = db_executor.submit(handle_request, request, client)
+                pending.add(future)
+                future.add_done_callback(lambda f: (pending.discard(f), inflight.release()))
+
+    except (ConnectionError, ValueError) as e:
+        print("[Error] {}".format(e))
+
     finally:
-        client_sock.close()
-        cursor.close()
-        pg_conn.close()
+        # Let in-flight requests deliver their replies before the socket goes away
+        wait_futures(pending.copy())
+        _release_client(client)
+        client.close()
         exit(0)
 
+async def handle_client_async(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    loop = asyncio.get_running_loop()
+    client_addr = writer.get_extra_info("peername")
+    client = AsyncClientSession(writer, client_addr, loop)
+    print("[Log] Accept connection from {}:{}".format(client_addr[0], client_addr[1]))
+    decoder = FrameDecoder()
+    inflight = asyncio.Semaphore(MAX_INFLIGHT)
+    pending = set()
+
+    def _on_done(task: asyncio.Future):
+        pending.discard(task)
+        inflight.release()
+
+    try:
+        retcode = RETCODE_NORMAL
+        while retcode == RETCODE_NORMAL:
+            data = await reader.read(BUFFER_MAXLEN)
+            if not data:
+                print("[Log] Client at {}:{} disconnected.".format(client_addr[0], client_addr[1]))
+                break
+            for frame in decoder.feed(data):
+                request = json.loads(frame.decode("utf-8"))
+                retcode = _request_retcode(request)
+                if retcode == RETCODE_ERROR:
+                    print("[Error] Failed to handle the request. Abort the client connection.")
+                    break
+                elif retcode == RETCODE_EXIT:
+                    if pending:
+                        await asyncio.wait(pending)
+                    await loop.run_in_executor(db_executor, handle_request, request, client)
+                    print("[Log] Client at {}:{} exited.".format(client_addr[0], client_addr[1]))
+                    break
+
+                await inflight.acquire()
+                task = loop.run_in_executor(db_executor, handle_request, request, client)
+                pending.add(task)
+                task.add_done_callback(_on_done)
+
+    except (ConnectionError, ValueError) as e:
+        print("[Error] {}".format(e))
+
+    finally:
+        if pending:
+            await asyncio.wait(pending)
+        await loop.run_in_executor(db_executor, _release_client, client)
+        client.close()
+        await client.writer_task
+
+async def serve_async(host: str, port: int):
+    server = await asyncio.start_server(handle_client_async, host, port, reuse_address = True)
+    async with server:
+        await server.serve_forever()
+
+def serve_threaded(host: str, port: int):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(5)
+
+    try:
+        while True:
+            client_sock, client_addr = sock.accept()
+            print("[Log] Accept connection from {}:{}".format(client_addr[0], client_addr[1]))
+
+            t = threading.Thread(target = handle_client, args = (client_sock, client_addr))
+            t.daemon = True
+            t.start()
+
+    finally:
+        sock.close()
+
 def main(args):
     global PG_HOST
     global PG_PORT
     global PG_USER
     global PG_PASSWORD
     global PG_DBNAME
+    global db_executor
+    global db_pool
+    global MAX_INFLIGHT
+    global NODE_ID
+    global broadcast_bus
 
     PG_HOST = args.pg_host
     PG_PORT = args.pg_port
@@ -1166,36 +2029,85 @@ def main(args):
 
     host = "127.0.0.1"
     port = args.port
-    
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    sock.bind((host, port))
-    sock.listen(5)
+    MAX_INFLIGHT = args.max_inflight
+    ClientSession.max_queue = args.outbound_queue_size
+    ClientSession.slow_consumer_policy = args.slow_consumer_policy
+    NODE_ID = args.node_id or "{}:{}".format(socket.gethostname(), port)
+
+    db_pool = DBPool(
+        PG_HOST, PG_PORT, PG_USER, PG_PASSWORD, PG_DBNAME,
+        size = args.pool_size,
+        min_idle = args.pool_min_idle,
+        max_lifetime = args.pool_max_lifetime,
+        acquire_timeout = args.pool_timeout,
+        isolation_level = ISOLATION_LEVEL
+    )
+    db_pool.open()
+
+    if args.bus == BUS_PG_NOTIFY:
+        conninfo = make_conninfo(host = PG_HOST, port = PG_PORT, user = PG_USER, password = PG_PASSWORD, dbname = PG_DBNAME)
+        broadcast_bus = PgNotifyBus(conninfo, NODE_ID)
+    else:
+        broadcast_bus = LocalBus(NODE_ID)
+    # Listen before loading the registry, so events committed during the load are not missed
+    broadcast_bus.open()
+
+    with db_pool.connection() as pg_conn, pg_conn.cursor(row_factory = dict_row) as cursor:
+        schema.apply(pg_conn)
+        # Sessions left behind by an earlier run of this node
+        queries.execute(cursor, "online_session.clear_node", {"node_id": NODE_ID})
+        queries.execute(cursor, "server_node.heartbeat", {"node_id": NODE_ID})
+        room_registry.load(cursor)
+        catalog.load(cursor)
+        pg_conn.commit()
+
+    broadcast_bus.start(_apply_bus_event, _resync_from_db)
+    threading.Thread(target = _heartbeat_loop, daemon = True).start()
 
     clear_screen()
-    print("Listening at port {}".format(port))
-    
+    print("Listening at port {} ({} mode)".format(port, args.mode))
+
+    # More workers than pooled connections would only queue inside the pool
+    db_executor = ThreadPoolExecutor(max_workers = args.pool_size, thread_name_prefix = "db-worker")
+
     try:
-        while True:
-            client_sock, client_addr = sock.accept()
-            print("[Log] Accept connection from {}:{}".format(client_addr[0], client_addr[1]))
+        if args.mode == SERVER_MODE_ASYNCIO:
+            asyncio.run(serve_async(host, port))
+        else:
+            serve_threaded(host, port)
 
-            t = threading.Thread(target = handle_client, args = (client_sock, client_addr))
-            t.daemon = True
-            t.start()
+    except KeyboardInterrupt:
+        pass
 
     finally:
-        sock.close()
+        db_executor.shutdown(wait = False, cancel_futures = True)
+        broadcast_bus.close()
+        heartbeat_stopped.set()
+        with db_pool.connection() as pg_conn, pg_conn.cursor() as cursor:
+            queries.execute(cursor, "online_session.clear_node", {"node_id": NODE_ID})
+            queries.execute(cursor, "server_node.remove", {"node_id": NODE_ID})
+            pg_conn.commit()
+        db_pool.close()
         clear_screen()
         exit(0)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--port", type = int, help = "The port for the server to listen on. (default = 8888)", default = 8888)
+    parser.add_argument("--mode", type = str, choices = [SERVER_MODE_THREAD, SERVER_MODE_ASYNCIO], help = "Serve clients with one thread per client or with an asyncio event loop. (default = \"thread\")", default = SERVER_MODE_THREAD)
+    parser.add_argument("--max_inflight", type = int, help = "Maximum number of pipelined requests in flight per connection. (default = 32)", default = 32)
+    parser.add_argument("--outbound_queue_size", type = int, help = "Maximum number of pushed messages queued for one client. (default = 256)", default = 256)
+    parser.add_argument("--slow_consumer_policy", type = str, choices = [SLOW_CONSUMER_DROP_OLDEST, SLOW_CONSUMER_DISCONNECT], help = "What to do when a client's outbound queue is full. (default = \"drop_oldest\")", default = SLOW_CONSUMER_DROP_OLDEST)
+    parser.add_argument("--bus", type = str, choices = [BUS_PG_NOTIFY, BUS_LOCAL], help = "How room events reach the other server nodes: PostgreSQL LISTEN/NOTIFY, or nowhere for a single node. (default = \"pg\")", default = BUS_PG_NOTIFY)
+    parser.add_argument("--node_id", type = str, help = "Name of this server node in the cluster. (default = \"<hostname>:<port>\")", default = None)
     parser.add_argument("--pg_host", type = str, help = "Host IP of the PostgreSQL server. (default = \"localhost\")", default = "localhost")
     parser.add_argument("--pg_port", type = int, help = "Port of the PostgreSQL server. (default = 5432)", default = 5432)
     parser.add_argument("--pg_user", type = str, help = "User to login PostgreSQL server. (default = \"postgres\")", default = "postgres")
     parser.add_argument("--pg_password", type = str, help = "Password for login the PostgreSQL server. (default = \"postgres\")", default = "postgres")
     parser.add_argument("--pg_dbname", type = str, help = "Database to connect. (default = \"Steam-Together\")", default = "Steam-Together")
+    parser.add_argument("--pool_size", type = int, help = "Maximum number of pooled PostgreSQL connections. (default = 16)", default = 16)
+    parser.add_argument("--pool_min_idle", type = int, help = "Number of connections the pool keeps open even when idle. (default = 2)", default = 2)
+    parser.add_argument("--pool_max_lifetime", type = float, help = "Seconds after which a pooled connection is replaced. (default = 1800)", default = 1800.0)
+    parser.add_argument("--pool_timeout", type = float, help = "Seconds a request waits for a free connection before failing. (default = 5)", default = 5.0)
     args = parser.parse_args()
     main(args)
@@ -0,0 +1,178 @@
+import re
+import heapq
+import threading
+from bisect import bisect_left, insort
+from catalog import Game, CatalogListener
+
+SUGGEST_SIZE = 10
+SUGGEST_MAXLEN = 50
+
+# Prefixes up to this length match a large part of the catalog, so each of them keeps a
+# ranked list of its best games
+TOP_PREFIX_MAXLEN = 3
+
+# Games kept in a top list. Headroom over SUGGEST_MAXLEN lets games leave a list for a
+# while before it has to be rebuilt from the prefix's range.
+TOP_LIST_MAXLEN = 2 * SUGGEST_MAXLEN
+
+# Sorts after every character, so (prefix + PREFIX_END) bounds all keys starting with prefix
+PREFIX_END = chr(0x10FFFF)
+
+def normalize(text: str) -> str:
+    # Case and punctuation are ignored: "counter-str" completes "Counter-Strike"
+    return " ".join(re.findall(r"\w+", text.casefold()))
+
+def _keys(game: Game) -> list[str]:
+    # The normalized name and every suffix of it starting at a word, so a prefix of any
+    # word of the name finds the game
+    name = normalize(game.game_name)
+    keys = [name]
+    for i, char in enumerate(name):
+        if char == " ":
+            keys.append(name[i + 1:])
+    return keys
+
+def _prefixes(keys: list[str]) -> set[str]:
+    # Short prefixes of the keys, each of which has a top list
+    return {key[:n] for key in keys for n in range(1, min(len(key), TOP_PREFIX_MAXLEN) + 1)}
+
+def _order(game: Game) -> tuple:
+    # Most positive ratings first
+    return (-(game.positive_ratings or 0), game.game_id)
+
+class _TopList:
+    # Orders of the best games with one short prefix, best first. A truncated list leaves
+    # out games that rank below all of the listed ones.
+    __slots__ = ("orders", "truncated")
+
+    def __init__(self, orders: list[tuple], truncated: bool):
+        self.orders = orders
+        self.truncated = truncated
+
+# Sorted array of (key, game id) pairs for game name completion. A prefix selects one
+# contiguous range of it with two binary searches; the most popular games of the range
+# are the suggestions. Short prefixes, whose ranges are large, are answered from top lists
+# that are updated in place when a game's name or positive ratings change.
+class SuggestIndex(CatalogListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._games = {}
+        self._entries = []
+        # Short prefix -> its top list
+        self._tops = {}
+        self._n_lookups = 0
+        self._n_top_hits = 0
+        self._n_rebuilds = 0
+
+    def catalog_loaded(self, games: list[Game]):
+        entries = sorted((key, game.game_id) for game in games for key in _keys(game))
+        orders = {}
+        for game in games:
+            for prefix in _prefixes(_keys(game)):
+                orders.setdefault(prefix, []).append(_order(game))
+        tops = {}
+        for prefix, prefix_orders in orders.items():
+            prefix_orders.sort()
+            tops[prefix] = _TopList(prefix_orders[:TOP_LIST_MAXLEN], len(prefix_orders) > TOP_LIST_MAXLEN)
+        with self._lock:
+            self._games = {game.game_id: game for game in games}
+            self._entries = entries
+            self._tops = tops
+
+    def game_upserted(self, game: Game, old: Game | None):
+        with self._lock:
+            self._games[game.game_id] = game
+            name_changed = old is None or old.game_name != game.game_name
+            # Reviews and most admin updates change neither, and leave the index as it is
+            if not name_changed and _order(old) == _order(game):
+                return
+
+            keys = _keys(game)
+            old_keys = _keys(old) if old is not None else []
+            if name_changed:
+                for key in old_keys:
+                    self._remove_entry(key, game.game_id)
+                for key in keys:
+                    insort(self._entries, (key, game.game_id))
+            if old is not None:
+                self._remove_order(_prefixes(old_keys), _order(old))
+            self._add_order(_prefixes(keys), _order(game))
+
+    def game_removed(self, game: Game):
+        with self._lock:
+            self._games.pop(game.game_id, None)
+            keys = _keys(game)
+            for key in keys:
+                self._remove_entry(key, game.game_id)
+            self._remove_order(_prefixes(keys), _order(game))
+
+    def _remove_entry(self, key: str, game_id: int):
+        i = bisect_left(self._entries, (key, game_id))
+        if i < len(self._entries) and self._entries[i] == (key, game_id):
+            del self._entries[i]
+
+    def _add_order(self, prefixes: set[str], order: tuple):
+        for prefix in prefixes:
+            top = self._tops.get(prefix)
+            if top is None:
+                self._tops[prefix] = _TopList([order], False)
+                continue
+            # Below the end of a truncated list, the game may rank after games left out
+            if top.truncated and (not top.orders or order > top.orders[-1]):
+                continue
+            insort(top.orders, order)
+            if len(top.orders) > TOP_LIST_MAXLEN:
+                top.orders.pop()
+                top.truncated = True
+
+    def _remove_order(self, prefixes: set[str], order: tuple):
+        # What is left of a list is still the best of its prefix; a truncated list that
+        # gets too short is rebuilt by the next lookup
+        for prefix in prefixes:
+            top = self._tops.get(prefix)
+            if top is None:
+                continue
+            i = bisect_left(top.orders, order)
+            if i < len(top.orders) and top.orders[i] == order:
+                del top.orders[i]
+            if not top.orders and not top.truncated:
+                del self._tops[prefix]
+
+    def _range_orders(self, prefix: str) -> list[tuple]:
+        lo = bisect_left(self._entries, (prefix,))
+        hi = bisect_left(self._entries, (prefix + PREFIX_END,), lo)
+        game_ids = {self._entries[i][1] for i in range(lo, hi)}
+        return [_order(self._games[game_id]) for game_id in game_ids]
+
+    def suggest(self, prefix: str, limit: int = SUGGEST_SIZE) -> list[Game]:
+        # The most popular games with a name word starting with prefix, most popular first
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            self._n_lookups += 1
+            if len(prefix) <= TOP_PREFIX_MAXLEN:
+                top = self._tops.get(prefix)
+                if top is None:
+                    return []
+                if top.truncated and len(top.orders) < limit:
+                    orders = sorted(self._range_orders(prefix))
+                    top.orders = orders[:TOP_LIST_MAXLEN]
+                    top.truncated = len(orders) > TOP_LIST_MAXLEN
+                    self._n_rebuilds += 1
+                else:
+                    self._n_top_hits += 1
+                orders = top.orders[:limit]
+            else:
+                orders = heapq.nsmallest(limit, self._range_orders(prefix))
+            return [self._games[game_id] for _, game_id in orders]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "lookups": self._n_lookups,
+                "topLists": len(self._tops),
+                "topListHits": self._n_top_hits,
+                "topListRebuilds": self._n_rebuilds
+            }